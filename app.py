@@ -3,7 +3,12 @@ import streamlit as st
 from core.settings import APP_TITLE
 from ui.styles import inject_styles
 from ui.steps import render_app
+from core.warmup import start_warmup
 
-st.set_page_config(page_title=APP_TITLE, layout="centered")
-inject_styles()
-render_app()
+# 生成ジョブのワーカープロセス（spawn）はこのファイルを __mp_main__ として読み込むため、画面は描画しない
+if __name__ == "__main__":
+    st.set_page_config(page_title=APP_TITLE, layout="centered")
+    inject_styles()
+    render_app()
+    # 最初の画面を返した後に、既定テンプレートの読み込みや生成ワーカーの起動を裏で済ませる
+    start_warmup()
@@ -0,0 +1,79 @@
+# report_maker/benchmarks/bench_large_paste.py
+# 使い方: python -m benchmarks.bench_large_paste [--messages 2500] [--repeat 3] [--adversarial-lines 20000]
+# スレッド全体のような大きな貼り付けについて、抽出の所要時間と tracemalloc のピーク（貼り付けた本文を除く）を測る
+# 比較用に、正規化後の本文全体と行リストを作ってから解析する方法（全文）も同じ本文で測り、結果が一致することを確認する
+# 件名の検索を長引かせる細工した本文（件名行の繰り返し・閉じない【など）も測り、1行あたりの時間が上限を超えたら失敗にする
+import argparse
+import sys
+import time
+import tracemalloc
+from typing import Callable, Tuple
+from benchmarks.corpus import generate_corpus
+from core.extract_cache import ExtractCache
+from core.parsing import extract_fields, parse_lines
+from core.textutil import normalize_text
+
+# 細工した本文の行数と、1行あたりの時間の上限（行数に比例しない処理が入ると数 ms/行 になる）
+ADVERSARIAL_LINES = 20000
+ADVERSARIAL_LIMIT_US_PER_LINE = 100.0
+
+def _adversarial(n: int):
+    return [
+        ("件名行の繰り返し", "件名: 【a】 \n" * n),
+        ("閉じない【と】の行", "件名: 【【【\n" + "】\n" * n),
+        ("閉じない件名行の繰り返し", "件名: 【\n" * n + "】 あ"),
+        ("件名の後の空行", "件名:\n" + "\n" * n + "【x"),
+    ]
+
+def _full_text(raw_text: str):
+    return parse_lines(normalize_text(raw_text).split("\n"))
+
+def _measure(fn: Callable, raw_text: str, repeat: int) -> Tuple[object, float, int]:
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    result = fn(raw_text)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(raw_text)
+        best = min(best, time.perf_counter() - t0)
+    return result, best, peak
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="大きな貼り付けの抽出時間とメモリのピーク")
+    ap.add_argument("--messages", type=int, default=2500, help="1つの貼り付けにつなげるメールの数")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--adversarial-lines", type=int, default=ADVERSARIAL_LINES)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    raw = "\r\n\r\n".join(generate_corpus(args.messages, seed=args.seed)).replace("\n", "\r\n")
+    raw_bytes = sys.getsizeof(raw)
+    print(f"貼り付け: {len(raw):,} 文字 / {raw_bytes / 1e6:.1f} MB")
+    results = []
+    for name, fn in (("全文", _full_text), ("extract_fields", extract_fields),
+                     ("extract_fields_cached", lambda t: ExtractCache().extract(t))):
+        result, sec, peak = _measure(fn, raw, args.repeat)
+        results.append(dict(result))
+        print(f"  {name:>22}: {sec * 1000:7.0f} ms  ピーク +{peak / 1e6:6.1f} MB（貼り付けの {peak / raw_bytes:.2f} 倍）")
+    if any(r != results[0] for r in results[1:]):
+        print("抽出結果が一致しません")
+        return 1
+
+    print(f"細工した本文（{args.adversarial_lines:,} 行、上限 {ADVERSARIAL_LIMIT_US_PER_LINE:.0f} us/行）:")
+    slow = []
+    for name, text in _adversarial(args.adversarial_lines):
+        _, sec, _ = _measure(extract_fields, text, 1)
+        us_per_line = sec / args.adversarial_lines * 1e6
+        print(f"  {name:>22}: {sec * 1000:7.0f} ms  {us_per_line:6.1f} us/行")
+        if us_per_line > ADVERSARIAL_LIMIT_US_PER_LINE:
+            slow.append(name)
+    if slow:
+        print("1行あたりの時間が上限を超えました: " + ", ".join(slow))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
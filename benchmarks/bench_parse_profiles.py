@@ -0,0 +1,98 @@
+# report_maker/benchmarks/bench_parse_profiles.py
+# 使い方: python -m benchmarks.bench_parse_profiles [--size 5000] [--profiles 0,10,100,1000]
+# 登録した書式（解析プロファイル）の数を増やしたときの、書式の判定と抽出の1件あたりの時間を比べる
+# 判定は索引を引くだけのため、書式の数によらずほぼ一定になるはず
+# 本文の半分は最後に登録した書式の件名にし、索引に当たる場合と当たらない（標準）場合の両方を含める
+# 計測の前に、同梱の書式（core/parse_profiles）で samples/ の見本メールを抽出し、期待した値と違えば失敗にする
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from benchmarks.corpus import generate_corpus
+from core.parse_profile import ProfileRegistry, compile_profile, get_registry
+from core.parsing import extract_fields, parse_lines
+from core.textutil import normalize_text
+
+_SUBJECT_TAG_RE = re.compile(r"【[^】]*】")
+_SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples")
+
+# 見本メール → (判定されるはずの書式, 抽出されるはずの値)
+_SAMPLES = {
+    "kitanihon.txt": ("北日本", {
+        "受付番号": "240501-17",
+        "管理番号": "KN-0123",
+        "物件名": "北日本第2ビル",
+        "住所": "北海道札幌市白石区本通1丁目",
+        "窓口会社": "北日本昇降機",
+        "メーカー": "三菱",
+        "受信内容": "2階でドアが閉まらない",
+        "現着時刻": "2024/05/01 09:50",
+        "現着状況": "2階で戸開のまま停止",
+        "処置内容": "ドアセンサーを清掃し試運転にて異常なし",
+        "完了時刻": "2024/05/01 10:35",
+        "対応者": "高橋",
+        "現着完了登録URL": "https://example.jp/kn/report?id=240501-17",
+        "作業時間_分": "45",
+        "案件種別(件名)": "保守完了報告",
+    }),
+}
+
+def _check_samples() -> list:
+    registry = get_registry()
+    failed = []
+    for fname, (profile_name, expected) in _SAMPLES.items():
+        with open(os.path.join(_SAMPLE_DIR, fname), "r", encoding="utf-8") as f:
+            text = f.read()
+        detected = registry.detect(normalize_text(text)).name
+        fields = extract_fields(text)
+        wrong = [k for k, v in expected.items() if fields.get(k) != v]
+        if detected != profile_name:
+            wrong.insert(0, f"書式={detected}")
+        print(f"見本 {fname}: 書式 {detected}  " + ("OK" if not wrong else "不一致 " + ", ".join(wrong)))
+        if wrong:
+            failed.append(fname)
+    return failed
+
+def _registry(n: int) -> ProfileRegistry:
+    registry = ProfileRegistry()
+    for i in range(n):
+        registry.register(compile_profile({
+            "name": f"書式{i}",
+            "signatures": {"subject": [f"完了報告{i}"], "labels": [f"受付ID{i}"], "companies": [f"窓口{i}株式会社"]},
+            "labels": {f"受付ID{i}": "受付番号", f"到着時刻{i}": "現着時刻"},
+        }))
+    return registry
+
+def _per_item_us(fn, items, repeat: int = 3) -> float:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for item in items:
+            fn(item)
+        runs.append((time.perf_counter() - t0) / len(items) * 1e6)
+    return statistics.median(runs)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="書式の数と判定・抽出の時間")
+    ap.add_argument("--size", type=int, default=5000)
+    ap.add_argument("--profiles", default="0,10,100,1000")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    if _check_samples():
+        return 1
+    base = [normalize_text(t) for t in generate_corpus(args.size, seed=args.seed)]
+    for n in [int(s) for s in args.profiles.split(",") if s]:
+        registry = _registry(n)
+        tag = f"【完了報告{n - 1}】" if n else "【故障完了】"
+        texts = [_SUBJECT_TAG_RE.sub(tag, t, count=1) if i % 2 else t for i, t in enumerate(base)]
+        detect_us = _per_item_us(registry.detect, texts)
+        parse_us = _per_item_us(lambda t: parse_lines(t.split("\n"), registry.detect(t)), texts)
+        hits = sum(registry.detect(t) is not registry.standard for t in texts)
+        print(f"書式 {n:>5}: 判定 {detect_us:6.2f} us/件  判定+抽出 {parse_us:7.2f} us/件  標準以外 {hits}/{len(texts)} 件")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
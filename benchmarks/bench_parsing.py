@@ -0,0 +1,65 @@
+# report_maker/benchmarks/bench_parsing.py
+# 使い方: python -m benchmarks.bench_parsing [--count N] [--seed S] [--repeat R]
+# 旧実装との抽出結果の一致を確認したうえで、extract_fields のスループット（通/秒）を比較する
+# 計測は旧実装と交互に R 回ずつ行い、それぞれ最速の回で比べる（1回だけだと実行ごとの揺れが差より大きい）
+# 行の分類は今も1行ごとの LABEL_REGEX のまま。正規表現を使わない字句解析器も試したが、この計測で安定した差が出なかった
+import argparse
+import sys
+import time
+from core.parsing import extract_fields
+from benchmarks.corpus import generate_corpus
+from benchmarks._legacy_parsing import legacy_extract_fields
+
+# 旧実装では拾えない崩れた入力も同じ結果になることを確認する
+EDGE_CASES = [
+    "",
+    "件名:\n【故障完了】\nHK10-103\n管理番号:",
+    "件名: 【故障完了】 hk10-1\n管理番号:\n処置内容: a\nhttp://x.jp/a:b\n続き",
+    "詳細はこちら:\n\n受付番号: 123\nhttps://example.jp/x)」",
+    "処置内容:\n  \n 受付番号：456 \n備考: x\n受付番号 : 789",
+    "  物件名 :  A ビル  \n物件名:\n窓口 : B\n現着・完了登録はこちら:https://e.jp/y＞",
+    "受付 番号: 1\n:値のみ\n原因:\ta\n\tb\r\nc　d",
+]
+
+def check_parity(texts) -> int:
+    mismatches = 0
+    for idx, text in enumerate(texts):
+        new, old = extract_fields(text), legacy_extract_fields(text)
+        if new != old:
+            mismatches += 1
+            diff = {k: (old.get(k), new.get(k)) for k in set(old) | set(new) if old.get(k) != new.get(k)}
+            print(f"mismatch #{idx}: {diff}", file=sys.stderr)
+    return mismatches
+
+def _elapsed(fn, texts) -> float:
+    t0 = time.perf_counter()
+    for text in texts:
+        fn(text)
+    return time.perf_counter() - t0
+
+def throughput(fns, texts, repeat: int):
+    # 各実装の最速の回のスループット（通/秒）。交互に回して、途中の負荷の変化が片方だけに乗らないようにする
+    best = [float("inf")] * len(fns)
+    for _ in range(repeat):
+        for i, fn in enumerate(fns):
+            best[i] = min(best[i], _elapsed(fn, texts))
+    return [len(texts) / b for b in best]
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="extract_fields の同等性確認とスループット計測")
+    ap.add_argument("--count", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    texts = list(generate_corpus(args.count, seed=args.seed)) + EDGE_CASES
+    mismatches = check_parity(texts)
+    print(f"parity: {len(texts) - mismatches}/{len(texts)} 一致")
+
+    legacy, current = throughput([legacy_extract_fields, extract_fields], texts, args.repeat)
+    print(f"legacy : {legacy:,.0f} emails/s")
+    print(f"current: {current:,.0f} emails/s (x{current / legacy:.2f})")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
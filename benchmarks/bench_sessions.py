@@ -0,0 +1,339 @@
+# report_maker/benchmarks/bench_sessions.py
+# 使い方: python -m benchmarks.bench_sessions [--sessions 1,4,16] [--workers N] [--out results.json]
+# 複数の操作者が同時に使ったときの負荷試験（ネットワーク不要）
+# AppTest で N セッションを用意し、それぞれ Step 1→3（認証・所属入力・疑似メールの貼り付け・抽出・一括編集・保存・生成）を行う
+# 同時実行数ごとに、再実行1回あたりの時間の分位点・生成待ち・セッションあたりのメモリ・1分あたりの完了件数を出す
+#
+# AppTest は実行のたびにプロセス共有の仮ランタイムを差し替えるため、複数を並行には動かせない。
+# そこで N セッションの操作を1回ずつ交互に進める（サーバでもスクリプトの実行は GIL で実質1本ずつ進む）。
+# 生成はジョブキューのワーカープロセスで実際に並行して行う。
+# 生成待ちの確認は、実際のアプリでは fragment だけが再実行されるが、AppTest ではアプリ全体を再実行するため別に集計する
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import warnings
+from collections import ChainMap
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, List, Optional
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# 必須項目 → Step 3 の一括編集の入力欄
+EDIT_WIDGETS = {
+    "通報者": "in_通報者", "受信内容": "ta_受信内容", "現着状況": "ta_現着状況", "原因": "ta_原因",
+    "処置内容": "ta_処置内容", "処理修理後": "in_処理修理後", "所属": "in_所属",
+}
+# 生成待ちの確認（アプリでは fragment の再実行）
+POLL_LABEL = "生成待ちの確認"
+# 1セッションの操作がこの秒数で終わらなければ打ち切る
+SESSION_TIMEOUT_SEC = 180
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    n = len(ordered)
+    if not n:
+        return {}
+
+    def pct(p: float) -> float:
+        return ordered[min(n - 1, int(round(p / 100 * (n - 1))))] * 1000
+
+    return {"n": n, "p50_ms": pct(50), "p90_ms": pct(90), "p99_ms": pct(99), "max_ms": ordered[-1] * 1000}
+
+def _rss_mb() -> float:
+    # 現在の RSS（/proc がなければピーク RSS）
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def _deep_size(obj, seen: set) -> int:
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (dict, MappingProxyType)):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, ChainMap):
+        size += sum(_deep_size(m, seen) for m in obj.maps)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(v, seen) for v in obj)
+    return size
+
+def _session_sizes(at) -> Dict[str, int]:
+    # セッションに保持している値のキーごとのバイト数（AppTest の内部から取り出す）
+    state = at.session_state._state.filtered_state
+    seen: set = set()
+    return {key: _deep_size(value, seen) for key, value in state.items()}
+
+class _Session:
+    def __init__(self, index: int, email: str, passcode: str):
+        from streamlit.testing.v1 import AppTest
+        self.index = index
+        self.email = email
+        self.passcode = passcode
+        self.at = AppTest.from_file(APP_PATH, default_timeout=120)
+        self.flow = self._flow()
+        self.ready_at = 0.0
+        self.pending = None
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.error: Optional[str] = None
+        self.rejected = 0
+        self.gen_waits: List[float] = []
+        self.sizes_editing: Dict[str, int] = {}
+
+    def _check(self, where: str, errors: bool = True):
+        at = self.at
+        if at.exception:
+            raise RuntimeError(f"{where}: {at.exception[0].value}")
+        shown = [e.value for e in at.error] if errors else []
+        if shown:
+            raise RuntimeError(f"{where}: {shown[0]}")
+
+    def _generated_now(self) -> bool:
+        ss = self.at.session_state
+        gen = ss.generated
+        return bool(gen) and gen["key"][1] == ss.data_version
+
+    def _wait_generated(self):
+        at = self.at
+        t0 = time.perf_counter()
+        while not self._generated_now():
+            if any(b.key == "retry_generate" for b in at.button):
+                # 混雑で断られたら少し待って押し直す
+                self.rejected += 1
+                yield "生成の再投入", lambda: at.button(key="retry_generate").click().run(), 1.0
+            else:
+                yield POLL_LABEL, at.run, 0.5
+            self._check("生成")
+        self.gen_waits.append(time.perf_counter() - t0)
+
+    def _flow(self):
+        # (集計名, 操作, 操作前に待つ秒数) を順に返す
+        at = self.at
+        yield "初回表示", at.run, 0
+        yield "認証", lambda: at.text_input[0].input(self.passcode).run(), 0
+        yield "認証", lambda: at.button[0].click().run(), 0
+        self._check("Step 2")
+        yield "入力", lambda: next(w for w in at.text_input if w.label == "所属").input(f"営業所{self.index}").run(), 0
+        yield "入力", lambda: next(w for w in at.text_input if w.label.startswith("処理修理後")).input("正常").run(), 0
+        yield "貼り付け", lambda: at.text_area[0].input(self.email).run(), 0
+        yield "抽出", lambda: next(b for b in at.button if b.label == "抽出する").click().run(), 0
+        # 必須項目の未入力はエラー表示になるが、次の編集で埋める
+        self._check("抽出", errors=False)
+
+        # 一括編集: 抽出できなかった必須項目を埋め、処置内容に追記して保存する
+        yield "編集", lambda: at.button(key="enter_edit_inline").click().run(), 0
+        extracted = at.session_state.extracted
+        for field, key in EDIT_WIDGETS.items():
+            if field == "処置内容" or not (extracted.get(field) or "").strip():
+                value = (extracted.get(field) or "").strip()
+                value = f"{value}\n試運転にて異常なし".strip() if field == "処置内容" else f"{field}（手入力）"
+                widget = at.text_input(key=key) if key.startswith("in_") else at.text_area(key=key)
+                yield "編集", lambda w=widget, v=value: w.input(v).run(), 0
+        self.sizes_editing = _session_sizes(at)
+        yield "保存", lambda: at.button(key="save_edit_inline").click().run(), 0
+        self._check("保存")
+        yield from self._wait_generated()
+
+def _run_level(n: int, seed: int, passcode: str) -> Dict:
+    from benchmarks.corpus import generate_email
+    rss_before = _rss_mb()
+    sessions = [_Session(i, generate_email(random.Random(seed * 100003 + i)), passcode) for i in range(n)]
+    latencies: Dict[str, List[float]] = {}
+    cpu_total = 0.0
+    active = list(sessions)
+    t_start = time.perf_counter()
+    while active:
+        # 待ち時間の明けたセッションから1操作ずつ進める
+        s = min(active, key=lambda x: x.ready_at)
+        now = time.perf_counter()
+        if s.ready_at > now:
+            time.sleep(s.ready_at - now)
+        try:
+            if time.perf_counter() - s.started > SESSION_TIMEOUT_SEC:
+                raise TimeoutError(f"{SESSION_TIMEOUT_SEC} 秒以内に終わりませんでした")
+            if s.pending is None:
+                label, action, delay = next(s.flow)
+                s.pending = (label, action)
+                if delay:
+                    s.ready_at = time.perf_counter() + delay
+                    continue
+            label, action = s.pending
+            s.pending = None
+            c0, t0 = time.process_time(), time.perf_counter()
+            action()
+            latencies.setdefault(label, []).append(time.perf_counter() - t0)
+            cpu_total += time.process_time() - c0
+            s.ready_at = time.perf_counter()
+        except StopIteration:
+            s.finished = time.perf_counter()
+            active.remove(s)
+        except Exception as e:
+            s.error = f"{type(e).__name__}: {e}"
+            s.finished = time.perf_counter()
+            active.remove(s)
+    wall = time.perf_counter() - t_start
+
+    done = [s for s in sessions if s.error is None]
+    sizes = [_session_sizes(s.at) for s in done]
+    rss_after = _rss_mb()
+    keys = sorted({k for d in sizes for k in d}, key=lambda k: -statistics.mean(d.get(k, 0) for d in sizes))
+    interactive = [v for label, vs in latencies.items() if label != POLL_LABEL for v in vs]
+    result = {
+        "sessions": n,
+        "completed": len(done),
+        "errors": [s.error for s in sessions if s.error],
+        "rejected": sum(s.rejected for s in sessions),
+        "wall_s": wall,
+        "flows_per_min": len(done) / wall * 60 if wall else None,
+        "script_cpu_s_per_flow": cpu_total / max(1, len(done)),
+        "rerun": _percentiles(interactive),
+        "rerun_by_action": {label: _percentiles(vs) for label, vs in latencies.items()},
+        "generate_wait": _percentiles([w for s in done for w in s.gen_waits]),
+        "flow_s": _percentiles([s.finished - s.started for s in done]),
+        "session_kb": statistics.mean(sum(d.values()) for d in sizes) / 1024 if sizes else None,
+        "session_kb_by_key": {k: statistics.mean(d.get(k, 0) for d in sizes) / 1024 for k in keys[:12]},
+        # 一括編集中（保存直前）の保持量。編集中の値は edit_buffer と入力欄の両方に持つ
+        "session_kb_editing": statistics.mean(sum(s.sizes_editing.values()) for s in done) / 1024 if done else None,
+        "edit_buffer_kb_editing": statistics.mean(s.sizes_editing.get("edit_buffer", 0) for s in done) / 1024 if done else None,
+        "rss_mb_per_session": (rss_after - rss_before) / n,
+    }
+    del sessions
+    return result
+
+def _job_seconds(seed: int, repeat: int = 3) -> float:
+    # 生成1件の時間（ジョブの投入から結果の受け取りまで、待ち行列なし）。セッションと同じジョブキューで測る
+    from benchmarks.corpus import generate_email
+    from core.jobs import get_queue
+    from core.parsing import extract_fields
+    from core.template_store import load_default_template
+    queue = get_queue()
+    key = load_default_template(os.path.join(os.path.dirname(APP_PATH), "template.xlsm"))
+    data = dict(extract_fields(generate_email(random.Random(seed))), 所属="営業所", 処理修理後="正常")
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        job_id = queue.submit(key, data)
+        queue.wait([job_id])
+        queue.result(job_id)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+def _shared_memory() -> Dict[str, float]:
+    # セッションではなくプロセスで1つだけ持つもの（テンプレート本体など）
+    from core import template_store
+    with template_store._templates_lock:
+        template_bytes = sum(len(e.data) for e in template_store._templates.values())
+    return {"template_store_kb": template_bytes / 1024, "templates": len(template_store._templates)}
+
+def _print_level(res: Dict):
+    r, g = res["rerun"], res["generate_wait"]
+    print(f"同時 {res['sessions']:>3}: 完了 {res['completed']}/{res['sessions']}  {res['flows_per_min']:.1f} 件/分  "
+          f"再実行 p50 {r.get('p50_ms', 0):.0f} / p90 {r.get('p90_ms', 0):.0f} / p99 {r.get('p99_ms', 0):.0f} ms  "
+          f"生成待ち p50 {g.get('p50_ms', 0) / 1000:.1f} s / p90 {g.get('p90_ms', 0) / 1000:.1f} s  "
+          f"セッション {res['session_kb'] or 0:.0f} KB（RSS 増 {res['rss_mb_per_session']:.1f} MB）  "
+          f"断られた生成 {res['rejected']}")
+    for err in res["errors"][:3]:
+        print(f"    失敗: {err}")
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="複数セッション同時利用の負荷試験（Step 1→3）")
+    ap.add_argument("--sessions", default="1,4,16", help="同時セッション数（カンマ区切りで順に計測）")
+    ap.add_argument("--workers", type=int, default=None, help="生成ワーカー数（REPORT_MAKER_JOB_WORKERS。0 で画面のスレッド内生成）")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="結果JSONの出力先（既定: benchmarks/results/sessions-<日時>.json）")
+    args = ap.parse_args(argv)
+
+    # 設定はモジュールの読み込み時に決まるため、アプリを読み込む前に環境変数で与える
+    # 索引・下書き置き場は使わない（既存のデータに触れない。同じ内容の報告書を索引から返す近道も通らない）
+    os.environ["REPORT_MAKER_INDEX"] = ""
+    os.environ["REPORT_MAKER_OUTBOX"] = ""
+    if args.workers is not None:
+        os.environ["REPORT_MAKER_JOB_WORKERS"] = str(args.workers)
+    warnings.filterwarnings("ignore")
+    # 入力欄の空ラベル警告がスタック付きで毎回出るため抑える
+    logging.getLogger("streamlit.elements.lib.policies").disabled = True
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+    from core.state import get_passcode
+    from core.settings import JOB_WORKERS, JOB_MAX_PENDING, JOB_MAX_PER_OWNER
+    passcode = os.getenv("APP_PASSCODE", "") or get_passcode()
+
+    levels = [int(s) for s in args.sessions.split(",") if s]
+    cores = os.cpu_count() or 1
+    print(f"CPU {cores} コア / 生成ワーカー {JOB_WORKERS} / 受付上限 {JOB_MAX_PENDING}（セッションごと {JOB_MAX_PER_OWNER}）")
+    # 1回目はワーカーの起動・テンプレートの解析を含むため計測に含めない
+    warmup = _run_level(1, args.seed + 999, passcode)
+    if warmup["errors"]:
+        print(f"準備の実行に失敗しました: {warmup['errors'][0]}", file=sys.stderr)
+        return 1
+
+    results = []
+    for n in levels:
+        res = _run_level(n, args.seed, passcode)
+        results.append(res)
+        _print_level(res)
+
+    best = max(results, key=lambda r: r["flows_per_min"] or 0)
+    cpu = statistics.median(r["script_cpu_s_per_flow"] for r in results)
+    # ワーカーを使わない設定では、生成は画面のスレッドで行われ画面側の CPU 時間に含まれる
+    job_s = _job_seconds(args.seed) if JOB_WORKERS > 0 else 0.0
+    limit = {
+        "observed_flows_per_min": best["flows_per_min"],
+        "observed_at_sessions": best["sessions"],
+        # 画面側（スクリプト実行は実質1本）の上限: 1件あたりのCPU時間から求める
+        "script_bound_flows_per_min": 60 / cpu if cpu else None,
+        # 生成側の上限: ワーカー数 ÷ 生成1件の時間
+        "job_bound_flows_per_min": JOB_WORKERS * 60 / job_s if job_s else None,
+        # CPU コア全体の上限: 画面側と生成側が同じコアを取り合う場合（生成はほぼ CPU 処理）
+        "cpu_bound_flows_per_min": cores * 60 / (cpu + job_s) if cpu + job_s else None,
+    }
+    bounds = [
+        ("画面側", limit["script_bound_flows_per_min"], f"CPU {cpu * 1000:.0f} ms/件"),
+        ("生成側", limit["job_bound_flows_per_min"], f"{JOB_WORKERS} ワーカー × {job_s:.1f} s/件"),
+        ("CPU 全体", limit["cpu_bound_flows_per_min"], f"{cores} コア"),
+    ]
+    bounds = [b for b in bounds if b[1]]
+    bottleneck = min(bounds, key=lambda b: b[1])[0] if bounds else "-"
+    print(f"上限の目安: 実測 {limit['observed_flows_per_min']:.1f} 件/分（同時 {limit['observed_at_sessions']}）、"
+          + "、".join(f"{name} {value:.0f} 件/分（{note}）" for name, value, note in bounds)
+          + f" → {bottleneck}が先に詰まる")
+    limit["bottleneck"] = bottleneck
+    shared = _shared_memory()
+    print(f"プロセス共有: テンプレート {shared['templates']} 件 {shared['template_store_kb']:.0f} KB（セッション数によらず一定）")
+    if results:
+        last = results[-1]
+        print("セッションあたりの保持量（KB）: " + ", ".join(
+            f"{k} {v:.1f}" for k, v in list(last["session_kb_by_key"].items())[:8]))
+        print(f"一括編集中: {last['session_kb_editing'] or 0:.1f} KB（edit_buffer {last['edit_buffer_kb_editing'] or 0:.1f} KB）")
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": cores,
+        "job_workers": JOB_WORKERS,
+        "seed": args.seed,
+        "levels": results,
+        "limit": limit,
+        "shared": shared,
+    }
+    out = args.out or os.path.join("benchmarks", "results", "sessions-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を書き出しました: {out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
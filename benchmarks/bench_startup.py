@@ -0,0 +1,85 @@
+# report_maker/benchmarks/bench_startup.py
+# 使い方: python -m benchmarks.bench_startup [--module app] [--repeat 5] [--top 15]
+# アプリ起動時の import にかかる時間を python -X importtime で測る（新しいプロセスで毎回測る）
+# app.py は __main__ 以外では画面を描画しないため、import app で Step 1 を返すまでの import 分だけを測れる
+# benchmarks.run の結果 JSON にも "startup" として含める
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# 起動時には読み込まれないはずの重いモジュール（読み込まれていたら回帰）
+HEAVY_MODULES = ("openpyxl", "pandas", "numpy", "pyarrow")
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    # "import time: self [us] | cumulative | imported package" の行を (名前, 自身 us, 累積 us) にする
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def _import_once(module: str) -> Tuple[float, List[Tuple[str, int, int]]]:
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, check=True)
+    rows = _parse_importtime(proc.stderr)
+    total_us = next((cum for name, _, cum in rows if name == module), sum(s for _, s, _ in rows))
+    return total_us / 1000, rows
+
+def measure_startup(module: str = "app", repeat: int = 5, top: int = 15) -> Dict:
+    # 1回目は .pyc の作成を含むため捨てる
+    _import_once(module)
+    totals, by_package = [], defaultdict(list)
+    rows: List[Tuple[str, int, int]] = []
+    for _ in range(repeat):
+        total_ms, rows = _import_once(module)
+        totals.append(total_ms)
+        per_package: Dict[str, int] = defaultdict(int)
+        for name, self_us, _ in rows:
+            per_package[name.split(".", 1)[0]] += self_us
+        for package, us in per_package.items():
+            by_package[package].append(us / 1000)
+    loaded = {name for name, _, _ in rows}
+    packages = sorted(((p, statistics.median(v)) for p, v in by_package.items()), key=lambda x: -x[1])
+    modules = sorted(rows, key=lambda r: -r[1])
+    return {
+        "module": module,
+        "repeat": repeat,
+        "total_ms_p50": statistics.median(totals),
+        "total_ms_min": min(totals),
+        "total_ms_max": max(totals),
+        "modules_loaded": len(loaded),
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in loaded],
+        "top_packages_ms": [{"package": p, "self_ms": round(ms, 2)} for p, ms in packages[:top]],
+        "top_modules_ms": [{"module": n, "self_ms": s / 1000, "cumulative_ms": c / 1000} for n, s, c in modules[:top]],
+    }
+
+def print_startup(result: Dict):
+    print(f"import {result['module']}: p50 {result['total_ms_p50']:.0f} ms "
+          f"(min {result['total_ms_min']:.0f} / max {result['total_ms_max']:.0f}, {result['modules_loaded']} モジュール)")
+    heavy = result["heavy_loaded"]
+    print("  起動時に読み込まれた重いモジュール: " + (", ".join(heavy) if heavy else "なし"))
+    for row in result["top_packages_ms"]:
+        print(f"  {row['package']:>24} {row['self_ms']:8.1f} ms")
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="アプリ起動時の import 時間の計測")
+    ap.add_argument("--module", default="app")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = ap.parse_args(argv)
+    result = measure_startup(args.module, repeat=args.repeat, top=args.top)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_startup(result)
+    return 1 if result["heavy_loaded"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# report_maker/benchmarks/bench_step3_reruns.py
+# 使い方: python -m benchmarks.bench_step3_reruns [--edits 20]
+# Step 3 の編集1回あたりの再実行範囲とサーバCPU時間を比べる
+# AppTest は操作のたびにアプリ全体を実行するため、
+#   変更前（編集ごとに全体を再実行）のコスト = アプリ全体1回分のCPU時間
+#   変更後（①区画だけ fragment 再実行）のコスト = ①区画の関数1回分のCPU時間
+# として、同じ実行の中で両方を測る
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+import warnings
+from typing import List
+
+EMAIL = """件名: 【故障完了】 HK10-103 テストビル
+管理番号: HK10-103
+物件名: テストビル
+住所: 北海道札幌市中央区北1条西2丁目
+受信時刻: 2024/05/01 10:00
+通報者: 管理人
+受信内容: ドア開閉時に異音がする
+現着時刻: 2024/05/01 10:40
+現着状況: 3階で停止したまま動かない
+原因: ドアシューが摩耗していた
+完了時刻: 2024/05/01 11:55
+処置内容: 部品を交換し試運転にて異常なし
+受付番号: 123456
+"""
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+EDIT_KEYS = ("in_通報者", "ta_受信内容", "ta_現着状況", "ta_原因", "ta_処置内容", "in_処理修理後", "in_所属")
+
+def _ms(v: List[float]) -> str:
+    return f"平均 {statistics.mean(v) * 1000:.2f} ms / 中央値 {statistics.median(v) * 1000:.2f} ms"
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Step 3 の編集1回あたりの再実行コスト")
+    ap.add_argument("--edits", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    warnings.filterwarnings("ignore")
+    # 入力欄の空ラベル警告がスタック付きで毎回出るため抑える
+    logging.getLogger("streamlit.elements.lib.policies").disabled = True
+    from streamlit.testing.v1 import AppTest
+    import ui.steps as steps
+
+    section_cpu: List[float] = []
+    original = steps._edit_section
+
+    def timed_edit_section():
+        t0 = time.process_time()
+        try:
+            return original()
+        finally:
+            section_cpu.append(time.process_time() - t0)
+
+    steps._edit_section = timed_edit_section
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=60)
+        at.run()
+        at.text_input[0].input("").run()
+        at.button[0].click().run()
+        at.text_input[0].input("札幌営業所").run()
+        at.text_input[1].input("正常").run()
+        at.text_area[0].input(EMAIL).run()
+        next(b for b in at.button if b.label == "抽出する").click().run()
+        at.button(key="enter_edit_inline").click().run()
+        if at.exception or not at.session_state.edit_mode:
+            print("Step 3 の編集モードに入れませんでした", file=sys.stderr)
+            return 1
+
+        full_cpu: List[float] = []
+        section_cpu.clear()
+        for i in range(args.edits):
+            key = EDIT_KEYS[i % len(EDIT_KEYS)]
+            widget = at.text_input(key=key) if key.startswith("in_") else at.text_area(key=key)
+            widget.input(f"{widget.value} 追記{i}")
+            t0 = time.process_time()
+            at.run()
+            full_cpu.append(time.process_time() - t0)
+    finally:
+        steps._edit_section = original
+
+    print(f"編集回数: {args.edits}")
+    print("アプリ全体の再実行/編集: 変更前 1 回 → 変更後 0 回（①区画の fragment 再実行 1 回）")
+    print(f"CPU/編集 変更前（全体再実行）: {_ms(full_cpu)}")
+    print(f"CPU/編集 変更後（①区画のみ）: {_ms(section_cpu)}")
+    print(f"セッション合計CPU（編集分）: 変更前 {sum(full_cpu) * 1000:.1f} ms → 変更後 {sum(section_cpu) * 1000:.1f} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# report_maker/benchmarks/bench_template_cache.py
+# 使い方: python -m benchmarks.bench_template_cache [--repeat N] [--template template.xlsm]
+import argparse
+import statistics
+import time
+import warnings
+from core.excel_writer import fill_template_xlsx, clear_template_cache
+
+SAMPLE = {
+    "管理番号": "HK10-103", "メーカー": "日立", "制御方式": "インバーター",
+    "通報者": "管理人", "対応者": "山田", "所属": "札幌営業所", "処理修理後": "正常",
+    "受信時刻": "2024/05/01 10:00", "現着時刻": "2024/05/01 10:40", "完了時刻": "2024/05/01 11:55",
+    "受信内容": "ドア開閉時に異音", "現着状況": "3階で停止中", "原因": "ドアシューの摩耗",
+    "処置内容": "ドアシュー交換\n試運転にて異常なし",
+}
+
+def _time_calls(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="テンプレートキャッシュの有無による1件あたりの生成時間比較")
+    ap.add_argument("--template", default="template.xlsm")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+    with open(args.template, "rb") as f:
+        template_bytes = f.read()
+
+    def cold():
+        clear_template_cache()
+        fill_template_xlsx(template_bytes, SAMPLE)
+
+    def warm():
+        fill_template_xlsx(template_bytes, SAMPLE)
+
+    cold_s = _time_calls(cold, args.repeat)
+    fill_template_xlsx(template_bytes, SAMPLE)
+    warm_s = _time_calls(warm, args.repeat)
+
+    cold_med = statistics.median(cold_s)
+    warm_med = statistics.median(warm_s)
+    print(f"cold (毎回パース): median {cold_med * 1000:.1f} ms / report")
+    print(f"warm (キャッシュ): median {warm_med * 1000:.1f} ms / report")
+    print(f"speedup: x{cold_med / warm_med:.2f}")
+
+if __name__ == "__main__":
+    main()
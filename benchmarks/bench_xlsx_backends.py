@@ -0,0 +1,47 @@
+# report_maker/benchmarks/bench_xlsx_backends.py
+# 使い方: python -m benchmarks.bench_xlsx_backends [--repeat N] [--template template.xlsm]
+import argparse
+import statistics
+import time
+import tracemalloc
+import warnings
+from core.excel_writer import fill_template_xlsx
+from benchmarks.bench_template_cache import SAMPLE
+
+BACKENDS = ("openpyxl", "zip")
+
+def _measure(template_bytes: bytes, backend: str, repeat: int):
+    # 1回目はテンプレートキャッシュの構築を含むため計測から外す
+    fill_template_xlsx(template_bytes, SAMPLE, backend=backend)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fill_template_xlsx(template_bytes, SAMPLE, backend=backend)
+        samples.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    fill_template_xlsx(template_bytes, SAMPLE, backend=backend)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return samples, peak
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="openpyxl と ZIP 直接書き換えの生成時間・ピークメモリ比較")
+    ap.add_argument("--template", default="template.xlsm")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+    with open(args.template, "rb") as f:
+        template_bytes = f.read()
+
+    results = {}
+    for backend in BACKENDS:
+        samples, peak = _measure(template_bytes, backend, args.repeat)
+        results[backend] = statistics.median(samples)
+        print(f"{backend:>8}: median {results[backend] * 1000:.1f} ms / report, "
+              f"peak {peak / 1024 / 1024:.1f} MiB (tracemalloc)")
+    print(f"speedup (zip vs openpyxl): x{results['openpyxl'] / results['zip']:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# report_maker/benchmarks/bench_xlsx_read.py
+# 使い方: python -m benchmarks.bench_xlsx_read [--extra-rows 20000] [--repeat 5] [--template template.xlsm]
+# 作成済み報告書のシートの後ろに行を足し、read_cells が last_row の行で読むのをやめるかを確かめる
+# last_row より後ろの行に置いた目印のセルが読まれていたら失敗にする。あわせて last_row の有無で所要時間を比べる
+import argparse
+import io
+import re
+import sys
+import time
+import warnings
+import zipfile
+from core.cellmap import default_plan
+from core.excel_writer import fill_template_xlsx
+from core.xlsx_patch import _resolve_sheet_path
+from core.xlsx_read import read_cells
+from benchmarks.bench_template_cache import SAMPLE
+
+_ROW_R_RE = re.compile(rb'<row[^>]*\sr="(\d+)"')
+
+def _with_extra_rows(xlsx_bytes: bytes, sheet_path: str, n: int):
+    # シートの末尾に n 行を足したブックと、足した最初の行の A 列の番地を返す
+    src = zipfile.ZipFile(io.BytesIO(xlsx_bytes))
+    xml = src.read(sheet_path)
+    start = max((int(r) for r in _ROW_R_RE.findall(xml)), default=0) + 1
+    rows = b"".join(b'<row r="%d"><c r="A%d" t="inlineStr"><is><t>x</t></is></c></row>' % (r, r)
+                    for r in range(start, start + n))
+    xml = xml.replace(b"</sheetData>", rows + b"</sheetData>", 1)
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            dst.writestr(info, xml if info.filename == sheet_path else src.read(info.filename))
+    return out.getvalue(), f"A{start}"
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="read_cells の last_row での打ち切り")
+    ap.add_argument("--template", default="template.xlsm")
+    ap.add_argument("--extra-rows", type=int, default=20000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+    with open(args.template, "rb") as f:
+        report = fill_template_xlsx(f.read(), SAMPLE)
+    plan = default_plan()
+    sheet_path = _resolve_sheet_path(zipfile.ZipFile(io.BytesIO(report)), plan.sheet)
+    data, marker = _with_extra_rows(report, sheet_path, args.extra_rows)
+    wanted = [addr for _, addr, _ in plan.fields] + [marker]
+
+    zf = zipfile.ZipFile(io.BytesIO(data))
+    stopped = read_cells(zf, sheet_path, wanted, last_row=plan.last_row)
+    full = read_cells(zf, sheet_path, wanted)
+    t_stop = _best(lambda: read_cells(zf, sheet_path, wanted, last_row=plan.last_row), args.repeat)
+    t_full = _best(lambda: read_cells(zf, sheet_path, wanted), args.repeat)
+    print(f"シート: {plan.sheet}（last_row={plan.last_row}、後ろに {args.extra_rows:,} 行）")
+    print(f"  last_row あり: {t_stop * 1000:7.2f} ms")
+    print(f"  last_row なし: {t_full * 1000:7.2f} ms（x{t_full / t_stop:.1f}）")
+
+    failed = False
+    if marker in stopped:
+        print(f"last_row より後ろの {marker} まで読んでいます")
+        failed = True
+    if marker not in full:
+        print(f"last_row なしで {marker} が読めません")
+        failed = True
+    if {a: v for a, v in full.items() if a != marker} != stopped:
+        print("last_row の前のセルの値が一致しません")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# report_maker/benchmarks/corpus.py
+# 計測・同等性確認用の完了メール（疑似データ）生成器
+import random
+from typing import Dict, Iterator, List, Optional
+from core.parsing import LABEL_CANON
+
+_BUILDINGS = ["札幌中央ビル", "すすきのタワー", "大通パークハイツ", "北12条マンション", "旭川駅前ビル", "函館ベイプラザ"]
+_ADDRESSES = ["北海道札幌市中央区北1条西2丁目", "北海道札幌市北区北12条西3丁目", "北海道旭川市宮下通8丁目", "北海道函館市若松町1-1"]
+_COMPANIES = ["北海道管理サービス", "道央ビルメンテ", "ノースファシリティ"]
+_MAKERS = ["日立", "三菱", "東芝", "オーチス", "フジテック"]
+_CONTROLS = ["インバーター", "リレー", "VVVF", "油圧"]
+_CONTRACTS = ["POG", "FM", "スポット"]
+_PEOPLE = ["山田", "佐藤", "鈴木", "高橋", "田中", "管理人", "清掃員"]
+_CASES = ["故障完了", "緊急出動完了", "閉じ込め完了"]
+_PHRASES = [
+    "ドア開閉時に異音がする", "3階で停止したまま動かない", "かご内照明が点灯しない",
+    "着床時に段差がある", "インターホンがつながらない", "走行中に振動がある",
+    "ドアシューが摩耗していた", "リミットスイッチの接触不良", "制御基板のリレー不良",
+    "部品を交換し試運転にて異常なし", "清掃・調整を実施し復旧", "後日部品交換予定",
+]
+
+# 正規名ごとの表記ゆれ（LABEL_CANON のキー）
+_ALIASES: Dict[str, List[str]] = {}
+for _raw, _canon in LABEL_CANON.items():
+    _ALIASES.setdefault(_canon, []).append(_raw)
+
+def _label(rng: random.Random, canon: str) -> str:
+    return rng.choice(_ALIASES.get(canon, [canon]))
+
+def _colon(rng: random.Random) -> str:
+    return rng.choice([":", "：", ": ", "： ", " : "])
+
+def _dt(rng: random.Random, base_min: int) -> str:
+    day = 1 + base_min // (24 * 60)
+    hh, mm = divmod(base_min % (24 * 60), 60)
+    style = rng.randrange(4)
+    if style == 0:
+        return f"2024/05/{day:02d} {hh:02d}:{mm:02d}"
+    if style == 1:
+        return f"2024-05-{day:02d} {hh:02d}:{mm:02d}:{rng.randrange(60):02d}"
+    if style == 2:
+        return f"2024年5月{day}日 {hh}:{mm:02d}"
+    return f"2024/5/{day}　{hh}:{mm:02d}"
+
+def _multiline(rng: random.Random, max_lines: int) -> List[str]:
+    lines = [rng.choice(_PHRASES) for _ in range(rng.randint(1, max_lines))]
+    if len(lines) > 1 and rng.random() < 0.3:
+        lines.insert(1, "")
+    return lines
+
+def generate_email(rng: random.Random, missing_rate: float = 0.1) -> str:
+    manageno = f"HK{rng.randint(1, 99):02d}-{rng.randint(1, 999):03d}"
+    out: List[str] = []
+    c = lambda: _colon(rng)
+
+    if rng.random() < 0.9:
+        out.append(f"件名: 【{rng.choice(_CASES)}】 {manageno} {rng.choice(_BUILDINGS)}")
+        out.append("")
+
+    def plain(label: str, value: Optional[str]):
+        if rng.random() < missing_rate:
+            return
+        out.append(f"{_label(rng, label)}{c()}{value if value is not None else ''}")
+
+    def multi(label: str, max_lines: int):
+        if rng.random() < missing_rate:
+            return
+        lines = _multiline(rng, max_lines)
+        name = _label(rng, label)
+        if rng.random() < 0.5:
+            out.append(f"{name}{c()}{lines[0]}")
+            out.extend(lines[1:])
+        else:
+            out.append(f"{name}{c()}")
+            out.extend(lines)
+
+    def url(label: str, path: str):
+        if rng.random() < missing_rate:
+            return
+        u = f"https://example.jp/{path}?id={rng.randint(1, 10**6)}"
+        name = _label(rng, label)
+        if rng.random() < 0.5:
+            out.append(f"{name}{c()}{u}")
+        else:
+            out.append(f"{name}{c()}")
+            out.append(u + rng.choice(["", ")", "」", "＞"]))
+
+    plain("管理番号", "" if rng.random() < 0.1 else manageno)
+    plain("物件名", rng.choice(_BUILDINGS))
+    plain("住所", rng.choice(_ADDRESSES))
+    plain("窓口会社", rng.choice(_COMPANIES))
+    plain("メーカー", rng.choice(_MAKERS))
+    plain("制御方式", rng.choice(_CONTROLS))
+    plain("契約種別", rng.choice(_CONTRACTS))
+
+    recv = rng.randint(0, 20 * 24 * 60)
+    arrive = recv + rng.randint(5, 120)
+    done = arrive + rng.randint(10, 240)
+    plain("受信時刻", _dt(rng, recv))
+    plain("通報者", rng.choice(_PEOPLE))
+    multi("受信内容", 4)
+    plain("現着時刻", _dt(rng, arrive))
+    multi("現着状況", 5)
+    multi("原因", 5)
+    plain("完了時刻", _dt(rng, done))
+    multi("処置内容", 6)
+    if rng.random() < 0.2:
+        out.append(f"備考{c()}{rng.choice(_PHRASES)}")
+    plain("対応者", rng.choice(_PEOPLE))
+    plain("完了連絡先1", f"011-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}")
+    plain("送信者", rng.choice(_PEOPLE))
+    url("受付URL", "detail")
+    url("現着完了登録URL", "entry")
+
+    receipt = str(rng.randint(100000, 999999))
+    if rng.random() < 0.5:
+        plain("受付番号", receipt)
+    elif rng.random() < 0.5:
+        out.append(f"※お問い合わせの際は 受付番号{c()}{receipt} をお伝えください")
+
+    sep = "\r\n" if rng.random() < 0.2 else "\n"
+    text = sep.join(out)
+    if rng.random() < 0.2:
+        text = text.replace(" ", "\t", 1)
+    return text
+
+def generate_datetimes(n: int, seed: int = 0) -> Iterator[str]:
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield _dt(rng, rng.randint(0, 28 * 24 * 60))
+
+def generate_corpus(n: int, seed: int = 0, missing_rate: float = 0.1) -> Iterator[str]:
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield generate_email(rng, missing_rate=missing_rate)
@@ -0,0 +1,143 @@
+# report_maker/benchmarks/run.py
+# 使い方: python -m benchmarks.run [--sizes 1,1000,100000] [--targets extract_fields,...] [--no-startup] [--out results.json]
+# 各計測はピークRSSを分けて測るため、計測ごとに新しいプロセスで実行する
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Dict, List
+
+DEFAULT_SIZES = (1, 1000, 100000)
+TARGETS = ("normalize_text", "extract_fields", "try_parse_datetime", "build_filename", "fill_template_xlsx")
+# 1件あたり数十〜数百ミリ秒かかる処理は件数を絞る（--no-cap で解除）
+SIZE_CAPS = {"fill_template_xlsx": 20}
+
+EXTRA_FIELDS = {"所属": "札幌営業所", "処理修理後": "正常"}
+
+def _percentiles(samples_ns: List[int]) -> Dict[str, float]:
+    ordered = sorted(samples_ns)
+    n = len(ordered)
+
+    def pct(p: float) -> float:
+        return ordered[min(n - 1, int(round(p / 100 * (n - 1))))] / 1e6
+
+    return {"p50_ms": pct(50), "p90_ms": pct(90), "p99_ms": pct(99), "max_ms": ordered[-1] / 1e6,
+            "mean_ms": sum(ordered) / n / 1e6}
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KiB、macOS は bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def _prepare(target: str, size: int, seed: int, backend: str):
+    from benchmarks.corpus import generate_corpus, generate_datetimes
+    from core.parsing import extract_fields, try_parse_datetime
+    from core.textutil import normalize_text
+    from core.excel_writer import fill_template_xlsx, build_filename
+
+    if target == "try_parse_datetime":
+        return try_parse_datetime, list(generate_datetimes(size, seed=seed))
+    texts = list(generate_corpus(size, seed=seed))
+    if target == "normalize_text":
+        return normalize_text, texts
+    if target == "extract_fields":
+        return extract_fields, texts
+
+    records = [dict(extract_fields(t), **EXTRA_FIELDS) for t in texts]
+    if target == "build_filename":
+        return build_filename, records
+
+    warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+    with open("template.xlsm", "rb") as f:
+        template_bytes = f.read()
+    return (lambda data: fill_template_xlsx(template_bytes, data, backend=backend)), records
+
+def _run_case(target: str, size: int, seed: int, backend: str) -> Dict:
+    fn, inputs = _prepare(target, size, seed, backend)
+    rss_before = _peak_rss_mb()
+    samples: List[int] = []
+    t_start = time.perf_counter()
+    for item in inputs:
+        t0 = time.perf_counter_ns()
+        fn(item)
+        samples.append(time.perf_counter_ns() - t0)
+    wall = time.perf_counter() - t_start
+    result = {"target": target, "size": len(inputs), "total_s": wall,
+              "items_per_s": len(inputs) / wall if wall else None,
+              "peak_rss_mb": _peak_rss_mb(), "peak_rss_before_run_mb": rss_before}
+    if target == "fill_template_xlsx":
+        result["backend"] = backend
+    result.update(_percentiles(samples))
+    return result
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return ""
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="報告書生成パイプラインのベンチマーク")
+    ap.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES))
+    ap.add_argument("--targets", default=",".join(TARGETS))
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--backend", choices=("openpyxl", "zip"), default="openpyxl")
+    ap.add_argument("--no-cap", action="store_true", help="fill_template_xlsx などの件数上限を外す")
+    ap.add_argument("--no-startup", action="store_true", help="起動時の import 時間の計測を省く")
+    ap.add_argument("--out", default=None, help="結果JSONの出力先（既定: benchmarks/results/<日時>.json）")
+    args = ap.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    targets = [t for t in args.targets.split(",") if t]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        ap.error(f"未知の計測対象: {', '.join(sorted(unknown))}")
+
+    results = []
+    ctx = get_context("spawn")
+    for target in targets:
+        run_sizes = []
+        for size in sizes:
+            capped = size if args.no_cap else min(size, SIZE_CAPS.get(target, size))
+            if capped not in run_sizes:
+                run_sizes.append(capped)
+        for size in run_sizes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+                res = ex.submit(_run_case, target, size, args.seed, args.backend).result()
+            results.append(res)
+            print(f"{target:>20} n={res['size']:<7} p50 {res['p50_ms']:.3f} ms  p99 {res['p99_ms']:.3f} ms  "
+                  f"{res['items_per_s']:,.1f}/s  peak RSS {res['peak_rss_mb']:.0f} MB")
+
+    startup = None
+    if not args.no_startup:
+        from benchmarks.bench_startup import measure_startup, print_startup
+        startup = measure_startup("app")
+        print_startup(startup)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": results,
+        "startup": startup,
+    }
+    out = args.out or os.path.join("benchmarks", "results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を書き出しました: {out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
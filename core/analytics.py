@@ -0,0 +1,86 @@
+# report_maker/core/analytics.py
+# 多数の抽出結果（extract_fields の戻り値）をまとめて集計する
+# 日時の解析は重複を除いた値ごとに1回だけ行い（dtparse.parse_datetimes）、
+# 所要時間・分位点・内訳はすべて pandas の列演算で求めるため、10万件でも行ごとの Python 処理がない
+from typing import Dict, Iterable, Mapping, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from .dtparse import parse_datetimes
+
+DATETIME_FIELDS = ("受信時刻", "現着時刻", "完了時刻")
+
+# Step 3 の「受付〜現着」「作業時間」「受付〜完了」と同じ区間
+INTERVALS: Dict[str, Tuple[str, str]] = {
+    "受付〜現着_分": ("受信時刻", "現着時刻"),
+    "作業時間_分": ("現着時刻", "完了時刻"),
+    "受付〜完了_分": ("受信時刻", "完了時刻"),
+}
+
+BREAKDOWN_KEYS = ("メーカー", "制御方式", "窓口会社", "案件種別(件名)")
+DEFAULT_PERCENTILES = (0.5, 0.9, 0.95)
+UNSET_LABEL = "（未設定）"
+
+def build_frame(records: Iterable[Mapping[str, Optional[str]]]) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(list(records))
+    for col in DATETIME_FIELDS + BREAKDOWN_KEYS:
+        if col not in df.columns:
+            df[col] = None
+    return add_intervals(df)
+
+def parse_datetime_columns(df: pd.DataFrame) -> Dict[str, pd.Series]:
+    # 日時列を datetime64[us, JST] に変換する（解析できない値は NaT）
+    return {col: parse_datetimes(df[col].astype("object")) for col in DATETIME_FIELDS}
+
+def add_intervals(df: pd.DataFrame, parsed: Optional[Dict[str, pd.Series]] = None) -> pd.DataFrame:
+    # minutes_between と同じく分単位の切り捨て（負の値もそのまま残す）
+    parsed = parsed or parse_datetime_columns(df)
+    for name, (start, end) in INTERVALS.items():
+        df[name] = ((parsed[end] - parsed[start]) // pd.Timedelta(minutes=1)).astype("Int64")
+    return df
+
+def _pct_label(p: float) -> str:
+    return f"p{p * 100:g}"
+
+def _interval_values(df: pd.DataFrame) -> pd.DataFrame:
+    # 負の値（時刻の入力誤り）は集計から除く
+    values = df[list(INTERVALS)].astype("float64")
+    return values.where(values >= 0)
+
+def _group_codes(keys: pd.Series):
+    # 文字列のまま groupby するより、整数コードにしてから集計するほうが速い
+    codes, uniques = pd.factorize(keys.where(keys != ""), use_na_sentinel=True)
+    labels = list(uniques) + [UNSET_LABEL]
+    codes = np.where(codes < 0, len(uniques), codes)
+    return codes, labels
+
+def interval_summary(df: pd.DataFrame, by: Optional[str] = None,
+                     percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+                     values: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    # 区間ごとの件数・平均・分位点
+    values = _interval_values(df) if values is None else values
+    if df.empty:
+        names = ["件数"] + [f"{name} {stat}" for name in INTERVALS
+                           for stat in ["件数", "平均"] + [_pct_label(p) for p in percentiles]]
+        return pd.DataFrame(columns=names, index=pd.Index([], name=by or "集計"))
+    if by is None:
+        codes, labels = np.zeros(len(df), dtype=np.intp), ["全体"]
+    else:
+        codes, labels = _group_codes(df[by])
+    grouped = values.groupby(codes, sort=False)
+
+    counts, means = grouped.count(), grouped.mean()
+    quantiles = grouped.quantile(list(percentiles)).unstack()
+    columns = {"件数": grouped.size()}
+    for name in INTERVALS:
+        columns[f"{name} 件数"] = counts[name]
+        columns[f"{name} 平均"] = means[name].round(1)
+        for p in percentiles:
+            columns[f"{name} {_pct_label(p)}"] = quantiles[(name, p)]
+    out = pd.DataFrame(columns)
+    out.index = pd.Index([labels[c] for c in out.index], name=by or "集計")
+    return out.sort_values("件数", ascending=False, kind="stable")
+
+def breakdowns(df: pd.DataFrame, keys: Sequence[str] = BREAKDOWN_KEYS,
+               percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, pd.DataFrame]:
+    values = _interval_values(df)
+    return {key: interval_summary(df, by=key, percentiles=percentiles, values=values) for key in keys}
@@ -0,0 +1,233 @@
+# report_maker/core/archive_index.py
+# 使い方: python -m core.archive_index <フォルダ|.xlsm> ... -o <索引.parquet|索引.csv> [--workers N] [--full]
+# 作成済み報告書（.xlsm）のアーカイブから、fill_template_xlsx が書き込むセルを読み出して列形式で保存する
+# openpyxl でブック全体を開かず、ZIP から対象シートの XML（と共有文字列）だけを逐次読みするため、
+# ファイルが大きくてもメモリ使用量は一定。再実行時は更新時刻・サイズ・ハッシュが同じファイルを読み直さない
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from .settings import JST
+from .xlsx_patch import _resolve_sheet_path
+from .xlsx_read import read_cells
+from .cellmap import default_plan
+
+log = logging.getLogger("report_maker.archive_index")
+
+ARCHIVE_SUFFIXES = (".xlsm", ".xlsx")
+
+# fill_template_xlsx が書き込むセル（標準の様式の定義から取る）
+_PLAN = default_plan()
+SINGLE_CELLS = {key: addr for key, addr, _ in _PLAN.fields}
+CREATED_CELLS = _PLAN.created
+# 年・月・日・時・分の番地（曜日は日付から分かるため読まない）
+DT_BLOCKS = {key: (y, mo, d, hh, mm) for key, (y, mo, d, _wd, hh, mm) in _PLAN.datetimes}
+MULTILINE_BLOCKS = dict(_PLAN.multiline)
+
+META_COLUMNS = ["path", "size", "mtime_ns", "sha256", "error"]
+DATETIME_COLUMNS = ["作成日"] + list(DT_BLOCKS)
+ARCHIVE_COLUMNS = META_COLUMNS + list(SINGLE_CELLS) + DATETIME_COLUMNS + list(MULTILINE_BLOCKS)
+
+WANTED_CELLS = set(SINGLE_CELLS.values()) | set(CREATED_CELLS) | {a for addrs in DT_BLOCKS.values() for a in addrs if a} \
+    | {a for addrs in MULTILINE_BLOCKS.values() for a in addrs}
+
+def _as_int(value) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def _block_datetime(cells: Dict[str, object], addrs: Tuple[Optional[str], ...]) -> Optional[datetime]:
+    y, mo, d, hh, mm = (_as_int(cells.get(a)) if a else None for a in addrs)
+    if y is None or mo is None or d is None:
+        return None
+    try:
+        return datetime(y, mo, d, hh or 0, mm or 0, tzinfo=JST)
+    except ValueError:
+        return None
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def read_report(path: str) -> Dict[str, object]:
+    with zipfile.ZipFile(path) as zf:
+        cells = read_cells(zf, _resolve_sheet_path(zf, _PLAN.sheet), WANTED_CELLS, last_row=_PLAN.last_row)
+
+    row: Dict[str, object] = {key: _text(cells.get(addr)) for key, addr in SINGLE_CELLS.items()}
+    y, mo, d = (_as_int(cells.get(a)) for a in CREATED_CELLS)
+    try:
+        row["作成日"] = datetime(y, mo, d, tzinfo=JST) if None not in (y, mo, d) else None
+    except ValueError:
+        row["作成日"] = None
+    for key, addrs in DT_BLOCKS.items():
+        row[key] = _block_datetime(cells, addrs)
+    for key, addrs in MULTILINE_BLOCKS.items():
+        lines = [_text(cells.get(a)) for a in addrs]
+        row[key] = "\n".join(ln for ln in lines if ln) or None
+    return row
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _index_one(path: str, size: int, mtime_ns: int, known_sha: Optional[str]) -> Dict[str, object]:
+    meta = {"path": path, "size": size, "mtime_ns": mtime_ns, "error": None}
+    try:
+        meta["sha256"] = file_sha256(path)
+        if meta["sha256"] == known_sha:
+            # 更新時刻だけ変わったファイルは読み直さない
+            return dict(meta, unchanged=True)
+        return dict(meta, **read_report(path))
+    except Exception as e:
+        return dict(meta, sha256=meta.get("sha256"), error=f"{type(e).__name__}: {e}")
+
+def iter_archive_files(paths) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    # Excel の一時ファイル（~$...）は除く
+                    if name.lower().endswith(ARCHIVE_SUFFIXES) and not name.startswith("~$"):
+                        yield os.path.abspath(os.path.join(root, name))
+        elif os.path.isfile(path):
+            yield os.path.abspath(path)
+
+def load_store(path: str):
+    import pandas as pd
+
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=ARCHIVE_COLUMNS)
+    if path.lower().endswith(".parquet"):
+        return pd.read_parquet(path)
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""])
+    for col in ("size", "mtime_ns"):
+        df[col] = pd.to_numeric(df[col]).astype("Int64")
+    for col in DATETIME_COLUMNS:
+        df[col] = pd.to_datetime(df[col], utc=True, errors="coerce").dt.tz_convert(JST)
+    return df
+
+def save_store(df, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    if path.lower().endswith(".parquet"):
+        try:
+            df.to_parquet(tmp, index=False)
+        except ImportError as e:
+            raise RuntimeError("Parquet で保存するには pyarrow が必要です（.csv を指定すると不要です）。") from e
+    else:
+        df.to_csv(tmp, index=False, date_format="%Y-%m-%dT%H:%M:%S%z")
+    os.replace(tmp, path)
+
+def _to_frame(rows: List[Dict[str, object]]):
+    import pandas as pd
+
+    df = pd.DataFrame(rows, columns=ARCHIVE_COLUMNS)
+    for col in ("size", "mtime_ns"):
+        df[col] = df[col].astype("Int64")
+    for col in DATETIME_COLUMNS:
+        df[col] = pd.to_datetime(df[col], utc=True, errors="coerce").dt.tz_convert(JST)
+    return df
+
+def _failed(row) -> bool:
+    # CSV から読み戻すと空欄は NaN になるため、文字列かどうかで判定する
+    return isinstance(row.error, str) and bool(row.error)
+
+def _under_roots(path: str, roots: List[str]) -> bool:
+    return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in roots)
+
+def build_index(inputs, store_path: str, workers: Optional[int] = None, full: bool = False) -> Dict[str, int]:
+    import pandas as pd
+
+    workers = workers or os.cpu_count() or 1
+    old = load_store(store_path) if not full else pd.DataFrame(columns=ARCHIVE_COLUMNS)
+    known = {r.path: r for r in old.itertuples(index=False)}
+    counts = {"indexed": 0, "unchanged": 0, "failed": 0, "removed": 0}
+    keep: List[str] = []
+    moved: Dict[str, Tuple[int, int]] = {}
+    rows: List[Dict[str, object]] = []
+
+    def _collect(done):
+        for fut in done:
+            res = fut.result()
+            if res.pop("unchanged", False):
+                counts["unchanged"] += 1
+                keep.append(res["path"])
+                moved[res["path"]] = (res["size"], res["mtime_ns"])
+                continue
+            counts["failed" if res["error"] else "indexed"] += 1
+            if res["error"]:
+                log.error("読み込み失敗: %s (%s)", res["path"], res["error"])
+            rows.append(res)
+
+    seen = set()
+    # 投入数を絞り、数千ファイルでも未処理の結果がメモリに溜まらないようにする
+    max_pending = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pending = set()
+        for path in iter_archive_files(inputs):
+            if path in seen:
+                continue
+            seen.add(path)
+            st = os.stat(path)
+            prev = known.get(path)
+            if prev is not None and prev.size == st.st_size and prev.mtime_ns == st.st_mtime_ns and not _failed(prev):
+                counts["unchanged"] += 1
+                keep.append(path)
+                continue
+            known_sha = prev.sha256 if prev is not None and not _failed(prev) else None
+            pending.add(ex.submit(_index_one, path, st.st_size, st.st_mtime_ns, known_sha))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done)
+        _collect(wait(pending).done)
+
+    # 今回走査しなかった記録は、走査した範囲内か、ファイルがなくなっている場合だけ消す
+    # （一部のフォルダだけを索引し直しても、ほかのフォルダの記録は残す）
+    roots = [os.path.abspath(p) for p in inputs]
+    for path in set(known) - seen:
+        if _under_roots(path, roots) or not os.path.exists(path):
+            counts["removed"] += 1
+        else:
+            keep.append(path)
+    kept = old[old["path"].isin(keep)].copy()
+    if moved:
+        idx = kept["path"].map(lambda p: p in moved)
+        kept.loc[idx, "size"] = kept.loc[idx, "path"].map(lambda p: moved[p][0])
+        kept.loc[idx, "mtime_ns"] = kept.loc[idx, "path"].map(lambda p: moved[p][1])
+    frames = [f for f in (kept, _to_frame(rows)) if len(f)]
+    df = pd.concat(frames, ignore_index=True) if frames else _to_frame([])
+    df = df.sort_values("path", kind="stable").reset_index(drop=True)
+    save_store(df[ARCHIVE_COLUMNS], store_path)
+    return counts
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m core.archive_index",
+                                 description="作成済み報告書(.xlsm)のアーカイブから列形式の索引を作成します")
+    ap.add_argument("inputs", nargs="+", help="報告書のフォルダ、または個別の .xlsm ファイル")
+    ap.add_argument("-o", "--out", required=True, help="索引の保存先（.parquet または .csv）")
+    ap.add_argument("--workers", type=int, default=None, help="並列プロセス数（既定: CPU数）")
+    ap.add_argument("--full", action="store_true", help="前回の索引を使わず、すべて読み直す")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    counts = build_index(args.inputs, args.out, workers=args.workers, full=args.full)
+    log.info("完了: 読込 %d 件 / 変更なし %d 件 / 失敗 %d 件 / 削除 %d 件",
+             counts["indexed"], counts["unchanged"], counts["failed"], counts["removed"])
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+# report_maker/core/batch.py
+# 使い方: python -m core.batch <フォルダ|mbox|maildir|.eml|.txt> ... -o <出力フォルダ|出力.zip> --affiliation <所属> [--processing-after <処理修理後>]
+# streamlit を読み込まないため、画面を起動せずに大量のメールから報告書を一括生成できる
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, Optional, Tuple
+from .settings import REQUIRED_KEYS, XLSX_BACKEND
+from .extract_cache import ExtractCache
+from .cellmap import CellMapError, plan_for_template
+from .excel_writer import fill_template_xlsx, build_filename, template_hash
+from .mailstream import is_maildir, iter_mailbox_texts, message_to_text, parse_message
+from .report_index import ReportIndex
+from .report_zip import ReportZip, unique_name
+from . import instrument
+
+log = logging.getLogger("report_maker.batch")
+
+MAIL_SUFFIXES = (".eml", ".txt")
+
+def _read_text_file(path: str) -> str:
+    with open(path, "rb") as f:
+        raw = f.read()
+    for enc in ("utf-8-sig", "cp932"):
+        try:
+            return raw.decode(enc)
+        except UnicodeDecodeError:
+            pass
+    return raw.decode("utf-8", errors="replace")
+
+def _parse_eml(path: str) -> str:
+    with open(path, "rb") as f:
+        return message_to_text(parse_message(f.read()))
+
+def iter_messages(path: str) -> Iterator[Tuple[str, str]]:
+    if os.path.isdir(path) and is_maildir(path):
+        yield from iter_mailbox_texts(path, use_message_id=False)
+        return
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            full = os.path.join(path, name)
+            if os.path.isfile(full) and name.lower().endswith(MAIL_SUFFIXES):
+                yield from iter_messages(full)
+        return
+
+    lower = path.lower()
+    if lower.endswith(".eml"):
+        yield path, _parse_eml(path)
+    elif lower.endswith(".txt"):
+        yield path, _read_text_file(path)
+    else:
+        yield from iter_mailbox_texts(path, use_message_id=False)
+
+_worker_template: Optional[bytes] = None
+_worker_cache: Optional[ExtractCache] = None
+
+def _init_worker(template_path: str, cache_path: Optional[str] = None):
+    global _worker_template, _worker_cache
+    with open(template_path, "rb") as f:
+        _worker_template = f.read()
+    # cache_path を指定すると、ワーカー間・再実行間で抽出結果を共有する
+    _worker_cache = ExtractCache(path=cache_path)
+
+def _process_one(source: str, raw_text: str, extra: Dict[str, str], backend: str):
+    cached = False
+    try:
+        hits = _worker_cache.hits
+        data = dict(_worker_cache.extract(raw_text))
+        cached = _worker_cache.hits > hits
+        data.update(extra)
+        missing = [k for k in REQUIRED_KEYS if not (data.get(k) or "").strip()]
+        if missing:
+            return source, "skipped", "必須項目が未入力: " + "・".join(missing), None, cached, None
+        xlsx_bytes = fill_template_xlsx(_worker_template, data, backend=backend)
+        return source, "ok", build_filename(data), xlsx_bytes, cached, data
+    except Exception as e:
+        return source, "failed", f"{type(e).__name__}: {e}", None, cached, None
+    finally:
+        # 段階別計測はログに出力済み。取り出す先のないワーカーで溜まり続けないよう1通ごとに捨てる
+        instrument.drain()
+
+def _unique_path(out_dir: str, fname: str, used: set) -> str:
+    return os.path.join(out_dir, unique_name(fname, used, lambda c: os.path.exists(os.path.join(out_dir, c))))
+
+def run_batch(inputs, out_dir: str, template_path: str, extra: Dict[str, str],
+              workers: Optional[int] = None, backend: str = XLSX_BACKEND,
+              cache_path: Optional[str] = None, index_path: Optional[str] = None) -> Dict[str, int]:
+    # 出力先が .zip なら、報告書を1件ずつ1つの ZIP に書き込む（書き終えてから置き換える）
+    bundle = None
+    if out_dir.lower().endswith(".zip"):
+        os.makedirs(os.path.dirname(os.path.abspath(out_dir)), exist_ok=True)
+        bundle = ReportZip(open(out_dir + ".tmp", "wb"))
+    else:
+        os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    counts = {"ok": 0, "skipped": 0, "failed": 0, "cache_hits": 0}
+    used: set = set()
+    # index_path を指定したときだけ、生成した報告書を索引に記録する（書き込みは親プロセスだけで行う）
+    # 報告書は出力先に残るため、索引には本体を保存せずハッシュだけを記録する
+    index = ReportIndex(index_path) if index_path else None
+    template_key = None
+    if index is not None:
+        with open(template_path, "rb") as f:
+            template_key = template_hash(f.read())
+
+    def _collect(done):
+        for fut in done:
+            source, status, detail, payload, cached, data = fut.result()
+            counts[status] += 1
+            counts["cache_hits"] += cached
+            if status == "ok":
+                if bundle is not None:
+                    name = bundle.add(data, payload, detail)
+                else:
+                    name = os.path.basename(_unique_path(out_dir, detail, used))
+                    with open(os.path.join(out_dir, name), "wb") as f:
+                        f.write(payload)
+                if index is not None:
+                    index.record(data, name, payload, template_key=template_key, source=source, store_content=False)
+                log.info("生成: %s -> %s", source, name)
+            elif status == "skipped":
+                log.warning("スキップ: %s (%s)", source, detail)
+            else:
+                log.error("失敗: %s (%s)", source, detail)
+
+    # 投入数を絞り、巨大な mbox でも未処理メッセージがメモリに溜まらないようにする
+    max_pending = workers * 4
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(template_path, cache_path)) as ex:
+            pending = set()
+            for path in inputs:
+                for source, raw_text in iter_messages(path):
+                    pending.add(ex.submit(_process_one, source, raw_text, extra, backend))
+                    if len(pending) >= max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        _collect(done)
+            _collect(wait(pending).done)
+    except BaseException:
+        if bundle is not None:
+            bundle.discard()
+            os.remove(out_dir + ".tmp")
+        raise
+    finally:
+        if index is not None:
+            index.close()
+    if bundle is not None:
+        bundle.finish().close()
+        os.replace(out_dir + ".tmp", out_dir)
+    return counts
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m core.batch", description="完了メールから報告書(.xlsm)を一括生成します")
+    ap.add_argument("inputs", nargs="+", help=".eml/.txt を含むフォルダ、maildir、mbox ファイル、または個別のメールファイル")
+    ap.add_argument("-o", "--out-dir", required=True, help="報告書の出力先フォルダ（.zip を指定すると1つの ZIP にまとめる）")
+    ap.add_argument("--template", default="template.xlsm", help="テンプレート(.xlsm)のパス")
+    ap.add_argument("--affiliation", default="", help="所属（画面の Step 2 と同じ値）")
+    ap.add_argument("--processing-after", default="", help="処理修理後（画面の Step 2 と同じ値）")
+    ap.add_argument("--workers", type=int, default=None, help="並列プロセス数（既定: CPU数）")
+    ap.add_argument("--backend", choices=("openpyxl", "zip"), default=XLSX_BACKEND, help="Excel書き込み方式")
+    ap.add_argument("--extract-cache", default=None, help="抽出結果を保存する SQLite ファイル（再実行時に重複メールの解析を省く）")
+    ap.add_argument("--index", default=None, help="生成した報告書を記録する索引（SQLite）のパス（既定: 記録しない）")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not os.path.exists(args.template):
+        log.error("テンプレートが見つかりません: %s", args.template)
+        return 2
+    try:
+        with open(args.template, "rb") as f:
+            plan = plan_for_template(f.read())
+    except CellMapError as e:
+        log.error("テンプレートが様式に合いません: %s", e)
+        return 2
+    log.info("様式: %s", plan.name)
+
+    extra = {"所属": args.affiliation, "処理修理後": args.processing_after}
+    counts = run_batch(args.inputs, args.out_dir, args.template, extra,
+                       workers=args.workers, backend=args.backend, cache_path=args.extract_cache,
+                       index_path=args.index)
+    log.info("完了: 生成 %d 件 / スキップ %d 件 / 失敗 %d 件（抽出キャッシュ一致 %d 件）",
+             counts["ok"], counts["skipped"], counts["failed"], counts["cache_hits"])
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+# report_maker/core/cellmap.py
+# 報告書のセル配置（様式）の定義を読み込み、書き込み計画（WritePlan）に変換する
+# 定義は cellmaps/*.json。番地の検査・複数行欄の展開は読み込み時に1回だけ行い、
+# 生成のたびには決まった番地へ値を詰めるだけにする
+# テンプレートは様式と照合し（シート・見出しセル・結合セル）、最初に通った様式で書き込む
+# 様式のシート名がテンプレートにない場合は、従来どおり開いているシート（wb.active）で照合・書き込みする
+# （シート名が一致する様式を優先し、どれも通らなければ開いているシートで照合し直す）
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from xml.etree import ElementTree as ET
+from .settings import CELLMAP_DIR, JST, TEMPLATE_CACHE_MAX
+from .textutil import split_lines
+from .parsing import try_parse_datetime, split_dt_components
+from .xlsx_patch import _NS_MAIN, _resolve_sheet_path
+from .xlsx_read import read_cells, read_merged_ranges
+
+_ADDR_RE = re.compile(r"^([A-Z]{1,3})([1-9]\d*)$")
+_SPEC_KEYS = {"name", "sheet", "expect", "created", "fields", "datetimes", "multiline"}
+_DT_PARTS = ("year", "month", "day", "weekday", "hour", "minute")
+_CREATED_PARTS = ("year", "month", "day")
+
+class CellMapError(ValueError):
+    pass
+
+def _col_index(col: str) -> int:
+    n = 0
+    for ch in col:
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+def _col_letter(n: int) -> str:
+    out = ""
+    while n:
+        n, r = divmod(n - 1, 26)
+        out = chr(65 + r) + out
+    return out
+
+def _split(addr: str) -> Tuple[int, int]:
+    m = _ADDR_RE.match(addr)
+    return _col_index(m.group(1)), int(m.group(2))
+
+def _label(text) -> str:
+    # 見出しは字間の空白（全角含む）を除いて比べる
+    return re.sub(r"\s+", "", str(text or ""))
+
+class WritePlan:
+    __slots__ = ("name", "sheet", "expect", "created", "fields", "datetimes", "multiline", "targets", "last_row")
+
+    def __init__(self, name: str, sheet: str, expect, created, fields, datetimes, multiline):
+        self.name = name
+        self.sheet = sheet
+        self.expect: Tuple[Tuple[str, str], ...] = expect
+        # (年, 月, 日) の番地
+        self.created: Tuple[str, str, str] = created
+        # (項目, 番地, 前後の空白を除くか)
+        self.fields: Tuple[Tuple[str, str, bool], ...] = fields
+        # (項目, (年, 月, 日, 曜日, 時, 分) の番地。使わない部分は None)
+        self.datetimes: Tuple[Tuple[str, Tuple[Optional[str], ...]], ...] = datetimes
+        # (項目, 上から順の番地)
+        self.multiline: Tuple[Tuple[str, Tuple[str, ...]], ...] = multiline
+        # 書き込むすべての番地 → 項目名（照合のエラー表示用）
+        targets: Dict[str, str] = {}
+        for key, addr, _ in fields:
+            targets[addr] = key
+        for part, addr in zip(_CREATED_PARTS, created):
+            targets[addr] = f"作成日({part})"
+        for key, addrs in datetimes:
+            targets.update({a: key for a in addrs if a})
+        for key, addrs in multiline:
+            targets.update({a: key for a in addrs})
+        self.targets = targets
+        self.last_row = max(_split(a)[1] for a in list(targets) + [a for a, _ in expect])
+
+    def cells(self, data: Dict[str, Optional[str]], now: Optional[datetime] = None) -> Dict[str, object]:
+        out: Dict[str, object] = {}
+        for key, addr, strip in self.fields:
+            value = data.get(key)
+            if strip:
+                value = (value or "").strip()
+            if value:
+                out[addr] = value
+
+        now = now or datetime.now(JST)
+        y_addr, m_addr, d_addr = self.created
+        out[y_addr], out[m_addr], out[d_addr] = now.year, now.month, now.day
+
+        for key, addrs in self.datetimes:
+            y, m, d, wd, hh, mm = split_dt_components(try_parse_datetime(data.get(key)))
+            values = (y, m, d, wd, None if hh is None else f"{hh:02d}", None if mm is None else f"{mm:02d}")
+            for addr, value in zip(addrs, values):
+                if addr and value is not None:
+                    out[addr] = value
+
+        for key, addrs in self.multiline:
+            for addr in addrs:
+                out[addr] = ""
+            text = data.get(key)
+            if text:
+                for addr, line in zip(addrs, split_lines(text, max_lines=len(addrs))):
+                    out[addr] = line
+        return out
+
+def _addr(value, where: str, errors: List[str]) -> Optional[str]:
+    if not isinstance(value, str) or not _ADDR_RE.match(value):
+        errors.append(f"{where}: セル番地が不正です（{value!r}）")
+        return None
+    return value
+
+def _block(spec: Dict, name: str, errors: List[str]) -> Dict:
+    value = spec.get(name) or {}
+    if not isinstance(value, dict):
+        errors.append(f"{name}: 「キー: 値」のオブジェクトで書いてください")
+        return {}
+    return value
+
+def compile_spec(spec: Dict, name: Optional[str] = None) -> WritePlan:
+    errors: List[str] = []
+    if not isinstance(spec, dict):
+        raise CellMapError("様式の定義はオブジェクトで書いてください。")
+    unknown = set(spec) - _SPEC_KEYS
+    if unknown:
+        errors.append("未知の項目: " + ", ".join(sorted(unknown)))
+    sheet = spec.get("sheet")
+    if not isinstance(sheet, str) or not sheet:
+        errors.append("sheet: シート名がありません")
+
+    expect = []
+    for a, text in _block(spec, "expect", errors).items():
+        if not isinstance(text, str):
+            errors.append(f"expect.{a}: 見出しを文字列で書いてください")
+        elif _addr(a, "expect", errors):
+            expect.append((a, _label(text)))
+
+    created_spec = _block(spec, "created", errors)
+    created = tuple(_addr(created_spec.get(p), f"created.{p}", errors) for p in _CREATED_PARTS)
+
+    fields = []
+    for key, value in _block(spec, "fields", errors).items():
+        if isinstance(value, dict):
+            cell, strip = value.get("cell"), bool(value.get("strip", False))
+        else:
+            cell, strip = value, False
+        addr = _addr(cell, f"fields.{key}", errors)
+        if addr:
+            fields.append((key, addr, strip))
+
+    datetimes = []
+    for key, parts in _block(spec, "datetimes", errors).items():
+        if not isinstance(parts, dict) or set(parts) - set(_DT_PARTS):
+            errors.append(f"datetimes.{key}: {', '.join(_DT_PARTS)} の番地で書いてください")
+            continue
+        addrs = tuple(_addr(parts[p], f"datetimes.{key}.{p}", errors) if p in parts else None for p in _DT_PARTS)
+        datetimes.append((key, addrs))
+
+    multiline = []
+    for key, block in _block(spec, "multiline", errors).items():
+        if not isinstance(block, dict):
+            errors.append(f"multiline.{key}: start と max_lines のオブジェクトで書いてください")
+            continue
+        start = _addr(block.get("start"), f"multiline.{key}.start", errors)
+        n = block.get("max_lines")
+        if not isinstance(n, int) or isinstance(n, bool) or n < 1:
+            errors.append(f"multiline.{key}.max_lines: 1 以上の整数で書いてください")
+            continue
+        if start:
+            col, row = _split(start)
+            multiline.append((key, tuple(f"{_col_letter(col)}{row + i}" for i in range(n))))
+
+    if errors:
+        raise CellMapError("様式の定義に誤りがあります: " + " / ".join(errors))
+
+    seen: Dict[str, str] = {}
+    for key, addrs in ([(k, (a,)) for k, a, _ in fields] + [("作成日", created)]
+                       + [(k, tuple(a for a in addrs if a)) for k, addrs in datetimes] + multiline):
+        for a in addrs:
+            if a in seen:
+                errors.append(f"{a} に「{seen[a]}」と「{key}」の両方を書き込む定義になっています")
+            seen[a] = key
+    if errors:
+        raise CellMapError("様式の定義に誤りがあります: " + " / ".join(errors))
+    return WritePlan(spec.get("name") or name or sheet, sheet, tuple(expect), created,
+                     tuple(fields), tuple(datetimes), tuple(multiline))
+
+def load_spec(path: str) -> WritePlan:
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            spec = json.load(f)
+        except json.JSONDecodeError as e:
+            raise CellMapError(f"様式の定義を読み込めません（{os.path.basename(path)}）: {e}") from e
+    return compile_spec(spec, name=os.path.splitext(os.path.basename(path))[0])
+
+_plans: Optional[List[WritePlan]] = None
+_plans_lock = threading.Lock()
+
+def load_plans(directory: str = CELLMAP_DIR) -> List[WritePlan]:
+    # default.json を先頭に、残りはファイル名順。起動後に1回だけ読み込む
+    global _plans
+    with _plans_lock:
+        if _plans is None:
+            names = sorted(n for n in os.listdir(directory) if n.endswith(".json"))
+            names.sort(key=lambda n: n != "default.json")
+            plans = [load_spec(os.path.join(directory, n)) for n in names]
+            if not plans:
+                raise CellMapError(f"様式の定義がありません: {directory}")
+            _plans = plans
+        return _plans
+
+def default_plan() -> WritePlan:
+    return load_plans()[0]
+
+def _sheet_names(zf: zipfile.ZipFile) -> List[str]:
+    wb = ET.fromstring(zf.read("xl/workbook.xml"))
+    return [s.get("name") for s in wb.findall(f"{{{_NS_MAIN}}}sheets/{{{_NS_MAIN}}}sheet")]
+
+def _merged_blocks(ranges: List[str]) -> List[Tuple[str, int, int, int, int]]:
+    out = []
+    for ref in ranges:
+        if ":" not in ref:
+            continue
+        a, b = ref.split(":", 1)
+        if not (_ADDR_RE.match(a) and _ADDR_RE.match(b)):
+            continue
+        (c1, r1), (c2, r2) = _split(a), _split(b)
+        out.append((ref, c1, r1, c2, r2))
+    return out
+
+def validate_template(template_bytes: bytes, plan: WritePlan, use_active: bool = False) -> List[str]:
+    # テンプレートがこの様式で書き込めるかを調べ、問題点を返す（空なら書き込める）
+    # use_active なら、様式のシート名がないときに開いているシートで照合する（書き込みも同じシートになる）
+    try:
+        zf = zipfile.ZipFile(io.BytesIO(template_bytes))
+    except zipfile.BadZipFile:
+        return ["Excel ファイル（.xlsm）として読み込めません。"]
+    with zf:
+        try:
+            if plan.sheet not in _sheet_names(zf) and not use_active:
+                return [f"シート「{plan.sheet}」がありません。"]
+            sheet_path = _resolve_sheet_path(zf, plan.sheet)
+            values = read_cells(zf, sheet_path, [a for a, _ in plan.expect], last_row=plan.last_row)
+            merged = _merged_blocks(read_merged_ranges(zf, sheet_path))
+        except (KeyError, ET.ParseError, ValueError) as e:
+            return [f"シートを読み込めません: {e}"]
+
+    errors = []
+    for addr, expected in plan.expect:
+        actual = _label(values.get(addr))
+        if actual != expected:
+            errors.append(f"{addr} の見出しが「{expected}」ではありません（実際: 「{actual or '空欄'}」）。")
+    # 結合セルの左上以外には書き込めない（openpyxl では保存前に例外になり、ZIP 方式では表示されない）
+    for addr, key in plan.targets.items():
+        col, row = _split(addr)
+        for ref, c1, r1, c2, r2 in merged:
+            if c1 <= col <= c2 and r1 <= row <= r2 and (col, row) != (c1, r1):
+                errors.append(f"{addr}（{key}）は結合セル {ref} の左上ではないため書き込めません。")
+                break
+    return errors
+
+_resolved: "OrderedDict[str, object]" = OrderedDict()
+_resolved_lock = threading.Lock()
+
+def plan_for_template(template_bytes: bytes) -> WritePlan:
+    # 照合に通る最初の様式を返す（結果はテンプレートの内容ごとに保持し、2回目以降は照合しない）
+    key = hashlib.sha256(template_bytes).hexdigest()
+    with _resolved_lock:
+        found = _resolved.get(key)
+        if found is not None:
+            _resolved.move_to_end(key)
+    if found is None:
+        problems = []
+        for use_active in (False, True):
+            for plan in load_plans():
+                errors = validate_template(template_bytes, plan, use_active=use_active)
+                if not errors:
+                    found = plan
+                    break
+                if use_active:
+                    problems.append(f"様式「{plan.name}」: " + " ".join(errors))
+            if found is not None:
+                break
+        else:
+            found = CellMapError("テンプレートがどの様式にも合いません。" + " / ".join(problems))
+        with _resolved_lock:
+            _resolved[key] = found
+            while len(_resolved) > TEMPLATE_CACHE_MAX * 4:
+                _resolved.popitem(last=False)
+    if isinstance(found, CellMapError):
+        raise found
+    return found
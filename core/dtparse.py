@@ -0,0 +1,101 @@
+# report_maker/core/dtparse.py
+# 受信時刻・現着時刻・完了時刻の日時文字列を解析する
+# strptime を3形式ぶん順に試す代わりに、同じ規則の正規表現1本で解析し結果をキャッシュする
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional
+from .settings import JST
+
+def _dt_normalize(s: str) -> str:
+    # 「年」「月」→「/」、「日」→削除、「-」→「/」、全角空白→半角空白
+    # （str.translate より replace の連続のほうが数倍速い）
+    return s.strip().replace("年", "/").replace("月", "/").replace("日", "").replace("-", "/").replace("　", " ")
+
+# strptime の %Y/%m/%d[ %H:%M[:%S]] と同じ候補・同じ順序（\d は全角数字にも一致する）
+_DT_PATTERN = (
+    r"(\d\d\d\d)/(1[0-2]|0[1-9]|[1-9])/(3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])"
+    r"(?:\s+(2[0-3]|[0-1]\d|\d):([0-5]\d|\d)(?::(6[0-1]|[0-5]\d|\d))?)?"
+)
+_DT_RE = re.compile(_DT_PATTERN)
+
+DT_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=DT_CACHE_SIZE)
+def _parse_cached(s: str) -> Optional[datetime]:
+    m = _DT_RE.fullmatch(_dt_normalize(s))
+    if not m:
+        return None
+    y, mo, d, hh, mm, ss = m.groups()
+    try:
+        return datetime(int(y), int(mo), int(d), int(hh or 0), int(mm or 0), int(ss or 0), tzinfo=JST)
+    except ValueError:
+        return None
+
+def try_parse_datetime(s: Optional[str]) -> Optional[datetime]:
+    if not s:
+        return None
+    return _parse_cached(s)
+
+def minutes_between(a: Optional[str], b: Optional[str]) -> Optional[int]:
+    s = try_parse_datetime(a); e = try_parse_datetime(b)
+    if s and e:
+        return int((e - s).total_seconds() // 60)
+    return None
+
+def _is_series(values) -> bool:
+    return type(values).__name__ == "Series" and hasattr(values, "str")
+
+def _iso_or_none(s) -> Optional[str]:
+    # 正規表現で分解した値を ISO 形式へ並べ替えるだけにし、日時への変換は pandas にまとめて任せる
+    if not isinstance(s, str) or not s:
+        return None
+    m = _DT_RE.fullmatch(_dt_normalize(s))
+    if not m:
+        return None
+    y, mo, d, hh, mm, ss = m.groups()
+    if ss in ("60", "61"):
+        # datetime() と同じく秒 60・61 は不正とする（pandas は翌分へ繰り上げてしまう）
+        return None
+    return (f"{y}-{mo.zfill(2)}-{d.strip().zfill(2)} "
+            f"{(hh or '0').zfill(2)}:{(mm or '0').zfill(2)}:{(ss or '0').zfill(2)}")
+
+def _parse_series(values):
+    import pandas as pd
+
+    # 同じ文字列は1回だけ解析し、結果を行へ配り直す（受付時刻などは重複が多い）
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    isos = [_iso_or_none(v) for v in uniques]
+    parsed = pd.to_datetime(isos, format="%Y-%m-%d %H:%M:%S", errors="coerce").as_unit("us")
+    # 全角数字・範囲外の年などは一括変換できないため、1件ずつの解析結果で補う
+    matched = pd.notna(pd.Series(isos, dtype="object")).to_numpy()
+    retry = (matched & parsed.isna()).nonzero()[0]
+    parsed = parsed.tz_localize(JST)
+    if len(retry):
+        values_us = parsed.asi8.copy()
+        for i in retry:
+            dt = try_parse_datetime(uniques[i])
+            if dt is not None:
+                values_us[i] = pd.Timestamp(dt).as_unit("us").value
+        parsed = pd.DatetimeIndex(values_us.view("M8[us]")).tz_localize("UTC").tz_convert(JST)
+    return pd.Series(parsed.take(codes, allow_fill=True, fill_value=pd.NaT), index=values.index)
+
+def parse_datetimes(values):
+    # pandas.Series は datetime64[us, JST] の Series（解析不能は NaT）、それ以外は datetime/None のリストを返す
+    if _is_series(values):
+        return _parse_series(values)
+    return [try_parse_datetime(v) for v in values]
+
+def minutes_between_many(starts, ends):
+    # pandas.Series は Int64 の Series（欠損は <NA>）、それ以外は int/None のリストを返す
+    if _is_series(starts) or _is_series(ends):
+        import pandas as pd
+
+        index = starts.index if _is_series(starts) else ends.index
+        s = parse_datetimes(starts if _is_series(starts) else pd.Series(list(starts), index=index, dtype="object"))
+        e = parse_datetimes(ends if _is_series(ends) else pd.Series(list(ends), index=index, dtype="object"))
+        return ((e - s) // pd.Timedelta(minutes=1)).astype("Int64")
+    out: List[Optional[int]] = []
+    for a, b in zip(starts, ends):
+        out.append(minutes_between(a, b))
+    return out
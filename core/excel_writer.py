@@ -1,75 +1,143 @@
 # report_maker/core/excel_writer.py
+import hashlib
 import io
-from datetime import datetime
+import json
+import threading
+from collections import OrderedDict
 from typing import Dict, Optional
-from openpyxl import load_workbook
-from .settings import SHEET_NAME, JST
-from .textutil import split_lines, sanitize_filename
-from .parsing import try_parse_datetime, split_dt_components, first_date_yyyymmdd
-
-def _fill_multiline(ws, col_letter: str, start_row: int, text: Optional[str], max_lines: int = 5):
-    for i in range(max_lines):
-        ws[f"{col_letter}{start_row + i}"] = ""
-    if not text:
-        return
-    for idx, line in enumerate(split_lines(text, max_lines=max_lines)[:max_lines]):
-        ws[f"{col_letter}{start_row + idx}"] = line
-
-def fill_template_xlsx(template_bytes: bytes, data: Dict[str, Optional[str]]) -> bytes:
-    if not template_bytes:
-        raise ValueError("テンプレートのバイト列が空です。")
+from .settings import TEMPLATE_CACHE_MAX, XLSX_BACKEND
+from .textutil import sanitize_filename
+from .parsing import first_date_yyyymmdd
+from .xlsx_patch import fill_cells_zip
+from .cellmap import WritePlan, plan_for_template
+from .instrument import stage
+
+class _CachedTemplate:
+    def __init__(self, wb):
+        self.wb = wb
+        self.lock = threading.Lock()
+        self.uses = 0
+        # openpyxl は保存時に画像バッファを閉じるため、元データを保持して保存ごとに差し替える
+        self._images = [(img, img.ref.getvalue())
+                        for sheet in wb.worksheets for img in getattr(sheet, "_images", [])
+                        if isinstance(img.ref, io.BytesIO)]
+
+    def rewind_images(self):
+        for img, payload in self._images:
+            img.ref = io.BytesIO(payload)
+
+class _CellJournal:
+    """書き込んだセルの元の値を記録し、保存後にテンプレートを元の状態へ戻す。"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.original: Dict[str, object] = {}
+
+    def __setitem__(self, addr: str, value):
+        if addr not in self.original:
+            self.original[addr] = self.ws[addr].value
+        self.ws[addr] = value
+
+    def restore(self):
+        for addr, value in self.original.items():
+            self.ws[addr].value = value
+        self.original = {}
+
+_template_cache: "OrderedDict[str, _CachedTemplate]" = OrderedDict()
+_template_cache_lock = threading.Lock()
+
+def template_hash(template_bytes: bytes) -> str:
+    return hashlib.sha256(template_bytes).hexdigest()
+
+def data_hash(data: Dict[str, Optional[str]]) -> str:
+    payload = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
+def clear_template_cache():
+    with _template_cache_lock:
+        _template_cache.clear()
+
+def _get_cached_template(template_bytes: bytes) -> _CachedTemplate:
+    key = template_hash(template_bytes)
+    with _template_cache_lock:
+        entry = _template_cache.get(key)
+        if entry is not None:
+            _template_cache.move_to_end(key)
+            entry.uses += 1
+            return entry
+
+    # openpyxl は読み込みに時間がかかるため、初めてテンプレートを解析するときに読み込む
+    from openpyxl import load_workbook
     try:
         wb = load_workbook(io.BytesIO(template_bytes), keep_vba=True)
     except Exception as e:
         raise RuntimeError(f"テンプレートの読み込みに失敗しました（破損の可能性）: {e}") from e
 
-    ws = wb[SHEET_NAME] if SHEET_NAME in wb.sheetnames else wb.active
-
-    if data.get("管理番号"): ws["C12"] = data["管理番号"]
-    if data.get("メーカー"): ws["J12"] = data["メーカー"]
-    if data.get("制御方式"): ws["M12"] = data["制御方式"]
-    if data.get("通報者"): ws["C14"] = data["通報者"]
-    if data.get("対応者"): ws["L37"] = data["対応者"]
-
-    pa = (data.get("処理修理後") or "").strip()
-    if pa:
-        ws["C35"] = pa
-
-    if data.get("所属"):
-        ws["C37"] = data["所属"]
-
-    now = datetime.now(JST)
-    ws["B5"], ws["D5"], ws["F5"] = now.year, now.month, now.day
-
-    def write_dt_block(base_row: int, src_key: str):
-        dt = try_parse_datetime(data.get(src_key))
-        y, m, d, wd, hh, mm = split_dt_components(dt)
-        cellmap = {"Y": f"C{base_row}", "Mo": f"F{base_row}", "D": f"H{base_row}",
-                   "W": f"J{base_row}", "H": f"M{base_row}", "Min": f"O{base_row}"}
-        if y is not None: ws[cellmap["Y"]] = y
-        if m is not None: ws[cellmap["Mo"]] = m
-        if d is not None: ws[cellmap["D"]] = d
-        if wd is not None: ws[cellmap["W"]] = wd
-        if hh is not None: ws[cellmap["H"]] = f"{hh:02d}"
-        if mm is not None: ws[cellmap["Min"]] = f"{mm:02d}"
-
-    write_dt_block(13, "受信時刻")
-    write_dt_block(19, "現着時刻")
-    write_dt_block(36, "完了時刻")
-
-    _fill_multiline(ws, "C", 15, data.get("受信内容"), max_lines=4)
-    _fill_multiline(ws, "C", 20, data.get("現着状況"))
-    _fill_multiline(ws, "C", 25, data.get("原因"))
-    _fill_multiline(ws, "C", 30, data.get("処置内容"))
-
-    out = io.BytesIO()
-    try:
-        wb.save(out)
-    except Exception as e:
-        raise RuntimeError(f"Excel保存時に失敗しました: {e}") from e
+    with _template_cache_lock:
+        entry = _template_cache.setdefault(key, _CachedTemplate(wb))
+        _template_cache.move_to_end(key)
+        entry.uses += 1
+        # アップロードされたテンプレートは最も長く使われていないものから破棄する
+        while len(_template_cache) > TEMPLATE_CACHE_MAX:
+            _template_cache.popitem(last=False)
+    return entry
+
+def _evict_template(template_bytes: bytes):
+    with _template_cache_lock:
+        _template_cache.pop(template_hash(template_bytes), None)
+
+def fill_template_xlsx(template_bytes: bytes, data: Dict[str, Optional[str]], backend: str = XLSX_BACKEND,
+                       plan: Optional[WritePlan] = None) -> bytes:
+    if not template_bytes:
+        raise ValueError("テンプレートのバイト列が空です。")
+
+    with stage("fill_template_xlsx", backend=backend, template_bytes=len(template_bytes)) as total:
+        with stage("collect_cells") as st:
+            # セル配置はテンプレートに合う様式の書き込み計画から決める（照合はテンプレートごとに1回）
+            plan = plan or plan_for_template(template_bytes)
+            cells = plan.cells(data)
+            st.set(cells=len(cells))
+        if backend == "zip":
+            with stage("zip_patch"):
+                out = fill_cells_zip(template_bytes, plan.sheet, cells)
+        elif backend == "openpyxl":
+            out = _fill_openpyxl(template_bytes, plan.sheet, cells)
+        else:
+            raise ValueError(f"未対応の書き込み方式です: {backend}")
+        total.set(out_bytes=len(out))
+        return out
+
+def warm_template(template_bytes: bytes, backend: str = XLSX_BACKEND):
+    # 初回の生成で待たないよう、空のデータで1回生成しておく（様式の照合・テンプレートの解析・保存処理の読み込み）
+    fill_template_xlsx(template_bytes, {}, backend=backend)
 
-    return out.getvalue()
+def _fill_openpyxl(template_bytes: bytes, sheet_name: str, cells: Dict[str, object]) -> bytes:
+    with stage("template_load") as st:
+        entry = _get_cached_template(template_bytes)
+        st.set(cache_hit=entry.uses > 1)
+    with entry.lock:
+        wb = entry.wb
+        # シート名がなければ開いているシートへ書き込む（cellmap の照合も同じシートで行っている）
+        sheet = wb[sheet_name] if sheet_name in wb.sheetnames else wb.active
+        ws = _CellJournal(sheet)
+        try:
+            with stage("fill_cells"):
+                for addr, value in cells.items():
+                    ws[addr] = value
+            entry.rewind_images()
+            out = io.BytesIO()
+            with stage("save") as st:
+                try:
+                    wb.save(out)
+                except Exception as e:
+                    raise RuntimeError(f"Excel保存時に失敗しました: {e}") from e
+                st.set(out_bytes=out.tell())
+            return out.getvalue()
+        except Exception:
+            _evict_template(template_bytes)
+            raise
+        finally:
+            ws.restore()
 
 def build_filename(data: Dict[str, Optional[str]]) -> str:
     base_day = first_date_yyyymmdd(data.get("現着時刻"), data.get("完了時刻"), data.get("受信時刻"))
@@ -0,0 +1,144 @@
+# report_maker/core/export.py
+# 使い方: python -m core.export <フォルダ|mbox|maildir|.eml|.txt> ... -o <出力.parquet|出力.csv> [--chunk-size 5000]
+# 報告書(.xlsm)を作らず、抽出結果をすべて1つの列形式ファイルへ書き出す
+# 一定件数ごとに変換・追記するため、入力が何件でもメモリ使用量は一定
+# 受信時刻・現着時刻・完了時刻は日時型、作業時間_分などの所要時間は整数型の列になる（負の所要時間は欠損）
+import argparse
+import logging
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from .analytics import INTERVALS, DATETIME_FIELDS, add_intervals, parse_datetime_columns
+from .batch import iter_messages
+from .extract_cache import ExtractCache
+
+log = logging.getLogger("report_maker.export")
+
+DEFAULT_CHUNK_SIZE = 5000
+
+TEXT_FIELDS = (
+    "管理番号", "物件名", "住所", "窓口会社", "メーカー", "制御方式", "契約種別", "案件種別(件名)",
+    "通報者", "受信内容", "現着状況", "原因", "処置内容", "対応者", "送信者", "受付番号",
+    "受付URL", "現着完了登録URL",
+)
+EXPORT_COLUMNS = ["source"] + list(TEXT_FIELDS) + list(DATETIME_FIELDS) + list(INTERVALS)
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    ts = pa.timestamp("us", tz="+09:00")
+    fields = [pa.field(c, pa.string()) for c in ("source",) + TEXT_FIELDS]
+    fields += [pa.field(c, ts) for c in DATETIME_FIELDS]
+    fields += [pa.field(c, pa.int64()) for c in INTERVALS]
+    return pa.schema(fields)
+
+def records_to_frame(records: List[Tuple[str, Dict[str, Optional[str]]]]):
+    import pandas as pd
+
+    df = pd.DataFrame.from_records([dict(fields, source=source) for source, fields in records])
+    for col in EXPORT_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    parsed = parse_datetime_columns(df)
+    add_intervals(df, parsed)
+    # extract_fields の作業時間_分と同じく、負の所要時間（時刻の入力誤り）は欠損にする
+    for col in INTERVALS:
+        df[col] = df[col].mask(df[col] < 0)
+    for col in DATETIME_FIELDS:
+        df[col] = parsed[col]
+    for col in ("source",) + TEXT_FIELDS:
+        df[col] = df[col].astype("string")
+    return df[EXPORT_COLUMNS]
+
+class ColumnarWriter:
+    # 拡張子で形式を決める（.parquet は pyarrow が必要、それ以外は CSV）
+    def __init__(self, path: str):
+        self.path = path
+        self.parquet = path.lower().endswith(".parquet")
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._tmp = path + ".tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if self.parquet:
+            try:
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise RuntimeError("Parquet で出力するには pyarrow が必要です（.csv を指定すると不要です）。") from e
+            self._schema = _arrow_schema()
+            self._writer = pq.ParquetWriter(self._tmp, self._schema)
+        else:
+            self._writer = open(self._tmp, "w", encoding="utf-8-sig", newline="")
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+
+            self._writer.write_table(pa.Table.from_pandas(df, schema=self._schema, preserve_index=False))
+        else:
+            df.to_csv(self._writer, index=False, header=self.rows == 0, date_format="%Y-%m-%dT%H:%M:%S%z")
+        self.rows += len(df)
+
+    def close(self, commit: bool = True):
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        # 途中で失敗したときに不完全なファイルを残さないよう、書き終えてから置き換える
+        if commit:
+            os.replace(self._tmp, self.path)
+        elif os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+        return False
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def export_records(inputs, out_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   cache_path: Optional[str] = None) -> int:
+    cache = ExtractCache(path=cache_path)
+
+    def _records():
+        for path in inputs:
+            for source, raw_text in iter_messages(path):
+                yield source, cache.extract(raw_text)
+
+    try:
+        with ColumnarWriter(out_path) as writer:
+            for chunk in _chunks(_records(), chunk_size):
+                writer.write(records_to_frame(chunk))
+                log.info("書き出し: %d 件", writer.rows)
+            if writer.rows == 0:
+                writer.write(records_to_frame([]))
+            return writer.rows
+    finally:
+        cache.close()
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m core.export", description="完了メールの抽出結果を列形式ファイルに一括出力します")
+    ap.add_argument("inputs", nargs="+", help=".eml/.txt を含むフォルダ、maildir、mbox ファイル、または個別のメールファイル")
+    ap.add_argument("-o", "--out", required=True, help="出力先（.parquet または .csv）")
+    ap.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="一度に変換・書き出す件数")
+    ap.add_argument("--extract-cache", default=None, help="抽出結果を保存する SQLite ファイル（core.batch と共用可）")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    rows = export_records(args.inputs, args.out, chunk_size=args.chunk_size, cache_path=args.extract_cache)
+    log.info("完了: %d 件を書き出しました -> %s", rows, args.out)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
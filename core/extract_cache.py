@@ -0,0 +1,149 @@
+# report_maker/core/extract_cache.py
+# 抽出結果のキャッシュ（正規化後本文の sha256 と解析処理の指紋をキーにした LRU、プロセス内で共有）
+# 同じメールを貼り直したときや、エクスポートしたメールボックス内の重複メールで解析を省く
+# 返す抽出結果は読み取り専用（書き換える場合は dict() で複製する）
+# path を渡すと SQLite に保存し、一括処理の再実行やワーカー間でも使い回す
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+from .settings import EXTRACT_CACHE_MAX
+from .textutil import iter_lines, iter_normalized
+from . import dtparse, parsing, parse_profile, textutil
+from .instrument import stage
+
+_fingerprint: Optional[str] = None
+
+def parser_fingerprint() -> str:
+    # 解析処理のソースや登録されている書式が変わったら、保存済みの結果を使わない
+    global _fingerprint
+    if _fingerprint is None:
+        h = hashlib.sha256()
+        for mod in (textutil, dtparse, parsing, parse_profile):
+            with open(mod.__file__, "rb") as f:
+                h.update(f.read())
+        _fingerprint = h.hexdigest()[:16]
+    return f"{_fingerprint}-{parse_profile.get_registry().fingerprint()}"
+
+def text_key(normalized: str) -> str:
+    return _chunks_key((normalized,))
+
+def _chunks_key(chunks: Iterable[str]) -> str:
+    # かたまりごとに sha256 へ渡す（つなげた本文の text_key と同じ）。本文全体の UTF-8 の複製を作らない
+    h = hashlib.sha256()
+    for chunk in chunks:
+        h.update(chunk.encode("utf-8"))
+    return h.hexdigest()
+
+def _normalized_key(raw_text: str) -> Tuple[str, List[str]]:
+    # 正規化したかたまりと、そのキー（解析はキャッシュにないときだけかたまりから1行ずつ行う）
+    chunks = list(iter_normalized(raw_text))
+    return _chunks_key(chunks), chunks
+
+class ExtractCache:
+    def __init__(self, max_entries: int = EXTRACT_CACHE_MAX, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path
+        # (解析処理の指紋, 本文のキー) → 抽出結果。書式の登録などで指紋が変わったら、前の結果は使わない
+        self._entries: "OrderedDict[Tuple[str, str], Mapping[str, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS extracted ("
+            "key TEXT NOT NULL, parser TEXT NOT NULL, fields TEXT NOT NULL, PRIMARY KEY (key, parser))"
+        )
+        db.commit()
+        self._db = db
+
+    def _remember(self, key: Tuple[str, str], fields: Mapping[str, Optional[str]]):
+        self._entries[key] = fields
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, key: str, parser: str) -> Optional[Mapping[str, Optional[str]]]:
+        row = self._db.execute(
+            "SELECT fields FROM extracted WHERE key = ? AND parser = ?", (key, parser)
+        ).fetchone()
+        return MappingProxyType(json.loads(row[0])) if row else None
+
+    def _store(self, key: str, parser: str, fields: Mapping[str, Optional[str]]):
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO extracted (key, parser, fields) VALUES (?, ?, ?)",
+                (key, parser, json.dumps(dict(fields), ensure_ascii=False)),
+            )
+
+    def extract(self, raw_text: str) -> Mapping[str, Optional[str]]:
+        with stage("extract_fields_cached", in_chars=len(raw_text or "")) as st:
+            with stage("normalize_text"):
+                key, chunks = _normalized_key(raw_text)
+            parser = parser_fingerprint()
+            mem_key = (parser, key)
+            with self._lock:
+                fields = self._entries.get(mem_key)
+                if fields is not None:
+                    self.hits += 1
+                    self._entries.move_to_end(mem_key)
+                    st.set(cache="hit")
+                    return fields
+                if self._db is not None:
+                    fields = self._load(key, parser)
+                    if fields is not None:
+                        self.hits += 1
+                        self.disk_hits += 1
+                        self._remember(mem_key, fields)
+                        st.set(cache="disk")
+                        return fields
+                self.misses += 1
+            st.set(cache="miss")
+            with stage("parse_lines"):
+                fields = MappingProxyType(parsing.parse_lines(iter_lines(chunks)))
+            with self._lock:
+                self._remember(mem_key, fields)
+                if self._db is not None:
+                    self._store(key, parser, fields)
+            return fields
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "disk_hits": self.disk_hits,
+                    "evictions": self.evictions, "size": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.disk_hits = self.evictions = 0
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+_shared = ExtractCache()
+
+def extract_fields_cached(raw_text: str) -> Mapping[str, Optional[str]]:
+    return _shared.extract(raw_text)
+
+def cache_stats() -> Dict[str, int]:
+    return _shared.stats()
+
+def clear_extract_cache():
+    _shared.clear()
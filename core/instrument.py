@@ -0,0 +1,130 @@
+# report_maker/core/instrument.py
+# 処理段階ごとの所要時間・バイト数・tracemalloc ピークの計測（既定は無効）
+# 有効化: 環境変数 REPORT_MAKER_PROFILE=1（時間のみは =time）、または enable() を呼ぶ
+# tracemalloc は openpyxl の保存を数倍遅くするため、時間だけ見たいときは =time を使う
+# 無効時の stage() は何もしない共有オブジェクトを返すだけなので、計測コードを残したままでよい
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Deque, Dict, Iterable, List
+
+PROFILE_ENV = "REPORT_MAKER_PROFILE"
+# スレッドごとに保持する計測結果の上限（drain されないまま長く動くワーカーでも増え続けないようにする）
+MAX_RECORDS = 1000
+
+log = logging.getLogger("report_maker.perf")
+
+_enabled = False
+_trace_memory = False
+_local = threading.local()
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **meta):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _records() -> Deque[Dict]:
+    records = getattr(_local, "records", None)
+    if records is None:
+        records = _local.records = deque(maxlen=MAX_RECORDS)
+    return records
+
+class _Stage:
+    __slots__ = ("name", "meta", "t0", "base", "peak", "depth")
+
+    def __init__(self, name: str, meta: Dict):
+        self.name = name
+        self.meta = meta
+        self.base = 0
+        self.peak = 0
+        self.depth = 0
+
+    def set(self, **meta):
+        self.meta.update(meta)
+
+    def __enter__(self):
+        stack = _stack()
+        self.depth = len(stack)
+        if _trace_memory:
+            # 入れ子の段階がピークをリセットしても親の値が失われないよう、親へ先に反映しておく
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.base = tracemalloc.get_traced_memory()[0]
+        stack.append(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.t0
+        stack = _stack()
+        stack.pop()
+        record = {"stage": self.name, "ms": round(elapsed * 1000, 3), "depth": self.depth}
+        if _trace_memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            # 段階開始時点からの増加分（キャッシュ済みテンプレートなど既存の確保分は含めない）
+            record["peak_kb"] = round(max(0, self.peak - self.base) / 1024, 1)
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        record.update(self.meta)
+        _records().append(record)
+        log.info(json.dumps(record, ensure_ascii=False, default=str))
+        return False
+
+def stage(name: str, **meta):
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, meta)
+
+def is_enabled() -> bool:
+    return _enabled
+
+def enable(trace_memory: bool = True):
+    global _enabled, _trace_memory
+    _enabled = True
+    _trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if not log.handlers and not logging.getLogger().handlers:
+        log.addHandler(logging.StreamHandler())
+    log.setLevel(logging.INFO)
+
+def disable():
+    global _enabled, _trace_memory
+    _enabled = False
+    _trace_memory = False
+
+def drain() -> List[Dict]:
+    # このスレッドで記録された計測結果を取り出して消去する
+    records = list(_records())
+    _local.records = deque(maxlen=MAX_RECORDS)
+    return records
+
+def merge(records: Iterable[Dict]):
+    # 別プロセス（生成ジョブのワーカー）で記録された計測結果を、このスレッドの計測結果に加える
+    _records().extend(records)
+
+_env = os.getenv(PROFILE_ENV, "")
+if _env not in ("", "0"):
+    enable(trace_memory=_env != "time")
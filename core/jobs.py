@@ -0,0 +1,234 @@
+# report_maker/core/jobs.py
+# 報告書生成のジョブキュー（プロセスプール）
+# 画面のスクリプトスレッドでは生成せず、別プロセスに任せて状態だけを問い合わせる（GIL の取り合い・画面の固まりを避ける）
+# 未完了のジョブ数に全体・セッションごとの上限を設け、超えた分は QueueFull で断る
+# テンプレートはハッシュ名のファイルで渡し、ワーカーは読み込んだものをハッシュごとに使い回す
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, Optional, Set
+from .settings import (
+    JOB_WORKERS, JOB_MAX_PENDING, JOB_MAX_PER_OWNER, JOB_RESULT_TTL_SEC, TEMPLATE_CACHE_MAX, XLSX_BACKEND
+)
+from .excel_writer import fill_template_xlsx, warm_template
+from .template_store import get_template
+from . import instrument
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class QueueFull(RuntimeError):
+    pass
+
+_worker_templates: "OrderedDict[str, bytes]" = OrderedDict()
+
+def _load_template(template_key: str, template_path: str) -> bytes:
+    data = _worker_templates.get(template_key)
+    if data is None:
+        with open(template_path, "rb") as f:
+            data = f.read()
+        _worker_templates[template_key] = data
+        while len(_worker_templates) > TEMPLATE_CACHE_MAX:
+            _worker_templates.popitem(last=False)
+    else:
+        _worker_templates.move_to_end(template_key)
+    return data
+
+def _run_job(template_key: str, template_path: str, data: Dict[str, Optional[str]],
+             backend: str, out_path: Optional[str]):
+    # ワーカーで記録した段階別計測は、結果と一緒に返して呼び出し側（JobQueue.result）で取り込む
+    try:
+        xlsx_bytes = fill_template_xlsx(_load_template(template_key, template_path), data, backend=backend)
+        if out_path is None:
+            return xlsx_bytes, instrument.drain()
+        with open(out_path, "wb") as f:
+            f.write(xlsx_bytes)
+        return out_path, instrument.drain()
+    except Exception:
+        instrument.drain()
+        raise
+
+def _warm_worker(template_key: str, template_path: str, backend: str):
+    warm_template(_load_template(template_key, template_path), backend=backend)
+    instrument.drain()
+
+class _Job:
+    __slots__ = ("id", "owner", "future", "submitted_at", "finished_at", "abandoned")
+
+    def __init__(self, owner: Optional[str], future: Future):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.future = future
+        self.submitted_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        # 実行中に取り消された（結果は誰も受け取らない）
+        self.abandoned = False
+
+    def state(self) -> str:
+        if not self.future.done():
+            return RUNNING if self.future.running() else QUEUED
+        return FAILED if self.future.cancelled() or self.future.exception() is not None else DONE
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING,
+                 max_per_owner: int = JOB_MAX_PER_OWNER, result_ttl: float = JOB_RESULT_TTL_SEC,
+                 template_dir: Optional[str] = None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_per_owner = max_per_owner
+        self.result_ttl = result_ttl
+        self.template_dir = template_dir or os.path.join(tempfile.gettempdir(), "report_maker_templates")
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: "OrderedDict[str, _Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _executor_locked(self) -> ProcessPoolExecutor:
+        # streamlit はスレッドを多数使うため、fork ではなく spawn でワーカーを起動する
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _template_path(self, template_key: str) -> str:
+        path = os.path.join(self.template_dir, template_key + ".xlsm")
+        if not os.path.exists(path):
+            data = get_template(template_key)
+            if data is None:
+                raise RuntimeError("テンプレートの保持期限が切れました。Step2 でテンプレートを読み込み直してください。")
+            os.makedirs(self.template_dir, exist_ok=True)
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return path
+
+    def _purge_locked(self, now: float):
+        # 受け取られないまま保持期限を過ぎた結果は捨てる
+        for job_id in [j.id for j in self._jobs.values()
+                       if j.finished_at is not None and now - j.finished_at > self.result_ttl]:
+            del self._jobs[job_id]
+
+    def _mark_finished(self, job: _Job):
+        job.finished_at = time.monotonic()
+        if job.abandoned:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+
+    def submit(self, template_key: str, data: Dict[str, Optional[str]], owner: Optional[str] = None,
+               backend: str = XLSX_BACKEND, out_path: Optional[str] = None) -> str:
+        path = self._template_path(template_key)
+        with self._lock:
+            self._purge_locked(time.monotonic())
+            active = [j for j in self._jobs.values() if not j.future.done()]
+            if len(active) >= self.max_pending:
+                raise QueueFull("生成の順番待ちが混み合っています。しばらくしてからもう一度お試しください。")
+            if owner is not None and sum(j.owner == owner for j in active) >= self.max_per_owner:
+                raise QueueFull("このセッションで生成中の報告書が上限に達しています。完了を待ってからお試しください。")
+            args = (template_key, path, dict(data), backend, out_path)
+            if self.workers > 0:
+                future = self._executor_locked().submit(_run_job, *args)
+            else:
+                future = Future()
+            job = _Job(owner, future)
+            self._jobs[job.id] = job
+        future.add_done_callback(lambda _f, job=job: self._mark_finished(job))
+        if self.workers <= 0:
+            # ワーカーなしの設定では、その場で生成して完了済みのジョブとして返す
+            try:
+                future.set_result(_run_job(*args))
+            except Exception as e:
+                future.set_exception(e)
+        return job.id
+
+    def warm(self, template_key: str, backend: str = XLSX_BACKEND):
+        # ワーカーを起動してテンプレートを読み込ませておく（最初のジョブが spawn と解析を待たない）
+        # ジョブとしては数えないため、上限や状態の表示には影響しない
+        if self.workers <= 0:
+            data = get_template(template_key)
+            if data is not None:
+                warm_template(data, backend=backend)
+            return
+        path = self._template_path(template_key)
+        with self._lock:
+            executor = self._executor_locked()
+            for _ in range(self.workers):
+                executor.submit(_warm_worker, template_key, path, backend)
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            state = job.state()
+            # 待ち順: この前に受け付けて、まだ始まっていないジョブの数
+            ahead = 0
+            if state == QUEUED:
+                for other in self._jobs.values():
+                    if other is job:
+                        break
+                    ahead += other.state() == QUEUED
+        out = {"id": job_id, "status": state, "ahead": ahead,
+               "elapsed": time.monotonic() - job.submitted_at, "error": None}
+        if state == FAILED:
+            e = None if job.future.cancelled() else job.future.exception()
+            out["error"] = f"{type(e).__name__}: {e}" if e else "取り消されました"
+        return out
+
+    def result(self, job_id: str, pop: bool = True):
+        # 完了したジョブの結果（バイト列、または out_path を指定したときはそのパス）。失敗時は例外を送出する
+        # ワーカーで記録した段階別計測は、呼び出したスレッドの計測結果に加える（instrument.drain で取り出せる）
+        with self._lock:
+            job = self._jobs.pop(job_id) if pop else self._jobs[job_id]
+        value, records = job.future.result(timeout=0)
+        if records:
+            instrument.merge(records)
+        return value
+
+    def wait(self, job_ids: Iterable[str], timeout: Optional[float] = None) -> Set[str]:
+        # いずれかのジョブが終わるまで待ち、終わったジョブの ID を返す
+        with self._lock:
+            futures = {self._jobs[j].future: j for j in job_ids if j in self._jobs}
+        done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        return {futures[f] for f in done}
+
+    def cancel(self, job_id: str):
+        # 始まる前のジョブは取り消して外す。実行中のものは止められないため、終わるまで上限の数に含めたまま残し、
+        # 終わったら結果を捨てる（取り消しと投入を繰り返して上限を超えないように）
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return
+        if not job.future.cancel() and not job.future.done():
+            with self._lock:
+                job.abandoned = True
+            if not job.future.done():
+                return
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            states = [j.state() for j in self._jobs.values()]
+        return {"workers": self.workers, "queued": states.count(QUEUED), "running": states.count(RUNNING),
+                "finished": states.count(DONE) + states.count(FAILED)}
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._jobs.clear()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+_shared: Optional[JobQueue] = None
+_shared_lock = threading.Lock()
+
+def get_queue() -> JobQueue:
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = JobQueue()
+        return _shared
@@ -0,0 +1,83 @@
+# report_maker/core/mailstream.py
+# mbox / maildir を少しずつ読み、1通ずつ (message_id, fields) を返すジェネレータ群
+# mbox は mmap で開き、区切り行（"From "）を探して1通分だけを切り出すため、ファイルサイズに関わらずメモリは一定
+import mmap
+import os
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from typing import Dict, Iterator, Optional, Tuple
+from .parsing import extract_fields
+
+_FROM_SEP = b"\nFrom "
+
+def message_to_text(msg: EmailMessage) -> str:
+    # 画面に貼り付ける本文と同じ形にそろえるため、件名は「件名:」行として先頭に付ける
+    subject = str(msg.get("Subject") or "").strip()
+    part = msg.get_body(preferencelist=("plain",))
+    body = ""
+    if part is not None:
+        try:
+            body = part.get_content()
+        except (LookupError, UnicodeDecodeError):
+            payload = part.get_payload(decode=True) or b""
+            body = payload.decode(part.get_content_charset() or "utf-8", errors="replace")
+    return f"件名: {subject}\n{body}" if subject else body
+
+def parse_message(raw: bytes) -> EmailMessage:
+    return BytesParser(policy=policy.default).parsebytes(raw)
+
+def iter_mbox_raw(path: str) -> Iterator[Tuple[int, bytes]]:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            if mm[:5] == b"From ":
+                start = 0
+            else:
+                start = mm.find(_FROM_SEP)
+                if start < 0:
+                    return
+                start += 1
+            while start < size:
+                nxt = mm.find(_FROM_SEP, start)
+                end = nxt + 1 if nxt >= 0 else size
+                # 先頭の "From " 区切り行は本文に含めない
+                body_start = mm.find(b"\n", start, end)
+                if body_start >= 0:
+                    yield start, mm[body_start + 1:end]
+                start = end
+
+def iter_maildir_raw(path: str) -> Iterator[Tuple[str, bytes]]:
+    for sub in ("new", "cur"):
+        d = os.path.join(path, sub)
+        if not os.path.isdir(d):
+            continue
+        for name in sorted(os.listdir(d)):
+            if name.startswith("."):
+                continue
+            full = os.path.join(d, name)
+            with open(full, "rb") as f:
+                yield full, f.read()
+
+def is_maildir(path: str) -> bool:
+    return os.path.isdir(os.path.join(path, "cur")) or os.path.isdir(os.path.join(path, "new"))
+
+def _message_id(msg: EmailMessage, fallback: str) -> str:
+    mid = str(msg.get("Message-ID") or "").strip()
+    return mid or fallback
+
+def iter_mailbox_texts(path: str, use_message_id: bool = True) -> Iterator[Tuple[str, str]]:
+    if os.path.isdir(path):
+        raw_iter = iter_maildir_raw(path)
+    else:
+        raw_iter = ((f"{path}#{offset}", raw) for offset, raw in iter_mbox_raw(path))
+    for location, raw in raw_iter:
+        # 本文のデコードは取り出されたときに1通ずつ行う
+        msg = parse_message(raw)
+        yield (_message_id(msg, location) if use_message_id else location), message_to_text(msg)
+
+def iter_mailbox_fields(path: str) -> Iterator[Tuple[str, Dict[str, Optional[str]]]]:
+    for message_id, text in iter_mailbox_texts(path):
+        yield message_id, extract_fields(text)
@@ -0,0 +1,177 @@
+# report_maker/core/outbox.py
+# 受信フォルダ監視で作った下書き（抽出結果と生成済みの報告書）の置き場
+# 処理済みメールの記録（チェックポイント）も同じ SQLite に持ち、再起動時に処理済みのメールを読み直さない
+# 失敗したメールは処理済みにせず、試行回数と次に試す時刻を別に記録する
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from .settings import JST, OUTBOX_DIR
+from .report_zip import unique_name
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    detail TEXT,
+    draft_id INTEGER,
+    processed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failures (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    detail TEXT,
+    failed_at TEXT NOT NULL,
+    retry_at REAL
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS drafts (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    created_day TEXT NOT NULL,
+    source TEXT NOT NULL,
+    filename TEXT,
+    template_sha256 TEXT,
+    missing TEXT,
+    fields TEXT NOT NULL,
+    opened_at TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_drafts_opened_at ON drafts (opened_at);
+"""
+
+DB_NAME = "outbox.sqlite"
+
+class Outbox:
+    def __init__(self, directory: str = OUTBOX_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, DB_NAME), timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            # 以前の版は失敗も処理済みとして記録していたため、もう一度試せるよう失敗の記録から外す
+            self._db.execute("DELETE FROM processed WHERE status = 'failed'")
+        self._processed: Optional[Set[str]] = None
+        # キー → (試行回数, 次に試す時刻。None なら再試行しない)
+        self._failures: Optional[Dict[str, Tuple[int, Optional[float]]]] = None
+
+    # --- チェックポイント（監視側） ---
+    def is_processed(self, key: str) -> bool:
+        # 処理済みのキーは起動時に一度だけ読み込み、以降はメモリ上で判定する
+        with self._lock:
+            if self._processed is None:
+                self._processed = {r[0] for r in self._db.execute("SELECT key FROM processed")}
+            return key in self._processed
+
+    def mark_processed(self, key: str, path: str, status: str, detail: Optional[str] = None,
+                       draft_id: Optional[int] = None):
+        now = datetime.now(JST).isoformat(timespec="seconds")
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO processed (key, path, status, detail, draft_id, processed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)", (key, path, status, detail, draft_id, now))
+            self._db.execute("DELETE FROM failures WHERE key = ?", (key,))
+            if self._processed is not None:
+                self._processed.add(key)
+            if self._failures is not None:
+                self._failures.pop(key, None)
+
+    def failure(self, key: str) -> Optional[Tuple[int, Optional[float]]]:
+        # 失敗したことがあれば (試行回数, 次に試す時刻)
+        with self._lock:
+            if self._failures is None:
+                self._failures = {r[0]: (r[1], r[2]) for r in
+                                  self._db.execute("SELECT key, attempts, retry_at FROM failures")}
+            return self._failures.get(key)
+
+    def record_failure(self, key: str, path: str, attempts: int, detail: Optional[str],
+                       retry_at: Optional[float]):
+        now = datetime.now(JST).isoformat(timespec="seconds")
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO failures (key, path, attempts, detail, failed_at, retry_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)", (key, path, attempts, detail, now, retry_at))
+            if self._failures is not None:
+                self._failures[key] = (attempts, retry_at)
+
+    def dir_mtime(self, path: str) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def set_dir_mtime(self, path: str, mtime_ns: int):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)", (path, mtime_ns))
+
+    # --- 下書き ---
+    def add_draft(self, fields: Dict[str, Optional[str]], source: str, missing: List[str],
+                  xlsx_bytes: Optional[bytes] = None, filename: Optional[str] = None,
+                  template_key: Optional[str] = None) -> int:
+        # 必須項目が足りないものも、画面で補えるよう抽出結果だけの下書きとして残す
+        now = datetime.now(JST)
+        name = None
+        if xlsx_bytes is not None:
+            name = unique_name(filename, set(), lambda c: os.path.exists(os.path.join(self.directory, c)))
+            tmp = os.path.join(self.directory, name + ".tmp")
+            with open(tmp, "wb") as f:
+                f.write(xlsx_bytes)
+            os.replace(tmp, os.path.join(self.directory, name))
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "INSERT INTO drafts (created_at, created_day, source, filename, template_sha256, missing, fields)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (now.isoformat(timespec="seconds"), now.strftime("%Y%m%d"), source, name,
+                 template_key if name else None, "・".join(missing) or None,
+                 json.dumps(fields, ensure_ascii=False)))
+            return cur.lastrowid
+
+    def list_drafts(self, include_opened: bool = False, limit: int = 50) -> List[Dict]:
+        sql = "SELECT * FROM drafts" + ("" if include_opened else " WHERE opened_at IS NULL")
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        out = []
+        for r in rows:
+            d = dict(r)
+            d["fields"] = json.loads(d["fields"])
+            out.append(d)
+        return out
+
+    def load_report(self, draft: Dict) -> Optional[bytes]:
+        if not draft.get("filename"):
+            return None
+        try:
+            with open(os.path.join(self.directory, draft["filename"]), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def mark_opened(self, draft_id: int):
+        now = datetime.now(JST).isoformat(timespec="seconds")
+        with self._lock, self._db:
+            self._db.execute("UPDATE drafts SET opened_at = ? WHERE id = ?", (now, draft_id))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_shared: Optional[Outbox] = None
+_shared_lock = threading.Lock()
+
+def get_outbox() -> Optional[Outbox]:
+    # OUTBOX_DIR が空、または監視をまだ一度も動かしていなければ None
+    global _shared
+    if not OUTBOX_DIR or not os.path.exists(os.path.join(OUTBOX_DIR, DB_NAME)):
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = Outbox(OUTBOX_DIR)
+        return _shared
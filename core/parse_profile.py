@@ -0,0 +1,211 @@
+# report_maker/core/parse_profile.py
+# 窓口会社ごとのメール書式（解析プロファイル）の登録と判定
+# 標準の書式（parsing.LABEL_CANON）に、parse_profiles/*.json の書式を起動後に1回だけ読み込んで加える
+# ラベル表は書式ごとに登録時に1回だけ作る。書式の判定は件名の【】内・先頭のラベル行（固有のラベル・窓口会社の値）を
+# 辞書で引くだけにし、登録した書式の数が増えても書式ごとに解析を試さない
+#
+# 定義の例（parse_profiles/kitanihon.json）:
+#   {"name": "北日本", "signatures": {"subject": ["保守完了報告"], "labels": ["受付ID"], "companies": ["北日本昇降機"]},
+#    "labels": {"受付ID": "受付番号", "到着時刻": "現着時刻", "窓口": null}}
+# labels は標準のラベル表への追加・上書き（null で削除）。"inherit": false なら標準のラベルを引き継がない
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from .settings import PARSE_PROFILE_DIR
+from .parsing import LABEL_CANON, _compile_label_table
+
+STANDARD_NAME = "標準"
+# 書式の判定に使う先頭の行数（件名・ヘッダーと最初のいくつかのラベル行が入る程度）
+SIGNATURE_LINES = 12
+
+_SPEC_KEYS = {"name", "signatures", "labels", "inherit"}
+_SIGNATURE_KEYS = {"subject", "labels", "companies"}
+
+class ParseProfileError(ValueError):
+    pass
+
+def _squash(text: str) -> str:
+    # 窓口会社名・件名の【】内は空白の有無を区別しない
+    return "".join(text.split())
+
+class ParseProfile:
+    __slots__ = ("name", "labels", "subjects", "signature_labels", "companies", "label_table", "digest")
+
+    def __init__(self, name: str, labels: Dict[str, str], subjects=(), signature_labels=(), companies=()):
+        self.name = name
+        # 表記 → 正規名
+        self.labels: Dict[str, str] = labels
+        self.subjects: Tuple[str, ...] = tuple(_squash(s) for s in subjects)
+        self.signature_labels: Tuple[str, ...] = tuple(signature_labels)
+        self.companies: Tuple[str, ...] = tuple(_squash(c) for c in companies)
+        self.label_table = _compile_label_table(labels)
+        payload = json.dumps([name, labels, self.subjects, self.signature_labels, self.companies],
+                             ensure_ascii=False, sort_keys=True)
+        self.digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def __repr__(self):
+        return f"ParseProfile({self.name!r})"
+
+def _str_list(value, where: str, errors: List[str]) -> List[str]:
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(v, str) and v.strip() for v in value):
+        errors.append(f"{where}: 文字列のリストで書いてください")
+        return []
+    return [v.strip() for v in value]
+
+def compile_profile(spec: Dict, name: Optional[str] = None) -> ParseProfile:
+    errors: List[str] = []
+    if not isinstance(spec, dict):
+        raise ParseProfileError("書式の定義はオブジェクトで書いてください。")
+    unknown = set(spec) - _SPEC_KEYS
+    if unknown:
+        errors.append("未知の項目: " + ", ".join(sorted(unknown)))
+
+    labels = dict(LABEL_CANON) if spec.get("inherit", True) else {}
+    raw_labels = spec.get("labels") or {}
+    if not isinstance(raw_labels, dict):
+        errors.append("labels: 「表記: 正規名」のオブジェクトで書いてください")
+        raw_labels = {}
+    for raw, canon in raw_labels.items():
+        if not raw or len(raw.split()) != 1 or ":" in raw or "：" in raw:
+            errors.append(f"labels: 「{raw}」は空白やコロンを含まない1語にしてください")
+        elif canon is None:
+            labels.pop(raw, None)
+        elif isinstance(canon, str) and canon:
+            labels[raw] = canon
+        else:
+            errors.append(f"labels.{raw}: 正規名を文字列で書いてください")
+
+    signatures = spec.get("signatures") or {}
+    if not isinstance(signatures, dict) or set(signatures) - _SIGNATURE_KEYS:
+        errors.append(f"signatures: {', '.join(sorted(_SIGNATURE_KEYS))} のリストで書いてください")
+        signatures = {}
+    subjects = _str_list(signatures.get("subject"), "signatures.subject", errors)
+    signature_labels = _str_list(signatures.get("labels"), "signatures.labels", errors)
+    companies = _str_list(signatures.get("companies"), "signatures.companies", errors)
+    if not (subjects or signature_labels or companies):
+        errors.append("signatures: 判定に使う件名・ラベル・窓口会社のいずれかを書いてください")
+
+    if errors:
+        raise ParseProfileError("書式の定義に誤りがあります: " + " / ".join(errors))
+    return ParseProfile(spec.get("name") or name, labels, subjects, signature_labels, companies)
+
+def load_profile(path: str) -> ParseProfile:
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            spec = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ParseProfileError(f"書式の定義を読み込めません（{os.path.basename(path)}）: {e}") from e
+    return compile_profile(spec, name=os.path.splitext(os.path.basename(path))[0])
+
+class ProfileRegistry:
+    def __init__(self):
+        self.standard = ParseProfile(STANDARD_NAME, dict(LABEL_CANON))
+        self._profiles: Dict[str, ParseProfile] = {STANDARD_NAME: self.standard}
+        # 判定用の索引: 件名の【】内 / 固有のラベル / 窓口会社の値 → 書式
+        self._by_subject: Dict[str, ParseProfile] = {}
+        self._by_label: Dict[str, ParseProfile] = {}
+        self._by_company: Dict[str, ParseProfile] = {}
+        # 標準のラベル表で窓口会社を表す表記（「窓口会社」「窓口」）
+        self._company_labels = frozenset(raw for raw, canon in LABEL_CANON.items() if canon == "窓口会社")
+        self._fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def register(self, profile: ParseProfile) -> ParseProfile:
+        errors = []
+        if profile.name in self._profiles:
+            errors.append(f"書式名「{profile.name}」は登録済みです")
+        for label in profile.signature_labels:
+            if label in self.standard.label_table:
+                errors.append(f"ラベル「{label}」は標準の書式にもあるため判定に使えません")
+        for kind, index, keys in (("件名", self._by_subject, profile.subjects),
+                                  ("ラベル", self._by_label, profile.signature_labels),
+                                  ("窓口会社", self._by_company, profile.companies)):
+            for key in keys:
+                if key in index:
+                    errors.append(f"{kind}「{key}」は書式「{index[key].name}」の判定に使われています")
+        if errors:
+            raise ParseProfileError(f"書式「{profile.name}」を登録できません: " + " / ".join(errors))
+        with self._lock:
+            self._profiles[profile.name] = profile
+            self._by_subject.update((key, profile) for key in profile.subjects)
+            self._by_label.update((key, profile) for key in profile.signature_labels)
+            self._by_company.update((key, profile) for key in profile.companies)
+            self._fingerprint = None
+        return profile
+
+    def get(self, name: str) -> Optional[ParseProfile]:
+        return self._profiles.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._profiles)
+
+    def detect(self, t: str) -> ParseProfile:
+        # normalize_text 済みの本文の先頭から、最初に索引に当たった書式を返す（当たらなければ標準）
+        if len(self._profiles) == 1:
+            return self.standard
+        return self.detect_lines(t.split("\n", SIGNATURE_LINES)[:SIGNATURE_LINES])
+
+    def detect_lines(self, lines: Iterable[str]) -> ParseProfile:
+        # 先頭の SIGNATURE_LINES 行だけを渡す（本文を1行ずつ読む解析から使う）
+        if len(self._profiles) == 1:
+            return self.standard
+        for line in lines:
+            colon = line.find(":")
+            if colon <= 0:
+                continue
+            label = line[:colon].strip()
+            if label == "件名":
+                start = line.find("【", colon)
+                close = line.find("】", start + 1)
+                if start >= 0 and close > start:
+                    found = self._by_subject.get(_squash(line[start + 1:close]))
+                    if found:
+                        return found
+                continue
+            found = self._by_label.get(label)
+            if found:
+                return found
+            if label in self._company_labels:
+                found = self._by_company.get(_squash(line[colon + 1:]))
+                if found:
+                    return found
+        return self.standard
+
+    def fingerprint(self) -> str:
+        # 登録されている書式が変わったら、抽出結果のキャッシュを使わないようにする
+        with self._lock:
+            if self._fingerprint is None:
+                h = hashlib.sha256()
+                for name in sorted(self._profiles):
+                    h.update(self._profiles[name].digest.encode("ascii"))
+                self._fingerprint = h.hexdigest()[:16]
+            return self._fingerprint
+
+_registry: Optional[ProfileRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry(directory: str = PARSE_PROFILE_DIR) -> ProfileRegistry:
+    # 起動後に1回だけ、フォルダの定義をファイル名順に登録する（フォルダがなければ標準の書式だけ）
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = ProfileRegistry()
+                if directory and os.path.isdir(directory):
+                    for fname in sorted(n for n in os.listdir(directory) if n.endswith(".json")):
+                        registry.register(load_profile(os.path.join(directory, fname)))
+                _registry = registry
+    return _registry
+
+def register_profile(profile: ParseProfile) -> ParseProfile:
+    return get_registry().register(profile)
+
+def detect_profile(t: str) -> ParseProfile:
+    return get_registry().detect(t)
+
+def get_profile(name: str) -> Optional[ParseProfile]:
+    return get_registry().get(name)
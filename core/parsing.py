@@ -1,9 +1,12 @@
 # report_maker/core/parsing.py
 import re
-from typing import Dict, Optional, Tuple
+from itertools import chain, islice
+from typing import Dict, Iterable, Optional, Tuple
 from datetime import datetime
 from .settings import JST, WEEKDAYS_JA
-from .textutil import normalize_text
+from .textutil import iter_lines, iter_normalized
+from .dtparse import try_parse_datetime, minutes_between
+from .instrument import stage
 
 LABEL_CANON = {
     "管理番号": "管理番号",
@@ -30,23 +33,29 @@ LABEL_CANON = {
     "受付番号": "受付番号",
 }
 MULTILINE_KEYS = {"受信内容", "現着状況", "原因", "処置内容"}
+URL_KEYS = {"受付URL", "現着完了登録URL"}
 LABEL_REGEX = re.compile(r"^\s*([^\s:：]+(?:・[^\s:：]+)?)\s*[:：]\s*(.*)$")
 
+_URL_TAIL_RE = re.compile(r"[)\]＞＞）」】>]+$")
+_URL_RE = re.compile(r"(https?://\S+)")
+_RECEIPT_RE = re.compile(r"受付番号\s*[:：]\s*([0-9]+)")
+_SUBJECT_CASE_RE = re.compile(r"^件名:\s*【\s*([^】]+)\s*】", flags=re.MULTILINE)
+_SUBJECT_MANAGENO_RE = re.compile(r"件名:.*?【[^】]+】\s*([A-Z0-9\-]+)", flags=re.IGNORECASE)
+
+# ラベル種別
+KIND_PLAIN = 0
+KIND_MULTI = 1
+KIND_URL = 2
+
+def _compile_label_table(canon_map: Dict[str, str]) -> Dict[str, Tuple[str, int]]:
+    table = {}
+    for raw, canon in canon_map.items():
+        kind = KIND_MULTI if canon in MULTILINE_KEYS else KIND_URL if canon in URL_KEYS else KIND_PLAIN
+        table[raw] = (canon, kind)
+    return table
+
 def _strip_url_tail(u: str) -> str:
-    return re.sub(r"[)\]＞＞）」】>]+$", "", u.strip())
-
-def try_parse_datetime(s: Optional[str]) -> Optional[datetime]:
-    if not s:
-        return None
-    cand = s.strip().replace("年", "/").replace("月", "/").replace("日", "")
-    cand = cand.replace("-", "/").replace("　", " ")
-    for fmt in ("%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y/%m/%d"):
-        try:
-            dt = datetime.strptime(cand, fmt)
-            return dt.replace(tzinfo=JST)
-        except Exception:
-            pass
-    return None
+    return _URL_TAIL_RE.sub("", u.strip())
 
 def split_dt_components(dt: Optional[datetime]) -> Tuple[Optional[int], Optional[int], Optional[int], Optional[str], Optional[int], Optional[int]]:
     if not dt:
@@ -54,12 +63,6 @@ def split_dt_components(dt: Optional[datetime]) -> Tuple[Optional[int], Optional
     dt = dt.astimezone(JST)
     return dt.year, dt.month, dt.day, WEEKDAYS_JA[dt.weekday()], dt.hour, dt.minute
 
-def minutes_between(a: Optional[str], b: Optional[str]) -> Optional[int]:
-    s = try_parse_datetime(a); e = try_parse_datetime(b)
-    if s and e:
-        return int((e - s).total_seconds() // 60)
-    return None
-
 def first_date_yyyymmdd(*vals) -> str:
     for v in vals:
         dt = try_parse_datetime(v)
@@ -68,10 +71,83 @@ def first_date_yyyymmdd(*vals) -> str:
     from .settings import JST
     return datetime.now(JST).strftime("%Y%m%d")
 
-def extract_fields(raw_text: str) -> Dict[str, Optional[str]]:
-    t = normalize_text(raw_text)
-    lines = t.split("\n")
-
+# 件名が折り返されていても、この行数までを1つの候補として見る（これより長い候補は一致しないものとして捨てる）
+SUBJECT_WINDOW_LINES = 8
+_NON_SPACE_RE = re.compile(r"\S")
+
+class _SubjectSearch:
+    # _SUBJECT_CASE_RE / _SUBJECT_MANAGENO_RE を、本文全体を持たずに1行ずつ評価する
+    # 候補の行（「件名:」の行）から今の行までだけを持つ。行末までそろった範囲で一致すれば、全文を検索したときと同じ一致になる
+    # 先頭の候補行が一致し得なくなったら（【】が閉じて後ろに番号がないなど）、次の候補行まで捨てる
+    # 候補は SUBJECT_WINDOW_LINES 行までとし、細工された本文でも1行あたりの手間が本文の長さによらないようにする
+    __slots__ = ("regex", "at_line_start", "lines", "open", "value", "done")
+
+    def __init__(self, regex, at_line_start: bool):
+        self.regex = regex
+        self.at_line_start = at_line_start
+        self.lines = []
+        # 候補行の【が閉じていない（】が来るまで一致は決まらない）
+        self.open = False
+        self.value: Optional[str] = None
+        self.done = False
+
+    def _is_candidate(self, line: str) -> bool:
+        return line.startswith("件名:") if self.at_line_start else "件名:" in line
+
+    def _alive(self, window: str, start: int) -> bool:
+        # window[start:] の先頭の候補行が、この後の行しだいでまだ一致し得るか
+        if self.at_line_start:
+            # 「件名:」の後が空白だけか、【の後に】がまだ来ていない間は一致し得る
+            m = _NON_SPACE_RE.search(window, start + 3)
+            return not m or (window[m.start()] == "【" and window.find("】", m.start()) < 0)
+        # 先頭行の最後の【が閉じていないか、閉じた】の後が空白だけなら、番号が次の行に来る余地がある
+        head = self.lines[0]
+        b = head.rfind("【", head.find("件名:"))
+        if b < 0:
+            return False
+        close = window.find("】", start + b)
+        return close < 0 or not _NON_SPACE_RE.search(window, close + 1)
+
+    def feed(self, line: str):
+        if self.done:
+            return
+        if not self.lines:
+            if not self._is_candidate(line):
+                return
+        elif len(self.lines) < SUBJECT_WINDOW_LINES and (not line.strip() or (self.open and "】" not in line)):
+            # 空行や、】のない【の続きでは一致が決まらない
+            self.lines.append(line)
+            return
+        self.lines.append(line)
+        window = "\n".join(self.lines) + "\n"
+        m = self.regex.search(window)
+        if m:
+            self.value = m.group(1).strip()
+            self.done = True
+            self.lines = []
+            return
+        start = 0
+        while self.lines and (len(self.lines) > SUBJECT_WINDOW_LINES or not self._alive(window, start)):
+            start += len(self.lines.pop(0)) + 1
+            while self.lines and not self._is_candidate(self.lines[0]):
+                start += len(self.lines.pop(0)) + 1
+        self.open = window.rfind("【", start) > window.rfind("】", start)
+
+def extract_fields(raw_text: str, profile=None) -> Dict[str, Optional[str]]:
+    # 正規化したかたまりから1行ずつ解析へ渡し、正規化後の本文全体や行リストを作らない
+    with stage("extract_fields", in_chars=len(raw_text or "")):
+        with stage("parse_lines"):
+            return parse_lines(iter_lines(iter_normalized(raw_text)), profile)
+
+def parse_lines(lines: Iterable[str], profile=None) -> Dict[str, Optional[str]]:
+    # normalize_text 済みの行（textutil.iter_lines など）を先頭から1回だけ読んで抽出する
+    lines = iter(lines)
+    # 書式（解析プロファイル）を省略したら、本文の件名・先頭のラベルから判定する
+    if profile is None:
+        from .parse_profile import SIGNATURE_LINES, get_registry
+        head = list(islice(lines, SIGNATURE_LINES))
+        profile = get_registry().detect_lines(head)
+        lines = chain(head, lines)
     out_keys = {
         "管理番号","物件名","住所","窓口会社","メーカー","制御方式","契約種別",
         "受信時刻","通報者","現着時刻","完了時刻",
@@ -81,11 +157,10 @@ def extract_fields(raw_text: str) -> Dict[str, Optional[str]]:
     }
     out: Dict[str, Optional[str]] = {k: None for k in out_keys}
 
-    m_case = re.search(r"^件名:\s*【\s*([^】]+)\s*】", t, flags=re.MULTILINE)
-    if m_case:
-        out["案件種別(件名)"] = m_case.group(1).strip()
-    m_mane = re.search(r"件名:.*?【[^】]+】\s*([A-Z0-9\-]+)", t, flags=re.IGNORECASE)
-    subject_manageno = m_mane.group(1).strip() if m_mane else None
+    subject_case = _SubjectSearch(_SUBJECT_CASE_RE, at_line_start=True)
+    subject_manageno = _SubjectSearch(_SUBJECT_MANAGENO_RE, at_line_start=False)
+    # 件名の管理番号は最後まで読まないと決まらないため、最後の「管理番号:」の値が空だったかを覚えておき、後で補う
+    manageno_blank = False
 
     current_multikey: Optional[str] = None
     buffer = []
@@ -99,69 +174,68 @@ def extract_fields(raw_text: str) -> Dict[str, Optional[str]]:
         buffer = []
         current_multikey = None
 
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-
+    label_table = profile.label_table
+    for line in lines:
+        if not (subject_case.done and subject_manageno.done):
+            subject_case.feed(line)
+            subject_manageno.feed(line)
         if awaiting_url_for and line.strip().startswith("http"):
             out[awaiting_url_for] = _strip_url_tail(line)
             awaiting_url_for = None
-            i += 1
             continue
 
         m = LABEL_REGEX.match(line)
-        if m:
-            _flush_buffer()
-
-            raw_label = m.group(1).strip()
-            value_part = m.group(2).strip()
-            canon = LABEL_CANON.get(raw_label)
-            if canon is None:
-                i += 1
-                continue
-
-            if canon in MULTILINE_KEYS:
-                current_multikey = canon
-                buffer = []
-                if value_part:
-                    buffer.append(value_part)
-            elif canon in ("受付URL", "現着完了登録URL"):
-                url = None
-                if "http" in value_part:
-                    murl = re.search(r"(https?://\S+)", value_part)
-                    if murl:
-                        url = _strip_url_tail(murl.group(1))
-                if url:
-                    out[canon] = url
-                else:
-                    awaiting_url_for = canon
-            else:
-                if canon == "管理番号" and not value_part and subject_manageno:
-                    out[canon] = subject_manageno
-                else:
-                    out[canon] = value_part or out.get(canon)
-
-            if "受付番号" in raw_label or "受付番号" in line:
-                mnum = re.search(r"受付番号\s*[:：]\s*([0-9]+)", line)
+        if not m:
+            if current_multikey:
+                buffer.append(line)
+            elif out["受付番号"] is None and "受付番号" in line:
+                mnum = _RECEIPT_RE.search(line)
                 if mnum:
                     out["受付番号"] = mnum.group(1).strip()
-
-            i += 1
             continue
 
+        # 未知のラベルでも複数行項目はそこで区切る
         if current_multikey:
-            buffer.append(line)
+            _flush_buffer()
+        entry = label_table.get(m.group(1))
+        if entry is None:
+            continue
+
+        canon, kind = entry
+        value_part = m.group(2).strip()
+        if kind == KIND_MULTI:
+            current_multikey = canon
+            buffer = []
+            if value_part:
+                buffer.append(value_part)
+        elif kind == KIND_URL:
+            url = None
+            if "http" in value_part:
+                murl = _URL_RE.search(value_part)
+                if murl:
+                    url = _strip_url_tail(murl.group(1))
+            if url:
+                out[canon] = url
+            else:
+                awaiting_url_for = canon
         else:
-            if out.get("受付番号") is None:
-                mnum = re.search(r"受付番号\s*[:：]\s*([0-9]+)", line)
-                if mnum:
-                    out["受付番号"] = mnum.group(1).strip()
-        i += 1
+            if canon == "管理番号":
+                if value_part:
+                    out[canon] = value_part
+                manageno_blank = not value_part
+            else:
+                out[canon] = value_part or out.get(canon)
+
+        if "受付番号" in line:
+            mnum = _RECEIPT_RE.search(line)
+            if mnum:
+                out["受付番号"] = mnum.group(1).strip()
 
     _flush_buffer()
 
-    if not out.get("管理番号") and subject_manageno:
-        out["管理番号"] = subject_manageno
+    out["案件種別(件名)"] = subject_case.value
+    if subject_manageno.value and (manageno_blank or not out.get("管理番号")):
+        out["管理番号"] = subject_manageno.value
 
     dur = minutes_between(out.get("現着時刻"), out.get("完了時刻"))
     out["作業時間_分"] = str(dur) if dur is not None and dur >= 0 else None
@@ -0,0 +1,200 @@
+# report_maker/core/report_index.py
+# 生成した報告書の索引（SQLite）
+# 抽出項目・作成日時・ファイル名・出力のハッシュを記録し、同じ受付番号の重複作成を知らせる
+# 出力本体も内容のハッシュごとに1件だけ保存し、過去の報告書を作り直さずに返せるようにする
+# 本体の合計が REPORT_INDEX_MAX_CONTENT_MB を超えたら古いものから本体だけを消す（索引の行は残り、本体は作り直して返す）
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from .settings import JST, REPORT_INDEX_PATH, REPORT_INDEX_MAX_CONTENT_MB, REPORT_INDEX_PRUNE_EVERY
+from .dtparse import try_parse_datetime
+from .excel_writer import data_hash
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    created_day TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    output_sha256 TEXT NOT NULL,
+    template_sha256 TEXT,
+    data_sha256 TEXT NOT NULL,
+    source TEXT,
+    manageno TEXT,
+    receipt_no TEXT,
+    property_name TEXT,
+    received_at TEXT,
+    arrived_at TEXT,
+    completed_at TEXT,
+    fields TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_reports_manageno ON reports (manageno);
+CREATE INDEX IF NOT EXISTS ix_reports_receipt_no ON reports (receipt_no);
+CREATE INDEX IF NOT EXISTS ix_reports_received_at ON reports (received_at);
+CREATE INDEX IF NOT EXISTS ix_reports_completed_at ON reports (completed_at);
+CREATE INDEX IF NOT EXISTS ix_reports_created_day ON reports (created_day);
+CREATE INDEX IF NOT EXISTS ix_reports_inputs ON reports (template_sha256, data_sha256, created_day);
+CREATE TABLE IF NOT EXISTS report_files (
+    output_sha256 TEXT PRIMARY KEY,
+    content BLOB NOT NULL
+);
+"""
+
+_SUMMARY_COLUMNS = "id, created_at, filename, manageno, receipt_no, property_name, received_at, completed_at, output_sha256"
+
+def _iso(value: Optional[str]) -> Optional[str]:
+    # 日時は並べ替え・範囲検索できるよう ISO 形式で持つ（解析できない値は fields 側にだけ残る）
+    dt = try_parse_datetime(value)
+    return dt.isoformat() if dt else None
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip()
+    return value or None
+
+def _public_fields(data: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+    return {k: v for k, v in data.items() if not k.startswith("_")}
+
+class ReportIndex:
+    def __init__(self, path: str = REPORT_INDEX_PATH, max_content_bytes: int = REPORT_INDEX_MAX_CONTENT_MB * 1024 * 1024):
+        self.path = path
+        self.max_content_bytes = max_content_bytes
+        self._since_prune = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+
+    def record(self, data: Dict[str, Optional[str]], filename: str, xlsx_bytes: bytes,
+               template_key: Optional[str] = None, source: Optional[str] = None, store_content: bool = True) -> int:
+        # store_content=False なら出力のハッシュだけを記録する（一括処理など、出力をファイルとして別に残す場合）
+        fields = _public_fields(data)
+        now = datetime.now(JST)
+        output_key = hashlib.sha256(xlsx_bytes).hexdigest()
+        row = (
+            now.isoformat(timespec="seconds"), now.strftime("%Y%m%d"), filename, output_key, template_key,
+            data_hash(fields), source, _clean(fields.get("管理番号")), _clean(fields.get("受付番号")),
+            _clean(fields.get("物件名")), _iso(fields.get("受信時刻")), _iso(fields.get("現着時刻")),
+            _iso(fields.get("完了時刻")), json.dumps(fields, ensure_ascii=False, sort_keys=True),
+        )
+        with self._lock, self._db:
+            if store_content:
+                self._db.execute("INSERT OR IGNORE INTO report_files (output_sha256, content) VALUES (?, ?)",
+                                 (output_key, xlsx_bytes))
+            cur = self._db.execute(
+                "INSERT INTO reports (created_at, created_day, filename, output_sha256, template_sha256, data_sha256,"
+                " source, manageno, receipt_no, property_name, received_at, arrived_at, completed_at, fields)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            report_id = cur.lastrowid
+        if store_content:
+            self._since_prune += 1
+            if self._since_prune >= REPORT_INDEX_PRUNE_EVERY:
+                self.prune()
+        return report_id
+
+    def prune(self, max_content_bytes: Optional[int] = None) -> int:
+        # 保存した本体の合計が上限を超えていれば、最後に作成されたのが古いものから消し、消した件数を返す
+        limit = self.max_content_bytes if max_content_bytes is None else max_content_bytes
+        self._since_prune = 0
+        if not limit or limit <= 0:
+            return 0
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT f.output_sha256, length(f.content), MAX(r.id) AS last_id FROM report_files f"
+                " LEFT JOIN reports r ON r.output_sha256 = f.output_sha256"
+                " GROUP BY f.output_sha256 ORDER BY last_id DESC"
+            ).fetchall()
+            total, evict = 0, []
+            for key, size, _ in rows:
+                total += size
+                if total > limit:
+                    evict.append((key,))
+            if evict:
+                with self._db:
+                    self._db.executemany("DELETE FROM report_files WHERE output_sha256 = ?", evict)
+        return len(evict)
+
+    def content_bytes(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(length(content)), 0) FROM report_files").fetchone()[0]
+
+    def find_duplicates(self, data: Dict[str, Optional[str]], limit: int = 5) -> List[Dict]:
+        # 受付番号があればそれで、なければ管理番号と受信時刻の組で同じ案件を探す
+        receipt = _clean(data.get("受付番号"))
+        if receipt:
+            where, params = "receipt_no = ?", (receipt,)
+        else:
+            manageno, received = _clean(data.get("管理番号")), _iso(data.get("受信時刻"))
+            if not (manageno and received):
+                return []
+            where, params = "manageno = ? AND received_at = ?", (manageno, received)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_SUMMARY_COLUMNS} FROM reports WHERE {where} ORDER BY id DESC LIMIT ?", params + (limit,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def find_identical(self, template_key: str, data: Dict[str, Optional[str]], day: str) -> Optional[Dict]:
+        # 同じテンプレート・同じ内容・同じ作成日の報告書（作り直しても同じものになる）
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {_SUMMARY_COLUMNS} FROM reports WHERE template_sha256 = ? AND data_sha256 = ?"
+                " AND created_day = ? ORDER BY id DESC LIMIT 1",
+                (template_key, data_hash(_public_fields(data)), day),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def search(self, manageno: Optional[str] = None, receipt_no: Optional[str] = None,
+               since: Optional[str] = None, until: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        # since / until は受信時刻（ISO 形式の前方一致比較、例: "2024-05-01"）
+        where, params = [], []
+        if manageno:
+            where.append("manageno = ?"); params.append(manageno)
+        if receipt_no:
+            where.append("receipt_no = ?"); params.append(receipt_no)
+        if since:
+            where.append("received_at >= ?"); params.append(since)
+        if until:
+            where.append("received_at < ?"); params.append(until)
+        sql = f"SELECT {_SUMMARY_COLUMNS} FROM reports"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit]).fetchall()
+        return [dict(r) for r in rows]
+
+    def iter_fields(self, limit: Optional[int] = None) -> Iterator[Dict[str, Optional[str]]]:
+        # 記録した抽出項目を新しい順に返す（集計用）
+        sql = "SELECT fields FROM reports ORDER BY id DESC" + (" LIMIT ?" if limit else "")
+        with self._lock:
+            rows = self._db.execute(sql, (limit,) if limit else ()).fetchall()
+        for (fields,) in rows:
+            yield json.loads(fields)
+
+    def load_content(self, output_key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute("SELECT content FROM report_files WHERE output_sha256 = ?", (output_key,)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_shared: Optional[ReportIndex] = None
+_shared_lock = threading.Lock()
+
+def get_index() -> Optional[ReportIndex]:
+    # REPORT_INDEX_PATH が空なら索引は使わない
+    global _shared
+    if not REPORT_INDEX_PATH:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = ReportIndex(REPORT_INDEX_PATH)
+        return _shared
@@ -0,0 +1,99 @@
+# report_maker/core/report_zip.py
+# 複数の報告書を1つの ZIP にまとめる
+# 報告書は1件ずつ ZIP へ書き込んで手放すため、件数が増えてもメモリ上に持つ報告書は常に1件分
+# ZIP 本体は SpooledTemporaryFile に書き、ZIP_SPOOL_MAX を超えると自動で一時ファイルへ移る
+import io
+import os
+import tempfile
+import zipfile
+from typing import BinaryIO, Callable, Dict, Iterator, Optional
+from .settings import ZIP_SPOOL_MAX
+from .excel_writer import build_filename
+
+def unique_name(fname: str, used: set, exists: Optional[Callable[[str], bool]] = None) -> str:
+    # 同名は「_2」「_3」…を付けて区別する（展開先が大文字小文字を区別しない場合も考え casefold で比較）
+    stem, ext = os.path.splitext(fname)
+    candidate, n = fname, 1
+    while candidate.casefold() in used or (exists is not None and exists(candidate)):
+        n += 1
+        candidate = f"{stem}_{n}{ext}"
+    used.add(candidate.casefold())
+    return candidate
+
+class _ZipReader(io.RawIOBase):
+    # 完成した ZIP の読み出し専用の窓（st.download_button は RawIOBase を受け付け、SpooledTemporaryFile は受け付けない）
+    # 閉じても元のファイルは閉じない（破棄は ReportZip.discard で行う）
+    def __init__(self, f: BinaryIO):
+        self._f = f
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, pos: int, whence: int = os.SEEK_SET) -> int:
+        return self._f.seek(pos, whence)
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+    def readinto(self, b) -> int:
+        data = self._f.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+class ReportZip:
+    def __init__(self, fileobj: Optional[BinaryIO] = None, spool_max: int = ZIP_SPOOL_MAX):
+        self._file = fileobj if fileobj is not None else tempfile.SpooledTemporaryFile(max_size=spool_max)
+        # .xlsm はそれ自体が圧縮済みの ZIP のため、再圧縮せずそのまま格納する
+        self._zip: Optional[zipfile.ZipFile] = zipfile.ZipFile(self._file, "w", compression=zipfile.ZIP_STORED)
+        self._used: set = set()
+        self.names = []
+
+    def add(self, data: Dict[str, Optional[str]], xlsx_bytes: bytes, fname: Optional[str] = None) -> str:
+        name = unique_name(fname or build_filename(data), self._used)
+        self._zip.writestr(name, xlsx_bytes)
+        self.names.append(name)
+        return name
+
+    def finish(self) -> BinaryIO:
+        # ZIP の目次を書き込み、先頭に巻き戻したファイルを返す
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        self._file.seek(0)
+        return self._file
+
+    def reader(self) -> io.RawIOBase:
+        # ダウンロード用に、中身をメモリへ読み出さずに渡せるファイル
+        return _ZipReader(self.finish())
+
+    def iter_chunks(self, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        f = self.finish()
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def size(self) -> int:
+        pos = self._file.tell()
+        self._file.seek(0, os.SEEK_END)
+        end = self._file.tell()
+        self._file.seek(pos)
+        return end
+
+    def discard(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.discard()
+        return False
@@ -1,4 +1,5 @@
 # report_maker/core/settings.py
+import os
 from datetime import timezone, timedelta
 
 JST = timezone(timedelta(hours=9))
@@ -11,3 +12,48 @@ WEEKDAYS_JA = ["月", "火", "水", "木", "金", "土", "日"]
 REQUIRED_KEYS = [
     "通報者", "受信内容", "現着状況", "原因", "処置内容", "処理修理後", "所属",
 ]
+
+# 解析済みテンプレートを保持する上限（既定テンプレート＋アップロード分）
+TEMPLATE_CACHE_MAX = 4
+
+# Excel書き込み方式: "openpyxl"（既定）または "zip"（対象シートのXMLのみ直接書き換え）
+XLSX_BACKEND = "openpyxl"
+
+# 共有テンプレート置き場: アップロード分の保持上限と、最後に使われてからの有効期限（秒）
+TEMPLATE_STORE_MAX = 16
+TEMPLATE_STORE_TTL_SEC = 60 * 60
+
+# 抽出結果キャッシュ（正規化後本文のハッシュ → 抽出結果）の件数上限
+EXTRACT_CACHE_MAX = 1024
+
+# 生成した報告書の索引（SQLite）。環境変数 REPORT_MAKER_INDEX で変更、空文字で無効
+REPORT_INDEX_PATH = os.getenv("REPORT_MAKER_INDEX", os.path.join("data", "report_index.sqlite"))
+# 索引に保存する報告書本体の合計の上限（MB）。超えたら最後に作成されたのが古いものから本体だけを消す。0 で無制限
+REPORT_INDEX_MAX_CONTENT_MB = int(os.getenv("REPORT_MAKER_INDEX_MAX_CONTENT_MB", "512"))
+# 本体の合計を確認する間隔（記録した件数）
+REPORT_INDEX_PRUNE_EVERY = 50
+
+# 報告書のZIPまとめ: このサイズ（バイト）を超えるとメモリから一時ファイルへ移す
+ZIP_SPOOL_MAX = 8 * 1024 * 1024
+
+# 報告書生成のジョブキュー
+# ワーカープロセス数（0 なら画面のスレッド内で生成）、受け付ける未完了ジョブの上限、
+# セッションごとの同時ジョブ数の上限、受け取られなかった結果の保持期限（秒）、画面の状態確認の間隔（秒）
+JOB_WORKERS = int(os.getenv("REPORT_MAKER_JOB_WORKERS", str(min(4, os.cpu_count() or 1))))
+JOB_MAX_PENDING = 32
+JOB_MAX_PER_OWNER = 4
+JOB_RESULT_TTL_SEC = 10 * 60
+JOB_POLL_SEC = 0.5
+
+# 受信フォルダ監視（python -m core.watch）の下書き置き場。環境変数 REPORT_MAKER_OUTBOX で変更、空文字で無効
+OUTBOX_DIR = os.getenv("REPORT_MAKER_OUTBOX", os.path.join("data", "outbox"))
+
+# セル配置の定義（様式）を置くフォルダ。テンプレートごとに、照合に通る最初の様式を使う
+CELLMAP_DIR = os.getenv("REPORT_MAKER_CELLMAPS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cellmaps"))
+
+# 起動直後の先読み（最初の画面を返した後に、既定テンプレートの読み込み・生成ワーカーの起動などを裏で済ませる）
+# 環境変数 REPORT_MAKER_WARMUP=0 で無効
+WARMUP = os.getenv("REPORT_MAKER_WARMUP", "1") != "0"
+
+# 窓口会社ごとのメール書式（解析プロファイル）の定義を置くフォルダ。なければ標準の書式だけで解析する
+PARSE_PROFILE_DIR = os.getenv("REPORT_MAKER_PARSE_PROFILES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "parse_profiles"))
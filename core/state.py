@@ -1,6 +1,7 @@
 # report_maker/core/state.py
-import copy
 import os
+from collections import ChainMap
+from typing import Optional
 import streamlit as st
 
 def get_passcode() -> str:
@@ -13,32 +14,74 @@ def get_passcode() -> str:
     env_val = os.getenv("APP_PASSCODE")
     return str(env_val) if env_val else ""
 
+def _bump_version():
+    # 抽出結果が変わるたびに増やす（生成結果のキャッシュキーに使う）
+    st.session_state.data_version = st.session_state.get("data_version", 0) + 1
+
+def get_data_version() -> int:
+    return st.session_state.get("data_version", 0)
+
 def ensure_extracted():
     if "extracted" not in st.session_state or st.session_state.extracted is None:
         st.session_state.extracted = {}
+        _bump_version()
+
+def set_extracted(fields: Optional[dict]):
+    st.session_state.extracted = fields
+    _bump_version()
+
+def update_extracted(values: dict):
+    ensure_extracted()
+    st.session_state.extracted.update(values)
+    _bump_version()
+
+# 一括生成の ZIP（一時ファイル）は Step 2 の間だけ持ち、Step を移る・やり直すときに閉じる
+def clear_bundle():
+    old = st.session_state.get("bundle")
+    st.session_state.bundle = None
+    if old:
+        old["zip"].discard()
 
+# 編集バッファは抽出結果との差分（変更したキーだけ）を持つ上書き層
+# 編集開始・破棄は O(1)、保存は変更件数ぶんの更新だけで済む
 def enter_edit_mode():
     ensure_extracted()
     st.session_state.edit_mode = True
-    st.session_state.edit_buffer = copy.deepcopy(st.session_state.extracted)
+    st.session_state.edit_buffer = {}
+    st.session_state.edit_dirty = False
 
 def cancel_edit():
     st.session_state.edit_mode = False
     st.session_state.edit_buffer = {}
+    st.session_state.edit_dirty = False
 
 def save_edit():
-    st.session_state.extracted = copy.deepcopy(st.session_state.edit_buffer)
+    buf = st.session_state.get("edit_buffer") or {}
+    if buf:
+        update_extracted(buf)
     st.session_state.edit_mode = False
     st.session_state.edit_buffer = {}
+    st.session_state.edit_dirty = False
+
+def is_dirty() -> bool:
+    return bool(st.session_state.get("edit_mode") and st.session_state.get("edit_dirty"))
 
-def get_working_dict() -> dict:
+def get_working_dict():
     if st.session_state.get("edit_mode"):
-        return st.session_state.edit_buffer
+        return ChainMap(st.session_state.edit_buffer, st.session_state.extracted or {})
     return st.session_state.extracted or {}
 
 def set_working_value(key: str, value: str):
     if st.session_state.get("edit_mode"):
-        st.session_state.edit_buffer[key] = value
+        buf = st.session_state.edit_buffer
+        # 元の値と同じに戻した項目は差分から外す（未設定と空文字は同じ扱い）
+        if ((st.session_state.extracted or {}).get(key) or "") == (value or ""):
+            buf.pop(key, None)
+        else:
+            buf[key] = value
+        st.session_state.edit_dirty = bool(buf)
     else:
         ensure_extracted()
-        st.session_state.extracted[key] = value
+        if st.session_state.extracted.get(key) != value:
+            st.session_state.extracted[key] = value
+            _bump_version()
@@ -0,0 +1,90 @@
+# report_maker/core/template_store.py
+# プロセス全体で共有するテンプレート置き場（内容のハッシュで管理）
+# セッションはハッシュだけを持ち、同じテンプレートは1つにまとめる。
+# 既定テンプレートは起動後に一度だけ読み込んで固定し、アップロード分は LRU と有効期限で破棄する
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from .settings import TEMPLATE_STORE_MAX, TEMPLATE_STORE_TTL_SEC
+from .excel_writer import template_hash
+
+class _Entry:
+    __slots__ = ("data", "pinned", "last_used")
+
+    def __init__(self, data: bytes, pinned: bool):
+        self.data = data
+        self.pinned = pinned
+        self.last_used = time.monotonic()
+
+_templates: "OrderedDict[str, _Entry]" = OrderedDict()
+_templates_lock = threading.Lock()
+# 既定テンプレートのパス → (更新時刻, ハッシュ)
+_defaults: Dict[str, Tuple[float, str]] = {}
+
+def _evict_locked(now: float):
+    for key in [k for k, e in _templates.items() if not e.pinned and now - e.last_used > TEMPLATE_STORE_TTL_SEC]:
+        del _templates[key]
+    unpinned = [k for k, e in _templates.items() if not e.pinned]
+    # OrderedDict は最近使った順に並べているため、先頭から破棄する
+    for key in unpinned[:max(0, len(unpinned) - TEMPLATE_STORE_MAX)]:
+        del _templates[key]
+
+def put_template(data: bytes, pinned: bool = False) -> str:
+    if not data:
+        raise ValueError("テンプレートのバイト列が空です。")
+    key = template_hash(data)
+    now = time.monotonic()
+    with _templates_lock:
+        entry = _templates.get(key)
+        if entry is None:
+            entry = _templates[key] = _Entry(bytes(data), pinned)
+        entry.pinned = entry.pinned or pinned
+        entry.last_used = now
+        _templates.move_to_end(key)
+        _evict_locked(now)
+    return key
+
+def get_template(key: Optional[str]) -> Optional[bytes]:
+    if not key:
+        return None
+    now = time.monotonic()
+    with _templates_lock:
+        _evict_locked(now)
+        entry = _templates.get(key)
+        if entry is None:
+            return None
+        entry.last_used = now
+        _templates.move_to_end(key)
+        return entry.data
+
+def has_template(key: Optional[str]) -> bool:
+    return get_template(key) is not None
+
+def load_default_template(path: str) -> str:
+    # ファイルが差し替えられていなければ、ディスクを読まずに前回のハッシュを返す
+    mtime = os.stat(path).st_mtime
+    cached = _defaults.get(path)
+    if cached and cached[0] == mtime and has_template(cached[1]):
+        return cached[1]
+    with open(path, "rb") as f:
+        key = put_template(f.read(), pinned=True)
+    _defaults[path] = (mtime, key)
+    if cached and cached[1] != key:
+        _unpin(cached[1])
+    return key
+
+def _unpin(key: str):
+    # 差し替え前の既定テンプレートは固定を外し、アップロード分と同じく LRU と有効期限で破棄させる
+    # （読み込み中のセッションがあるため、すぐには消さない）
+    with _templates_lock:
+        entry = _templates.get(key)
+        if entry is not None and all(k != key for _, k in _defaults.values()):
+            entry.pinned = False
+            _evict_locked(time.monotonic())
+
+def clear_templates():
+    with _templates_lock:
+        _templates.clear()
+    _defaults.clear()
@@ -1,17 +1,48 @@
 # report_maker/core/textutil.py
 import re
 import unicodedata
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional
 
-def normalize_text(text: str) -> str:
-    if not text:
-        return ""
+# 長い貼り付け（スレッド全体など）を正規化するときの1かたまりの文字数
+NORMALIZE_CHUNK_CHARS = 64 * 1024
+
+def _normalize_chunk(text: str) -> str:
     t = unicodedata.normalize("NFKC", text)
     t = t.replace("：", ":")
     t = t.replace("\t", " ").replace("\r\n", "\n").replace("\r", "\n")
     t = t.replace("\u3000", " ")
     return t
 
+def iter_normalized(text: str, chunk_chars: int = NORMALIZE_CHUNK_CHARS) -> Iterator[str]:
+    # normalize_text の結果を、行の切れ目で区切ったかたまりごとに返す（つなげると normalize_text と同じ）
+    # 「\n」の直後で区切るため、NFKC の合成・並べ替えや「\r\n」がかたまりをまたがない
+    n = len(text or "")
+    start = 0
+    while start < n:
+        end = start + chunk_chars
+        if end < n:
+            cut = text.rfind("\n", start, end)
+            if cut < 0:
+                # 1行がかたまりより長い場合は、その行の終わりまでを1かたまりにする
+                cut = text.find("\n", end)
+            end = n if cut < 0 else cut + 1
+        yield _normalize_chunk(text[start:end])
+        start = end
+
+def normalize_text(text: str) -> str:
+    if not text:
+        return ""
+    return "".join(iter_normalized(text))
+
+def iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    # かたまりの並びから1行ずつ返す（つなげた文字列の split("\n") と同じ行）。本文全体の行リストは作らない
+    rest = ""
+    for chunk in chunks:
+        lines = (rest + chunk if rest else chunk).split("\n")
+        rest = lines.pop()
+        yield from lines
+    yield rest
+
 def split_lines(text: Optional[str], max_lines: int = 5) -> List[str]:
     if not text:
         return []
@@ -0,0 +1,81 @@
+# report_maker/core/warmup.py
+# 起動直後の先読み（任意）
+# コンテナがゼロから起動した直後は、最初の生成でテンプレートの解析・ワーカーの起動・抽出処理の初回実行を待つことになる
+# 最初の画面を返した後にバックグラウンドのスレッドでこれらを済ませ、Step 2 以降の待ち時間を減らす
+# 使うモジュールは関数の中で読み込むため、このファイル自体の import は軽い
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+from .settings import WARMUP, XLSX_BACKEND
+
+log = logging.getLogger("report_maker.warmup")
+
+# 抽出処理の初回実行用（ラベル表・日時解析・正規化の各処理を一通り通す）
+_SAMPLE_TEXT = """件名: 【故障完了】 HK00-000 サンプル
+管理番号: HK00-000
+受信時刻: 2024/05/01 10:00
+現着時刻: 2024年5月1日 10時40分
+完了時刻: 2024-05-01 11:55
+受信内容: サンプル
+処置内容: サンプル
+受付番号: 0
+"""
+
+_started = False
+_lock = threading.Lock()
+_status: Dict[str, object] = {}
+
+def _timed(name: str, fn):
+    t0 = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        # 先読みに失敗しても、実際に使うときに同じ処理が行われるため画面には出さない
+        _status[name] = f"{type(e).__name__}: {e}"
+        log.warning("先読みに失敗しました（%s）: %s", name, e)
+        return
+    _status[name] = round(time.perf_counter() - t0, 3)
+
+def _run(template_key: Optional[str], inline: bool):
+    from .parsing import extract_fields
+    _timed("extract", lambda: extract_fields(_SAMPLE_TEXT))
+    if template_key:
+        from .template_store import get_template
+        from .cellmap import plan_for_template
+        _timed("template", lambda: plan_for_template(get_template(template_key)))
+        if inline:
+            # ワーカーを使わない設定では、この（画面の）プロセスでテンプレートを解析しておく
+            from .jobs import get_queue
+            _timed("workers", lambda: get_queue().warm(template_key, backend=XLSX_BACKEND))
+    _status["done"] = True
+
+def start_warmup(template_path: str = "template.xlsm") -> bool:
+    # プロセスごとに1回だけ起動する（2回目以降の呼び出しは何もしない）
+    global _started
+    if not WARMUP:
+        return False
+    with _lock:
+        if _started:
+            return False
+        _started = True
+
+    from .jobs import get_queue
+    template_key, queue = None, get_queue()
+    if os.path.exists(template_path):
+        from .template_store import load_default_template
+        try:
+            template_key = load_default_template(template_path)
+        except OSError as e:
+            log.warning("先読みに失敗しました（template）: %s", e)
+    if template_key and queue.workers > 0:
+        # spawn のワーカーは起動した時点の sys.path を引き継ぐ。アプリのフォルダが sys.path に入るのは
+        # 画面のスクリプト実行中だけのため、ワーカーの起動（起動の完了は待たない）はここで行う
+        _timed("workers", lambda: queue.warm(template_key, backend=XLSX_BACKEND))
+    threading.Thread(target=_run, args=(template_key, queue.workers <= 0),
+                     name="report_maker-warmup", daemon=True).start()
+    return True
+
+def warmup_status() -> Dict[str, object]:
+    return dict(_status)
@@ -0,0 +1,205 @@
+# report_maker/core/watch.py
+# 使い方: python -m core.watch <maildir|受信フォルダ> [--outbox data/outbox] --affiliation <所属> [--interval 5]
+# メールルールなどで届く maildir / 受信フォルダ（.eml / .txt）を監視し、新着メールから報告書の下書きを先に作っておく
+# 処理済みのメールとフォルダの更新時刻を outbox の SQLite に記録するため、再起動しても処理済みのメールは読み直さない
+# 失敗したメールは間隔を延ばしながら MAX_ATTEMPTS 回まで試し直す
+import argparse
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+from .settings import REQUIRED_KEYS, XLSX_BACKEND, OUTBOX_DIR
+from .batch import MAIL_SUFFIXES, iter_messages
+from .extract_cache import ExtractCache
+from .cellmap import CellMapError, plan_for_template
+from .excel_writer import fill_template_xlsx, build_filename, template_hash
+from .mailstream import is_maildir, message_to_text, parse_message
+from .outbox import Outbox
+
+log = logging.getLogger("report_maker.watch")
+
+DEFAULT_INTERVAL_SEC = 5.0
+# 受信フォルダ（maildir 以外）では、書き込み途中のファイルを読まないよう更新から少し待つ
+SETTLE_SEC = 2.0
+# 失敗したメールの再試行: RETRY_BASE_SEC から倍々に延ばし（上限 RETRY_MAX_SEC）、MAX_ATTEMPTS 回失敗したらやめる
+MAX_ATTEMPTS = 5
+RETRY_BASE_SEC = 30.0
+RETRY_MAX_SEC = 3600.0
+
+def _watch_dirs(root: str) -> List[Tuple[str, bool]]:
+    # (フォルダ, maildir か)。maildir は tmp/ に書き終えてから new/ へ移すため、new/ と cur/ だけを見る
+    if is_maildir(root):
+        return [(os.path.join(root, sub), True) for sub in ("new", "cur") if os.path.isdir(os.path.join(root, sub))]
+    return [(root, False)]
+
+def _entry_key(name: str, maildir: bool) -> str:
+    # maildir のファイル名は既読などのフラグ（":2,S"）で変わるため、固有部分だけで同じメールと判定する
+    return "maildir:" + name.split(":", 1)[0] if maildir else "file:" + name
+
+def _read_text(path: str, maildir: bool) -> str:
+    if maildir:
+        with open(path, "rb") as f:
+            return message_to_text(parse_message(f.read()))
+    return next(iter_messages(path))[1]
+
+class Watcher:
+    def __init__(self, root: str, outbox: Outbox, template_path: str, extra: Dict[str, str],
+                 backend: str = XLSX_BACKEND, cache_path: Optional[str] = None):
+        self.root = root
+        self.outbox = outbox
+        self.template_path = template_path
+        self.extra = extra
+        self.backend = backend
+        self.cache = ExtractCache(path=cache_path)
+        self._template: Optional[bytes] = None
+        self._template_mtime: Optional[float] = None
+        self._template_key: Optional[str] = None
+
+    def _load_template(self) -> Tuple[bytes, str]:
+        # テンプレートが差し替えられたら読み直す
+        mtime = os.path.getmtime(self.template_path)
+        if mtime != self._template_mtime:
+            with open(self.template_path, "rb") as f:
+                self._template = f.read()
+            self._template_mtime = mtime
+            self._template_key = template_hash(self._template)
+        return self._template, self._template_key
+
+    def _new_entries(self, directory: str, maildir: bool, now: float) -> Tuple[List[Tuple[str, str]], bool]:
+        # 未処理のメール [(キー, パス)] と、書き込み途中で見送ったものがあるか
+        entries, deferred = [], False
+        with os.scandir(directory) as it:
+            for entry in sorted(it, key=lambda e: e.name):
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                if not maildir and not entry.name.lower().endswith(MAIL_SUFFIXES):
+                    continue
+                key = _entry_key(entry.name, maildir)
+                if self.outbox.is_processed(key):
+                    continue
+                failure = self.outbox.failure(key)
+                if failure is not None:
+                    retry_at = failure[1]
+                    if retry_at is None:
+                        continue
+                    if now < retry_at:
+                        # 再試行の時刻まで、フォルダの更新がなくても走査を続ける
+                        deferred = True
+                        continue
+                if not maildir and now - entry.stat().st_mtime < SETTLE_SEC:
+                    deferred = True
+                    continue
+                entries.append((key, entry.path))
+        return entries, deferred
+
+    def process(self, key: str, path: str, maildir: bool) -> str:
+        try:
+            data = dict(self.cache.extract(_read_text(path, maildir)))
+            data.update(self.extra)
+            missing = [k for k in REQUIRED_KEYS if not (data.get(k) or "").strip()]
+            xlsx_bytes = template_key = None
+            if not missing:
+                template_bytes, template_key = self._load_template()
+                xlsx_bytes = fill_template_xlsx(template_bytes, data, backend=self.backend)
+            draft_id = self.outbox.add_draft(data, path, missing, xlsx_bytes=xlsx_bytes,
+                                             filename=build_filename(data), template_key=template_key)
+        except FileNotFoundError:
+            # 読む前に移動・削除された（maildir の new/ → cur/ など）。次回の走査で拾い直す
+            return "moved"
+        except Exception as e:
+            failure = self.outbox.failure(key)
+            attempts = (failure[0] if failure else 0) + 1
+            retry_at = None
+            if attempts < MAX_ATTEMPTS:
+                retry_at = time.time() + min(RETRY_BASE_SEC * 2 ** (attempts - 1), RETRY_MAX_SEC)
+            self.outbox.record_failure(key, path, attempts, f"{type(e).__name__}: {e}", retry_at)
+            if retry_at is None:
+                log.error("失敗（%d 回目、再試行しません）: %s (%s: %s)", attempts, path, type(e).__name__, e)
+                return "failed"
+            log.error("失敗（%d 回目、%.0f 秒後に再試行）: %s (%s: %s)",
+                      attempts, retry_at - time.time(), path, type(e).__name__, e)
+            return "retry"
+        status = "incomplete" if missing else "ok"
+        self.outbox.mark_processed(key, path, status, "・".join(missing) or None, draft_id)
+        if missing:
+            log.warning("下書き（必須項目が未入力: %s）: %s", "・".join(missing), path)
+        else:
+            log.info("下書き: %s -> %s", path, build_filename(data))
+        return status
+
+    def scan_once(self) -> Dict[str, int]:
+        counts = {"ok": 0, "incomplete": 0, "retry": 0, "failed": 0, "moved": 0}
+        now = time.time()
+        for directory, maildir in _watch_dirs(self.root):
+            # フォルダの更新時刻が前回の走査から変わっていなければ、中身を一覧しない
+            mtime = os.stat(directory).st_mtime_ns
+            if self.outbox.dir_mtime(directory) == mtime:
+                continue
+            entries, deferred = self._new_entries(directory, maildir, now)
+            for key, path in entries:
+                status = self.process(key, path, maildir)
+                counts[status] += 1
+                deferred = deferred or status in ("moved", "retry")
+            if not deferred:
+                self.outbox.set_dir_mtime(directory, mtime)
+        return counts
+
+    def run(self, interval: float = DEFAULT_INTERVAL_SEC, once: bool = False):
+        while True:
+            counts = self.scan_once()
+            if counts["ok"] or counts["incomplete"] or counts["retry"] or counts["failed"]:
+                log.info("走査: 下書き %d 件 / 未入力あり %d 件 / 失敗 %d 件（再試行待ち %d 件）",
+                         counts["ok"], counts["incomplete"], counts["retry"] + counts["failed"], counts["retry"])
+            if once:
+                return
+            time.sleep(interval)
+
+    def close(self):
+        self.cache.close()
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m core.watch", description="受信フォルダを監視し、新着メールから報告書の下書きを作ります")
+    ap.add_argument("root", help="監視する maildir、または .eml/.txt が置かれるフォルダ")
+    ap.add_argument("--outbox", default=OUTBOX_DIR, help="下書きとチェックポイントの保存先フォルダ")
+    ap.add_argument("--template", default="template.xlsm", help="テンプレート(.xlsm)のパス")
+    ap.add_argument("--affiliation", default="", help="所属（画面の Step 2 と同じ値）")
+    ap.add_argument("--processing-after", default="", help="処理修理後（画面の Step 2 と同じ値）")
+    ap.add_argument("--backend", choices=("openpyxl", "zip"), default=XLSX_BACKEND, help="Excel書き込み方式")
+    ap.add_argument("--extract-cache", default=None, help="抽出結果を保存する SQLite ファイル（core.batch と共用可）")
+    ap.add_argument("--interval", type=float, default=DEFAULT_INTERVAL_SEC, help="走査の間隔（秒）")
+    ap.add_argument("--once", action="store_true", help="1回だけ走査して終了する")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not os.path.isdir(args.root):
+        log.error("監視するフォルダが見つかりません: %s", args.root)
+        return 2
+    if not args.outbox:
+        log.error("下書きの保存先（--outbox）を指定してください。")
+        return 2
+    if not os.path.exists(args.template):
+        log.error("テンプレートが見つかりません: %s", args.template)
+        return 2
+    try:
+        with open(args.template, "rb") as f:
+            plan = plan_for_template(f.read())
+    except CellMapError as e:
+        log.error("テンプレートが様式に合いません: %s", e)
+        return 2
+    log.info("様式: %s", plan.name)
+
+    extra = {"所属": args.affiliation, "処理修理後": args.processing_after}
+    watcher = Watcher(args.root, Outbox(args.outbox), args.template, extra,
+                      backend=args.backend, cache_path=args.extract_cache)
+    try:
+        watcher.run(interval=args.interval, once=args.once)
+    except KeyboardInterrupt:
+        log.info("監視を終了します。")
+    finally:
+        watcher.close()
+        watcher.outbox.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+# report_maker/core/xlsx_patch.py
+# openpyxl を使わず、.xlsm を ZIP として扱い対象シートの XML だけを書き換える
+import io
+import posixpath
+import re
+import zipfile
+from typing import Dict, List, Optional, Tuple
+from xml.etree import ElementTree as ET
+from xml.sax.saxutils import escape
+
+_NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_SHEETDATA_RE = re.compile(r"<sheetData\s*/>|<sheetData>(.*?)</sheetData>", re.S)
+_ROW_RE = re.compile(r"<row\b([^>]*?)(?:/>|>(.*?)</row>)", re.S)
+_CELL_RE = re.compile(r"<c\b([^>]*?)(?:/>|>(.*?)</c>)", re.S)
+_ATTR_R_RE = re.compile(r'\br="([A-Z]*)(\d+)"')
+_ATTR_S_RE = re.compile(r'\bs="(\d+)"')
+_ADDR_RE = re.compile(r"^([A-Z]+)(\d+)$")
+# openpyxl が受け付けない制御文字（openpyxl.cell.cell.ILLEGAL_CHARACTERS_RE と同じ範囲）
+_ILLEGAL_RE = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+def _col_index(col: str) -> int:
+    n = 0
+    for ch in col:
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+def _split_addr(addr: str) -> Tuple[str, int]:
+    m = _ADDR_RE.match(addr)
+    if not m:
+        raise ValueError(f"セル番地が不正です: {addr}")
+    return m.group(1), int(m.group(2))
+
+def _resolve_sheet_path(zf: zipfile.ZipFile, sheet_name: str) -> str:
+    wb = ET.fromstring(zf.read("xl/workbook.xml"))
+    sheets = wb.findall(f"{{{_NS_MAIN}}}sheets/{{{_NS_MAIN}}}sheet")
+    if not sheets:
+        raise ValueError("ブック内にシートがありません。")
+
+    target = next((s for s in sheets if s.get("name") == sheet_name), None)
+    if target is None:
+        # openpyxl の wb.active と同じく、bookViews の activeTab を既定とする
+        view = wb.find(f"{{{_NS_MAIN}}}bookViews/{{{_NS_MAIN}}}workbookView")
+        idx = int(view.get("activeTab", 0)) if view is not None else 0
+        target = sheets[idx] if idx < len(sheets) else sheets[0]
+
+    rid = target.get(f"{{{_NS_REL}}}id")
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.findall(f"{{{_NS_PKG_REL}}}Relationship"):
+        if rel.get("Id") == rid:
+            tgt = rel.get("Target")
+            if tgt.startswith("/"):
+                return tgt.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", tgt))
+    raise ValueError(f"シートの参照先が見つかりません: {target.get('name')}")
+
+def _render_cell(addr: str, style: Optional[str], value) -> str:
+    attrs = f'r="{addr}"' + (f' s="{style}"' if style is not None else "")
+    # openpyxl の書き出し（インライン文字列）と同じ表現にそろえる
+    if value is None:
+        return f"<c {attrs}/>"
+    if isinstance(value, bool):
+        return f'<c {attrs} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c {attrs} t="n"><v>{value}</v></c>'
+
+    text = str(value)
+    if _ILLEGAL_RE.search(text):
+        raise ValueError(f"セルに使用できない文字が含まれています: {addr}")
+    if text == "":
+        return f'<c {attrs} t="inlineStr"/>'
+    if text.startswith("=") and len(text) > 1:
+        return f"<c {attrs}><f>{escape(text[1:])}</f><v></v></c>"
+    space = ' xml:space="preserve"' if text != text.strip() else ""
+    return f'<c {attrs} t="inlineStr"><is><t{space}>{escape(text)}</t></is></c>'
+
+def _patch_row(row_attrs: str, body: Optional[str], cells: Dict[str, object]) -> str:
+    pending = sorted(((_col_index(_split_addr(a)[0]), a) for a in cells), reverse=True)
+    parts: List[str] = []
+    pos = 0
+    for m in _CELL_RE.finditer(body or ""):
+        mr = _ATTR_R_RE.search(m.group(1))
+        col = _col_index(mr.group(1)) if mr and mr.group(1) else None
+        if col is None:
+            continue
+        # 既存セルより前に入るべき新規セルを差し込む
+        while pending and pending[-1][0] < col:
+            _, addr = pending.pop()
+            parts.append(body[pos:m.start()])
+            parts.append(_render_cell(addr, None, cells[addr]))
+            pos = m.start()
+        if pending and pending[-1][0] == col:
+            _, addr = pending.pop()
+            ms = _ATTR_S_RE.search(m.group(1))
+            parts.append(body[pos:m.start()])
+            parts.append(_render_cell(addr, ms.group(1) if ms else None, cells[addr]))
+            pos = m.end()
+    parts.append((body or "")[pos:])
+    while pending:
+        _, addr = pending.pop()
+        parts.append(_render_cell(addr, None, cells[addr]))
+    return f"<row{row_attrs}>{''.join(parts)}</row>"
+
+def patch_sheet_xml(xml: str, cells: Dict[str, object]) -> str:
+    by_row: Dict[int, Dict[str, object]] = {}
+    for addr, value in cells.items():
+        _, row = _split_addr(addr)
+        by_row.setdefault(row, {})[addr] = value
+
+    msd = _SHEETDATA_RE.search(xml)
+    if not msd:
+        raise ValueError("シートに sheetData がありません。")
+    body = msd.group(1) or ""
+    pending_rows = sorted(by_row, reverse=True)
+
+    parts: List[str] = []
+    pos = 0
+    for m in _ROW_RE.finditer(body):
+        mr = re.search(r'\br="(\d+)"', m.group(1))
+        if not mr:
+            continue
+        row_num = int(mr.group(1))
+        while pending_rows and pending_rows[-1] < row_num:
+            r = pending_rows.pop()
+            parts.append(body[pos:m.start()])
+            parts.append(_patch_row(f' r="{r}"', None, by_row[r]))
+            pos = m.start()
+        if pending_rows and pending_rows[-1] == row_num:
+            pending_rows.pop()
+            parts.append(body[pos:m.start()])
+            parts.append(_patch_row(m.group(1).rstrip(), m.group(2), by_row[row_num]))
+            pos = m.end()
+    parts.append(body[pos:])
+    while pending_rows:
+        r = pending_rows.pop()
+        parts.append(_patch_row(f' r="{r}"', None, by_row[r]))
+
+    return f"{xml[:msd.start()]}<sheetData>{''.join(parts)}</sheetData>{xml[msd.end():]}"
+
+def fill_cells_zip(template_bytes: bytes, sheet_name: str, cells: Dict[str, object]) -> bytes:
+    try:
+        zin = zipfile.ZipFile(io.BytesIO(template_bytes))
+        sheet_path = _resolve_sheet_path(zin, sheet_name)
+    except Exception as e:
+        raise RuntimeError(f"テンプレートの読み込みに失敗しました（破損の可能性）: {e}") from e
+
+    out = io.BytesIO()
+    try:
+        with zin, zipfile.ZipFile(out, "w") as zout:
+            for info in zin.infolist():
+                payload = zin.read(info)
+                if info.filename == sheet_path:
+                    payload = patch_sheet_xml(payload.decode("utf-8"), cells).encode("utf-8")
+                # シート以外（vbaProject.bin・styles・他シート）は内容をそのまま複写する
+                zout.writestr(info, payload)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"Excel保存時に失敗しました: {e}") from e
+    return out.getvalue()
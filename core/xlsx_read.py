@@ -0,0 +1,93 @@
+# report_maker/core/xlsx_read.py
+# openpyxl でブック全体を開かず、ZIP から対象シートの XML（と共有文字列）だけを逐次読みする
+# 作成済み報告書の索引（archive_index）とテンプレートの照合（cellmap）で使う
+import zipfile
+from typing import Dict, Iterable, List, Optional
+from xml.etree import ElementTree as ET
+from .xlsx_patch import _NS_MAIN
+
+_C = f"{{{_NS_MAIN}}}c"
+_ROW = f"{{{_NS_MAIN}}}row"
+_V = f"{{{_NS_MAIN}}}v"
+_T = f"{{{_NS_MAIN}}}t"
+_IS = f"{{{_NS_MAIN}}}is"
+_SI = f"{{{_NS_MAIN}}}si"
+_RPH = f"{{{_NS_MAIN}}}rPh"
+_MERGE = f"{{{_NS_MAIN}}}mergeCell"
+
+def _inline_text(node) -> str:
+    # ふりがな（rPh）は本文に含めない
+    parts = []
+    for child in node:
+        if child.tag == _T:
+            parts.append(child.text or "")
+        elif child.tag != _RPH:
+            parts.extend(t.text or "" for t in child.iter(_T))
+    return "".join(parts)
+
+def _number(text: str):
+    try:
+        f = float(text)
+    except ValueError:
+        return text
+    return int(f) if f.is_integer() else f
+
+def _read_shared_strings(zf: zipfile.ZipFile, indexes: set) -> Dict[int, str]:
+    out: Dict[int, str] = {}
+    if not indexes or "xl/sharedStrings.xml" not in zf.namelist():
+        return out
+    last = max(indexes)
+    idx = 0
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag != _SI:
+                continue
+            if idx in indexes:
+                out[idx] = _inline_text(elem)
+            elem.clear()
+            idx += 1
+            if idx > last:
+                break
+    return out
+
+def read_cells(zf: zipfile.ZipFile, sheet_path: str, wanted: Iterable[str],
+               last_row: Optional[int] = None) -> Dict[str, object]:
+    # wanted のセルの値（共有文字列は文字列にして返す）。last_row の行を読んだら以降は読まない
+    wanted = set(wanted)
+    values: Dict[str, object] = {}
+    shared_refs: Dict[str, int] = {}
+    with zf.open(sheet_path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == _C:
+                addr = elem.get("r")
+                if addr in wanted:
+                    kind = elem.get("t")
+                    v = elem.find(_V)
+                    if kind == "inlineStr":
+                        node = elem.find(_IS)
+                        values[addr] = _inline_text(node) if node is not None else ""
+                    elif kind == "s" and v is not None and v.text:
+                        shared_refs[addr] = int(v.text)
+                    elif v is not None and v.text is not None:
+                        values[addr] = v.text if kind in ("str", "e") else _number(v.text)
+            elif elem.tag == _ROW:
+                # clear() は属性も消すため、行番号は先に読む
+                r = elem.get("r")
+                elem.clear()
+                if last_row is not None and int(r or 0) >= last_row:
+                    break
+    strings = _read_shared_strings(zf, set(shared_refs.values()))
+    for addr, idx in shared_refs.items():
+        values[addr] = strings.get(idx)
+    return values
+
+def read_merged_ranges(zf: zipfile.ZipFile, sheet_path: str) -> List[str]:
+    # 結合セルの範囲（"C12:G12" など）。mergeCells は sheetData の後ろにあるため最後まで読む
+    ranges: List[str] = []
+    with zf.open(sheet_path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == _MERGE:
+                ranges.append(elem.get("ref"))
+            elif elem.tag == _ROW:
+                elem.clear()
+    return ranges
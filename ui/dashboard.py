@@ -0,0 +1,67 @@
+# report_maker/ui/dashboard.py
+# 集計ダッシュボード（任意）: 多数の完了メール・作成済み報告書から所要時間を集計する
+import streamlit as st
+from core import analytics
+from core.extract_cache import extract_fields_cached
+from core.report_index import get_index
+from ui.uploads import iter_uploaded_messages
+
+SOURCE_INDEX = "作成済み報告書（索引）"
+SOURCE_MAILS = "メールファイル（.eml / .txt / mbox）"
+
+def _fmt_median(summary, name: str) -> str:
+    v = summary[f"{name} p50"].iloc[0]
+    return "—" if v != v else f"{v:.0f}分"
+
+def _records_from_uploads(files) -> list:
+    return [extract_fields_cached(text) for _, text in iter_uploaded_messages(files)]
+
+def _load_frame(source: str, files):
+    # 入力が変わらない限り、再実行時は前回の集計用データを使い回す
+    if source == SOURCE_INDEX:
+        index = get_index()
+        key = (source,)
+        loader = (lambda: list(index.iter_fields())) if index else (lambda: [])
+    else:
+        key = (source,) + tuple(getattr(f, "file_id", None) or (f.name, f.size) for f in files)
+        loader = lambda: _records_from_uploads(files)
+    cached = st.session_state.get("dashboard")
+    if cached and cached["key"] == key:
+        return cached["df"]
+    with st.spinner("集計用データを準備しています..."):
+        df = analytics.build_frame(loader())
+    st.session_state.dashboard = {"key": key, "df": df}
+    return df
+
+def render_dashboard():
+    source = st.radio("集計対象", [SOURCE_INDEX, SOURCE_MAILS], horizontal=True)
+    files = []
+    if source == SOURCE_MAILS:
+        files = st.file_uploader("完了メール", type=["eml", "txt", "mbox"], accept_multiple_files=True) or []
+        if not files:
+            st.info("集計するメールファイルをアップロードしてください。")
+            return
+    elif get_index() is None:
+        st.warning("報告書の索引が無効です（REPORT_MAKER_INDEX）。")
+        return
+    elif st.button("索引を読み込み直す"):
+        st.session_state.dashboard = None
+
+    df = _load_frame(source, files)
+    if df.empty:
+        st.info("集計対象のデータがありません。")
+        return
+
+    summary = analytics.interval_summary(df)
+    c1, c2, c3, c4 = st.columns(4)
+    with c1: st.metric("件数", f"{len(df):,}")
+    with c2: st.metric("受付〜現着 中央値", _fmt_median(summary, "受付〜現着_分"))
+    with c3: st.metric("作業時間 中央値", _fmt_median(summary, "作業時間_分"))
+    with c4: st.metric("受付〜完了 中央値", _fmt_median(summary, "受付〜完了_分"))
+    st.dataframe(summary, use_container_width=True)
+
+    key = st.selectbox("内訳", analytics.BREAKDOWN_KEYS)
+    table = analytics.interval_summary(df, by=key)
+    st.bar_chart(table[[f"{name} p50" for name in analytics.INTERVALS]])
+    st.dataframe(table, use_container_width=True)
+    st.caption("負の所要時間（時刻の入力誤り）は集計から除いています。p50/p90/p95 は分位点（分）です。")
@@ -1,25 +1,270 @@
 # report_maker/ui/steps.py
-import os, sys, traceback
+import os, sys, traceback, uuid
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Tuple
 import streamlit as st
-from core.settings import REQUIRED_KEYS
+from core.settings import REQUIRED_KEYS, JST, JOB_POLL_SEC
 from core.state import (
     get_passcode, ensure_extracted, enter_edit_mode, cancel_edit, save_edit,
-    get_working_dict
+    get_working_dict, set_extracted, update_extracted, get_data_version, clear_bundle
 )
-from core.parsing import extract_fields, minutes_between
-from core.excel_writer import fill_template_xlsx, build_filename
+from core.parsing import minutes_between
+from core.extract_cache import extract_fields_cached, cache_stats
+from core.excel_writer import build_filename
+from core.jobs import get_queue, QueueFull, DONE, FAILED, QUEUED
+from core.template_store import put_template, get_template, has_template, load_default_template
+from core.cellmap import CellMapError, plan_for_template
+from core import instrument
+from core.report_index import get_index
+from core.report_zip import ReportZip
+from core.outbox import get_outbox
+from core.warmup import warmup_status
 from ui.components import render_field  # ← ここはモジュール先頭でインポート
+from ui.uploads import iter_uploaded_messages
 
 def _init_session():
     if "step" not in st.session_state: st.session_state.step = 1
     if "authed" not in st.session_state: st.session_state.authed = False
     if "extracted" not in st.session_state: st.session_state.extracted = None
     if "affiliation" not in st.session_state: st.session_state.affiliation = ""
-    if "template_xlsx_bytes" not in st.session_state: st.session_state.template_xlsx_bytes = None
+    # テンプレート本体はプロセス共有の置き場に置き、セッションにはハッシュだけを持つ
+    if "template_key" not in st.session_state: st.session_state.template_key = None
+    if "template_upload_id" not in st.session_state: st.session_state.template_upload_id = None
+    if "template_error" not in st.session_state: st.session_state.template_error = None
     if "edit_mode" not in st.session_state: st.session_state.edit_mode = False
     if "edit_buffer" not in st.session_state: st.session_state.edit_buffer = {}
+    if "edit_dirty" not in st.session_state: st.session_state.edit_dirty = False
+    if "data_version" not in st.session_state: st.session_state.data_version = 0
+    if "generated" not in st.session_state: st.session_state.generated = None
+    if "perf_records" not in st.session_state: st.session_state.perf_records = {}
+    if "recorded_ids" not in st.session_state: st.session_state.recorded_ids = set()
+    if "dup_check" not in st.session_state: st.session_state.dup_check = None
+    if "index_error" not in st.session_state: st.session_state.index_error = None
+    if "dashboard" not in st.session_state: st.session_state.dashboard = None
+    if "bundle" not in st.session_state: st.session_state.bundle = None
+    # 生成ジョブ（ジョブキューに預けた生成処理）。session_id はセッションごとの同時ジョブ数の上限に使う
+    if "session_id" not in st.session_state: st.session_state.session_id = uuid.uuid4().hex
+    if "gen_job" not in st.session_state: st.session_state.gen_job = None
     ensure_extracted()
 
+def _record_perf(group: str):
+    # 計測が有効なときだけ、直前の処理の段階別計測を開発者向け表示用に保持する
+    if instrument.is_enabled():
+        st.session_state.perf_records[group] = instrument.drain()
+
+def _generate_cached(template_key: str, data: dict):
+    # 入力（テンプレート・データ・作成日）が変わらない限り、再実行時は前回の生成結果を使い回す
+    # データの変化は core.state の版番号で判定する（抽出結果の変更はすべて state 経由）
+    # 生成はジョブキューに預け、終わるまでは None を返す（画面は _job_progress が完了を待って再実行する）
+    today = datetime.now(JST).strftime("%Y%m%d")
+    key = (template_key, get_data_version(), today)
+    cached = st.session_state.generated
+    if cached and cached["key"] == key:
+        return cached["xlsx"], cached["fname"]
+    # 同じテンプレート・内容で今日すでに作成済みなら、索引に保存した報告書をそのまま返す
+    index = get_index()
+    past = index.find_identical(template_key, data, today) if index else None
+    xlsx_bytes = index.load_content(past["output_sha256"]) if past else None
+    if xlsx_bytes is not None:
+        st.session_state.generated = {"key": key, "xlsx": xlsx_bytes, "fname": past["filename"], "recorded": True}
+        return xlsx_bytes, past["filename"]
+
+    queue = get_queue()
+    job = st.session_state.gen_job
+    if job and job["key"] != key:
+        # 入力が変わったら、古い生成ジョブは取り消す
+        queue.cancel(job["id"])
+        job = st.session_state.gen_job = None
+    if job is None:
+        job_id = queue.submit(template_key, data, owner=st.session_state.session_id)
+        job = st.session_state.gen_job = {"key": key, "id": job_id}
+    status = queue.status(job["id"])
+    if status is None or status["status"] == FAILED:
+        st.session_state.gen_job = None
+        raise RuntimeError(status["error"] if status else "生成ジョブの結果の保持期限が切れました。もう一度お試しください。")
+    if status["status"] != DONE:
+        return None
+    xlsx_bytes = queue.result(job["id"])
+    fname = build_filename(data)
+    _record_perf("Excel生成")
+    st.session_state.gen_job = None
+    st.session_state.generated = {"key": key, "xlsx": xlsx_bytes, "fname": fname, "recorded": False}
+    return xlsx_bytes, fname
+
+def _job_pending() -> bool:
+    job = st.session_state.gen_job
+    status = get_queue().status(job["id"]) if job else None
+    return status is not None and status["status"] not in (DONE, FAILED)
+
+@st.fragment(run_every=JOB_POLL_SEC)
+def _job_progress():
+    # 生成ジョブの状態を一定間隔で確認し、終わったらアプリ全体を再実行してダウンロードボタンを出す
+    job = st.session_state.gen_job
+    status = get_queue().status(job["id"]) if job else None
+    if status is None or status["status"] in (DONE, FAILED):
+        st.rerun()
+    if status["status"] == QUEUED:
+        st.info(f"⏳ 生成の順番を待っています（前に {status['ahead']} 件）")
+    else:
+        st.info(f"⚙️ 報告書を生成しています…（{status['elapsed']:.0f} 秒）")
+
+def _record_download():
+    # ダウンロードされた報告書を索引に記録する（同じ生成結果は1回だけ）
+    gen = st.session_state.generated
+    index = get_index()
+    if not gen or gen.get("recorded") or index is None:
+        return
+    try:
+        report_id = index.record(get_working_dict(), gen["fname"], gen["xlsx"], template_key=gen["key"][0], source="app")
+    except Exception as e:
+        st.session_state.index_error = f"報告書の索引への記録に失敗しました: {e}"
+        return
+    gen["recorded"] = True
+    st.session_state.recorded_ids.add(report_id)
+    st.session_state.index_error = None
+
+def _past_reports(data) -> list:
+    # 同じ案件の作成済み報告書（このセッションで記録したものは除く）。抽出結果が変わったときだけ問い合わせる
+    index = get_index()
+    if index is None:
+        return []
+    check = st.session_state.dup_check
+    if not check or check["version"] != get_data_version():
+        check = st.session_state.dup_check = {"version": get_data_version(), "rows": index.find_duplicates(data)}
+    return [r for r in check["rows"] if r["id"] not in st.session_state.recorded_ids]
+
+def _build_bundle(template_key: str, files, progress=None) -> Tuple[ReportZip, list]:
+    # 複数メールの報告書をジョブキューで並行して生成し、終わったものから ZIP に書き込む（生成結果をメモリに溜めない）
+    # 投入はセッションごとの同時ジョブ数までに絞り、上限に達したら1件終わるのを待って次を入れる
+    extra = {"所属": st.session_state.affiliation, "処理修理後": st.session_state.get("processing_after", "")}
+    records, skipped = [], []
+    for source, text in iter_uploaded_messages(files):
+        data = dict(extract_fields_cached(text))
+        data.update(extra)
+        missing = [k for k in REQUIRED_KEYS if not (data.get(k) or "").strip()]
+        if missing:
+            skipped.append(f"{source}（必須項目が未入力: {'・'.join(missing)}）")
+        else:
+            records.append((source, data))
+
+    queue, index = get_queue(), get_index()
+    bundle, pending = ReportZip(), {}
+    finished = 0
+
+    def _collect(job_ids):
+        nonlocal finished
+        for job_id in job_ids:
+            source, data = pending.pop(job_id)
+            try:
+                xlsx_bytes = queue.result(job_id)
+            except Exception as e:
+                skipped.append(f"{source}（生成に失敗: {type(e).__name__}: {e}）")
+            else:
+                name = bundle.add(data, xlsx_bytes)
+                if index is not None:
+                    index.record(data, name, xlsx_bytes, template_key=template_key, source=source)
+            finished += 1
+            if progress:
+                progress(finished, len(records))
+
+    try:
+        for source, data in records:
+            while True:
+                try:
+                    pending[queue.submit(template_key, data, owner=st.session_state.session_id)] = (source, data)
+                    break
+                except QueueFull:
+                    if not pending:
+                        raise
+                    _collect(queue.wait(pending))
+        while pending:
+            _collect(queue.wait(pending))
+    except Exception:
+        for job_id in pending:
+            queue.cancel(job_id)
+        bundle.discard()
+        raise
+    _record_perf("一括生成")
+    return bundle, skipped
+
+def _bulk_section():
+    with st.expander("複数のメールからまとめて作成（ZIP）", expanded=False):
+        files = st.file_uploader("完了メール（.eml / .txt / mbox）", type=["eml", "txt", "mbox"],
+                                 accept_multiple_files=True, key="bulk_files") or []
+        if st.button("まとめて生成", use_container_width=True, disabled=not files, key="bulk_generate"):
+            clear_bundle()
+            try:
+                bar = st.progress(0.0, text="報告書を生成しています...")
+                bundle, skipped = _build_bundle(
+                    st.session_state.template_key, files,
+                    progress=lambda n, total: bar.progress(n / total, text=f"報告書を生成しています...（{n}/{total} 件）"),
+                )
+                bar.empty()
+                # ZIP は一時ファイル（ReportZip）のままセッションに持ち、バイト列にはしない。破棄は clear_bundle で行う
+                bundle.finish()
+                st.session_state.bundle = {"zip": bundle, "skipped": skipped,
+                                           "fname": f"緊急出動報告書_{datetime.now(JST):%Y%m%d_%H%M}.zip"}
+            except Exception as e:
+                st.error(f"一括生成中にエラーが発生しました: {e}")
+
+        result = st.session_state.bundle
+        if result:
+            st.success(f"{len(result['zip'].names)} 件の報告書をまとめました。")
+            for line in result["skipped"]:
+                st.warning("スキップ: " + line)
+            if result["zip"].names:
+                st.download_button(
+                    "ZIPをダウンロード",
+                    data=result["zip"].reader(),
+                    file_name=result["fname"],
+                    mime="application/zip",
+                    use_container_width=True,
+                    key="bulk_download",
+                )
+
+def _open_draft(outbox, draft: dict):
+    fields = dict(draft["fields"])
+    if not (fields.get("所属") or "").strip():
+        fields["所属"] = st.session_state.affiliation
+    # 下書きの処理修理後をそのまま使う（Step 2 の入力で上書きしない）
+    fields["_processing_after_initialized"] = True
+    cancel_edit()
+    set_extracted(fields)
+    outbox.mark_opened(draft["id"])
+    st.session_state.dup_check = None
+    clear_bundle()
+    # 今のテンプレートで今日作られた下書きなら、生成済みの報告書をそのまま使う
+    today = datetime.now(JST).strftime("%Y%m%d")
+    if draft["filename"] and draft["template_sha256"] == st.session_state.template_key and draft["created_day"] == today:
+        xlsx_bytes = outbox.load_report(draft)
+        if xlsx_bytes is not None:
+            st.session_state.generated = {"key": (st.session_state.template_key, get_data_version(), today),
+                                          "xlsx": xlsx_bytes, "fname": draft["filename"], "recorded": False}
+    st.session_state.step = 3
+
+def _drafts_section():
+    # 受信フォルダ監視（core.watch）が作った下書きの一覧
+    outbox = get_outbox()
+    if outbox is None:
+        return
+    drafts = outbox.list_drafts(limit=20)
+    with st.expander(f"📥 受信済みの下書き（{len(drafts)} 件）", expanded=bool(drafts)):
+        if not drafts:
+            st.caption("新しい下書きはありません。")
+            return
+        for draft in drafts:
+            f = draft["fields"]
+            c1, c2 = st.columns([0.8, 0.2])
+            with c1:
+                st.markdown(f"**{f.get('管理番号') or '（管理番号なし）'}** {f.get('物件名') or ''}　受信: {f.get('受信時刻') or '—'}")
+                if draft["missing"]:
+                    st.caption(f"⚠️ 未入力: {draft['missing']}")
+            with c2:
+                if st.button("開く", key=f"open_draft_{draft['id']}", use_container_width=True):
+                    _open_draft(outbox, draft)
+                    st.rerun()
+
 def _fmt_minutes(v):
     # Noneや負値はハイフン表記
     if v is None or v < 0:
@@ -32,6 +277,135 @@ def _fmt_minutes(v):
     # 60分未満はそのまま「N分」
     return f"{v}分"
 
+@lru_cache(maxsize=256)
+def _durations(recv: Optional[str], arrive: Optional[str], done: Optional[str]) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    return minutes_between(recv, arrive), minutes_between(arrive, done), minutes_between(recv, done)
+
+# Step 3 は区画ごとに fragment 化し、入力の変更で再実行されるのはその区画だけにする
+# 保存・破棄・編集開始は表示全体が変わるため、st.rerun() でアプリ全体を再実行する
+@st.fragment
+def _edit_section():
+    # ① 編集対象：枠内に薄めボタンを配置（編集モードの制御）
+    with st.expander("① 編集対象（まとめて編集・すべて必須）", expanded=True):
+        c_left, c_mid, c_right = st.columns([1, 1, 1])
+        with c_right:
+            if not st.session_state.get("edit_mode"):
+                if st.button("✏️ 編集モードに入る", key="enter_edit_inline"):
+                    enter_edit_mode()
+                    st.rerun()
+            else:
+                c1, c2 = st.columns([1, 1])
+                with c1:
+                    if st.button("✅ すべて保存", key="save_edit_inline"):
+                        save_edit()
+                        st.success("保存しました")
+                        st.rerun()
+                with c2:
+                    if st.button("↩️ 変更を破棄", key="cancel_edit_inline"):
+                        cancel_edit()
+                        st.info("変更を破棄しました")
+                        st.rerun()
+
+        # 入力フィールド群
+        render_field("通報者", "通報者", 1, editable_in_bulk=True)
+        render_field("受信内容", "受信内容", 4, editable_in_bulk=True)
+        render_field("現着状況", "現着状況", 5, editable_in_bulk=True)
+        render_field("原因", "原因", 5, editable_in_bulk=True)
+        render_field("処置内容", "処置内容", 5, editable_in_bulk=True)
+        render_field("処理修理後", "処理修理後", 1, editable_in_bulk=True)
+        render_field("所属", "所属", 1, editable_in_bulk=True)
+
+    # 必須項目の確認（編集中はこの区画の再実行だけで更新する）
+    if st.session_state.get("edit_mode"):
+        buf = get_working_dict()
+        missing = [k for k in REQUIRED_KEYS if not (buf.get(k) or "").strip()]
+        if missing:
+            st.warning("未入力の必須項目があります： " + "・".join(missing))
+
+@st.fragment
+def _generate_section():
+    error_trace = None
+    try:
+        is_editing = st.session_state.get("edit_mode", False)
+        gen_data = get_working_dict()
+        missing_now = [k for k in REQUIRED_KEYS if not (gen_data.get(k) or "").strip()]
+        can_generate = (not is_editing) and (not missing_now)
+
+        generated = None
+        if can_generate:
+            try:
+                generated = _generate_cached(st.session_state.template_key, gen_data)
+            except QueueFull as e:
+                # 混雑時は受け付けない（押し直すとこの区画だけ再実行して再投入する）
+                st.warning(str(e))
+                st.button("もう一度生成する", key="retry_generate", use_container_width=True)
+
+        if generated is not None:
+            xlsx_bytes, fname = generated
+            st.download_button(
+                "Excelを生成（.xlsm）",
+                data=xlsx_bytes,
+                file_name=fname,
+                mime="application/vnd.ms-excel.sheet.macroEnabled.12",
+                use_container_width=True,
+                disabled=False,
+                help="一括編集モードはオフ、かつ必須項目がすべて入力されている場合に生成できます",
+                on_click=_record_download,
+            )
+            if st.session_state.index_error:
+                st.warning(st.session_state.index_error)
+            past = _past_reports(gen_data)
+            if past:
+                latest = past[0]
+                st.warning(f"同じ案件の報告書が {len(past)} 件作成済みです（最新: {latest['created_at']} {latest['filename']}）")
+                past_bytes = get_index().load_content(latest["output_sha256"])
+                if past_bytes is not None:
+                    st.download_button(
+                        "作成済みの報告書をダウンロード",
+                        data=past_bytes,
+                        file_name=latest["filename"],
+                        mime="application/vnd.ms-excel.sheet.macroEnabled.12",
+                        use_container_width=True,
+                        key="download_past_report",
+                    )
+        else:
+            st.download_button(
+                "Excelを生成（.xlsm）",
+                data=b"",
+                file_name="未生成.xlsm",
+                mime="application/vnd.ms-excel.sheet.macroEnabled.12",
+                use_container_width=True,
+                disabled=True,
+                help="一括編集モード中は保存後に生成できます。必須未入力がある場合も生成できません。",
+            )
+            if is_editing:
+                st.warning("一括編集中は生成できません。「✅ すべて保存」を押して編集を確定してください。")
+            elif missing_now:
+                st.error("未入力の必須項目があります： " + "・".join(missing_now))
+            elif _job_pending():
+                # 再投入ボタンなど、この区画だけの再実行で投入したジョブも完了を待てるよう、確認はこの区画の中で行う
+                _job_progress()
+
+    except Exception as e:
+        st.error(f"テンプレート書き込み中にエラーが発生しました: {e}")
+        error_trace = "".join(traceback.format_exception(*sys.exc_info()))
+        _record_perf("Excel生成")
+
+    if error_trace or instrument.is_enabled():
+        with st.expander("詳細（開発者向け）"):
+            if error_trace:
+                st.code(error_trace, language="python")
+            stats = cache_stats()
+            st.caption(f"抽出キャッシュ: ヒット {stats['hits']} / ミス {stats['misses']} / 保持 {stats['size']} 件")
+            jobs = get_queue().stats()
+            st.caption(f"生成ジョブ: 待ち {jobs['queued']} / 実行中 {jobs['running']}（ワーカー {jobs['workers']}）")
+            warm = warmup_status()
+            if warm:
+                st.caption("起動時の先読み（秒）: " + " / ".join(f"{k} {v}" for k, v in warm.items() if k != "done"))
+            for group, records in st.session_state.perf_records.items():
+                st.caption(f"段階別計測: {group}")
+                st.dataframe(records, use_container_width=True, hide_index=True)
+
 def render_app():
     _init_session()
     PASSCODE = get_passcode()
@@ -54,19 +428,26 @@ def render_app():
     # Step 2
     if st.session_state.step == 2 and st.session_state.authed:
         st.subheader("Step 2. メール本文の貼り付け / 所属 / テンプレ選択")
+        if st.button("📊 集計ダッシュボード", key="open_dashboard"):
+            clear_bundle()
+            st.session_state.step = 4
+            st.rerun()
 
         template_path = "template.xlsm"
         tpl_col1, tpl_col2 = st.columns([0.55, 0.45])
         with tpl_col1:
             st.caption("① 既定：template.xlsm を探します")
-            if os.path.exists(template_path) and not st.session_state.template_xlsx_bytes:
+            if os.path.exists(template_path) and not has_template(st.session_state.template_key):
                 try:
-                    with open(template_path, "rb") as f:
-                        st.session_state.template_xlsx_bytes = f.read()
-                    st.success(f"テンプレートを読み込みました: {template_path}")
+                    key = load_default_template(template_path)
+                    plan = plan_for_template(get_template(key))
+                    st.session_state.template_key = key
+                    st.success(f"テンプレートを読み込みました: {template_path}（様式: {plan.name}）")
+                except CellMapError as e:
+                    st.error(f"既定テンプレートが様式に合いません: {e}")
                 except Exception as e:
                     st.error(f"テンプレートの読み込みに失敗: {e}")
-            elif st.session_state.template_xlsx_bytes:
+            elif st.session_state.template_key:
                 st.success("テンプレートは読み込み済みです。")
             else:
                 st.warning("既定テンプレートが見つかりません。②のアップロードをご利用ください。")
@@ -75,13 +456,32 @@ def render_app():
             st.caption("② またはテンプレ.xlsmをアップロード")
             up = st.file_uploader("テンプレート（.xlsm）", type=["xlsm"], accept_multiple_files=False)
             if up is not None:
-                st.session_state.template_xlsx_bytes = up.read()
-                st.success(f"アップロード済み: {up.name}")
+                # 再実行のたびに読み直さないよう、同じアップロードはハッシュを使い回す
+                # 様式との照合はアップロード時に1回だけ行い、合わないテンプレートは受け付けない
+                upload_id = getattr(up, "file_id", None) or (up.name, up.size)
+                if upload_id != st.session_state.template_upload_id:
+                    st.session_state.template_upload_id = upload_id
+                    st.session_state.template_error = None
+                    data = up.getvalue()
+                    try:
+                        plan_for_template(data)
+                        st.session_state.template_key = put_template(data)
+                    except CellMapError as e:
+                        st.session_state.template_error = str(e)
+                elif st.session_state.template_error is None and not has_template(st.session_state.template_key):
+                    st.session_state.template_key = put_template(up.getvalue())
+                if st.session_state.template_error:
+                    st.error(f"アップロードされたテンプレートは使えません（{up.name}）: {st.session_state.template_error}")
+                else:
+                    plan = plan_for_template(get_template(st.session_state.template_key))
+                    st.success(f"アップロード済み: {up.name}（様式: {plan.name}）")
 
-        if not st.session_state.template_xlsx_bytes:
+        if not has_template(st.session_state.template_key):
             st.error("テンプレートが未準備です。template.xlsm を配置するか、上でアップロードしてください。")
             st.stop()
 
+        _drafts_section()
+
         aff = st.text_input("所属", value=st.session_state.affiliation)
         st.session_state.affiliation = aff
 
@@ -96,16 +496,23 @@ def render_app():
                 if not text.strip():
                     st.warning("本文が空です。")
                 else:
-                    st.session_state.extracted = extract_fields(text)
-                    st.session_state.extracted["所属"] = st.session_state.affiliation
+                    # 同じ本文の再抽出はキャッシュから返す（読み取り専用なので複製して使う）
+                    fields = dict(extract_fields_cached(text))
+                    _record_perf("抽出")
+                    fields["所属"] = st.session_state.affiliation
+                    set_extracted(fields)
+                    clear_bundle()
                     st.session_state.step = 3
                     st.rerun()
         with c2:
             if st.button("クリア", use_container_width=True):
-                st.session_state.extracted = None
+                set_extracted(None)
+                clear_bundle()
                 st.session_state.affiliation = ""
                 st.session_state.processing_after = ""
                 st.rerun()
+
+        _bulk_section()
         return
 
     # Step 3
@@ -114,38 +521,12 @@ def render_app():
 
         if "processing_after" in st.session_state and st.session_state.extracted is not None:
             if not st.session_state.extracted.get("_processing_after_initialized"):
-                st.session_state.extracted["処理修理後"] = st.session_state.get("processing_after", "")
-                st.session_state.extracted["_processing_after_initialized"] = True
-
-        # ① 編集対象：枠内に薄めボタンを配置（編集モードの制御）
-        with st.expander("① 編集対象（まとめて編集・すべて必須）", expanded=True):
-            c_left, c_mid, c_right = st.columns([1, 1, 1])
-            with c_right:
-                if not st.session_state.get("edit_mode"):
-                    if st.button("✏️ 編集モードに入る", key="enter_edit_inline"):
-                        enter_edit_mode()
-                        st.rerun()
-                else:
-                    c1, c2 = st.columns([1, 1])
-                    with c1:
-                        if st.button("✅ すべて保存", key="save_edit_inline"):
-                            save_edit()
-                            st.success("保存しました")
-                            st.rerun()
-                    with c2:
-                        if st.button("↩️ 変更を破棄", key="cancel_edit_inline"):
-                            cancel_edit()
-                            st.info("変更を破棄しました")
-                            st.rerun()
-
-            # 入力フィールド群
-            render_field("通報者", "通報者", 1, editable_in_bulk=True)
-            render_field("受信内容", "受信内容", 4, editable_in_bulk=True)
-            render_field("現着状況", "現着状況", 5, editable_in_bulk=True)
-            render_field("原因", "原因", 5, editable_in_bulk=True)
-            render_field("処置内容", "処置内容", 5, editable_in_bulk=True)
-            render_field("処理修理後", "処理修理後", 1, editable_in_bulk=True)
-            render_field("所属", "所属", 1, editable_in_bulk=True)
+                update_extracted({
+                    "処理修理後": st.session_state.get("processing_after", ""),
+                    "_processing_after_initialized": True,
+                })
+
+        _edit_section()
 
         # ② 基本情報（表示）
         with st.expander("② 基本情報（表示）", expanded=True):
@@ -164,9 +545,9 @@ def render_app():
             render_field("現着時刻", "現着時刻", 1)
             render_field("完了時刻", "完了時刻", 1)
 
-            t_recv_to_arrive = minutes_between(data.get("受信時刻"), data.get("現着時刻"))
-            t_work = minutes_between(data.get("現着時刻"), data.get("完了時刻"))
-            t_recv_to_done = minutes_between(data.get("受信時刻"), data.get("完了時刻"))
+            t_recv_to_arrive, t_work, t_recv_to_done = _durations(
+                data.get("受信時刻"), data.get("現着時刻"), data.get("完了時刻")
+            )
 
             c1, c2, c3 = st.columns(3)
             with c1: st.info(f"受付〜現着: { _fmt_minutes(t_recv_to_arrive) }")
@@ -183,43 +564,7 @@ def render_app():
 
         st.divider()
 
-        try:
-            is_editing = st.session_state.get("edit_mode", False)
-            gen_data = get_working_dict()
-            missing_now = [k for k in REQUIRED_KEYS if not (gen_data.get(k) or "").strip()]
-            can_generate = (not is_editing) and (not missing_now)
-
-            if can_generate:
-                xlsx_bytes = fill_template_xlsx(st.session_state.template_xlsx_bytes, gen_data)
-                fname = build_filename(gen_data)
-                st.download_button(
-                    "Excelを生成（.xlsm）",
-                    data=xlsx_bytes,
-                    file_name=fname,
-                    mime="application/vnd.ms-excel.sheet.macroEnabled.12",
-                    use_container_width=True,
-                    disabled=False,
-                    help="一括編集モードはオフ、かつ必須項目がすべて入力されている場合に生成できます",
-                )
-            else:
-                st.download_button(
-                    "Excelを生成（.xlsm）",
-                    data=b"",
-                    file_name="未生成.xlsm",
-                    mime="application/vnd.ms-excel.sheet.macroEnabled.12",
-                    use_container_width=True,
-                    disabled=True,
-                    help="一括編集モード中は保存後に生成できます。必須未入力がある場合も生成できません。",
-                )
-                if is_editing:
-                    st.warning("一括編集中は生成できません。「✅ すべて保存」を押して編集を確定してください。")
-                if missing_now:
-                    st.error("未入力の必須項目があります： " + "・".join(missing_now))
-
-        except Exception as e:
-            st.error(f"テンプレート書き込み中にエラーが発生しました: {e}")
-            with st.expander("詳細（開発者向け）"):
-                st.code("".join(traceback.format_exception(*sys.exc_info())), language="python")
+        _generate_section()
 
         c1, c2 = st.columns(2)
         with c1:
@@ -228,14 +573,29 @@ def render_app():
         with c2:
             if st.button("最初に戻る", use_container_width=True):
                 st.session_state.step = 1
-                st.session_state.extracted = None
+                set_extracted(None)
                 st.session_state.affiliation = ""
                 st.session_state.processing_after = ""
-                st.session_state.edit_mode = False
-                st.session_state.edit_buffer = {}
+                cancel_edit()
+                if st.session_state.gen_job:
+                    get_queue().cancel(st.session_state.gen_job["id"])
+                    st.session_state.gen_job = None
+                st.session_state.generated = None
+                st.session_state.dup_check = None
+                clear_bundle()
                 st.rerun()
         return
 
+    # 集計ダッシュボード（任意）
+    if st.session_state.step == 4 and st.session_state.authed:
+        st.subheader("集計ダッシュボード（所要時間）")
+        # 集計は pandas を使うため、ダッシュボードを開いたときに初めて読み込む（起動を遅くしない）
+        from ui.dashboard import render_dashboard
+        render_dashboard()
+        if st.button("Step2に戻る", use_container_width=True, key="dashboard_back"):
+            st.session_state.step = 2; st.rerun()
+        return
+
     # 認証未完了・その他
     st.warning("認証が必要です。Step1に戻ります。")
     st.session_state.step = 1
@@ -0,0 +1,18 @@
+# report_maker/ui/uploads.py
+# アップロードされたメールファイル（.eml / .txt / mbox）から1通ずつ本文を取り出す
+import os
+import tempfile
+from typing import Iterator, Tuple
+from core.batch import iter_messages
+
+def iter_uploaded_messages(files) -> Iterator[Tuple[str, str]]:
+    for up in files:
+        # mbox などはファイルとして読む処理を使い回すため、一時ファイルに書き出す
+        suffix = os.path.splitext(up.name)[1] or ".mbox"
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            tmp.write(up.getvalue())
+        try:
+            for source, text in iter_messages(tmp.name):
+                yield source.replace(tmp.name, up.name, 1), text
+        finally:
+            os.unlink(tmp.name)